@@ -1,9 +1,16 @@
 from django.contrib import admin
-from .models import User, Course, Lesson, Assignment, Submission, Review
+from .models import User, Course, Lesson, Assignment, Submission, Review, CourseRating, UploadSession, OutboxEvent, Notification, SearchDocument, Job, Blob
 
 admin.site.register(User)
 admin.site.register(Course)
 admin.site.register(Lesson)
 admin.site.register(Assignment)
 admin.site.register(Submission)
-admin.site.register(Review)
\ No newline at end of file
+admin.site.register(Review)
+admin.site.register(CourseRating)
+admin.site.register(UploadSession)
+admin.site.register(OutboxEvent)
+admin.site.register(Notification)
+admin.site.register(SearchDocument)
+admin.site.register(Job)
+admin.site.register(Blob)
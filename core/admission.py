@@ -0,0 +1,129 @@
+"""
+Контроль допуска для тяжелых запросов (загрузки файлов).
+
+Ограничение частоты не спасает от медленных запросов: десяток загрузок,
+пришедших одновременно, занимает все потоки воркера, и чтение встает
+в очередь за ними. Поэтому число одновременно выполняемых загрузок
+в процессе ограничено пулом. Запрос сверх лимита ждет освободившегося
+места в короткой очереди, а если очередь полна или ожидание затянулось —
+получает 503 с Retry-After, не прочитав тела. Остальные потоки воркера
+остаются свободными для чтения.
+
+Пулы задаются в settings.ADMISSION_POOLS; лимиты действуют на процесс.
+"""
+import threading
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import metrics
+
+admitted_requests = metrics.counter('core_admission_admitted_total', 'Запросы, допущенные к выполнению.', ('pool',))
+queued_requests = metrics.counter('core_admission_queued_total', 'Запросы, ждавшие места в очереди.', ('pool',))
+rejected_requests = metrics.counter(
+    'core_admission_rejected_total', 'Запросы, отклоненные контролем допуска.', ('pool', 'reason'),
+)
+queue_wait_seconds = metrics.counter(
+    'core_admission_queue_wait_seconds_total', 'Суммарное время ожидания в очереди.', ('pool',),
+)
+in_flight_requests = metrics.gauge('core_admission_in_flight', 'Запросы, выполняемые сейчас.', ('pool',))
+waiting_requests = metrics.gauge('core_admission_waiting', 'Запросы, ждущие в очереди сейчас.', ('pool',))
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен загрузками. Повторите запрос позже.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        # Обработчик исключений DRF превращает wait в заголовок Retry-After
+        self.wait = wait
+
+
+class AdmissionPool:
+    """Семафор с ограниченной очередью ожидания."""
+
+    def __init__(self, name):
+        self.name = name
+        self.in_flight = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    @property
+    def config(self):
+        return settings.ADMISSION_POOLS[self.name]
+
+    def acquire(self):
+        config = self.config
+        with self.condition:
+            if self.in_flight >= config['limit']:
+                self.wait_for_slot(config)
+            self.in_flight += 1
+        admitted_requests.inc(pool=self.name)
+        in_flight_requests.inc(pool=self.name)
+
+    def wait_for_slot(self, config):
+        if self.waiting >= config['queue']:
+            self.reject('queue_full', config)
+        self.waiting += 1
+        queued_requests.inc(pool=self.name)
+        waiting_requests.inc(pool=self.name)
+        started = time.monotonic()
+        try:
+            admitted = self.condition.wait_for(lambda: self.in_flight < config['limit'], timeout=config['timeout'])
+        finally:
+            self.waiting -= 1
+            waiting_requests.dec(pool=self.name)
+            queue_wait_seconds.inc(time.monotonic() - started, pool=self.name)
+        if not admitted:
+            self.reject('timeout', config)
+
+    def reject(self, reason, config):
+        rejected_requests.inc(pool=self.name, reason=reason)
+        raise Overloaded(config['retry_after'])
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+        in_flight_requests.dec(pool=self.name)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name):
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = AdmissionPool(name)
+        return _pools[name]
+
+
+class AdmissionControlMixin:
+    """
+    Пропускает действия из admission_pools ({'действие': 'пул'}) через пул.
+    Место занимается после аутентификации, разрешений и ограничений частоты,
+    но до обработчика, читающего тело запроса, и освобождается, когда
+    обработка закончена, в том числе с ошибкой.
+    """
+    admission_pools = {}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        name = self.admission_pools.get(self.action)
+        if name is not None:
+            pool = get_pool(name)
+            pool.acquire()
+            self.admission_pool = pool
+
+    def dispatch(self, request, *args, **kwargs):
+        self.admission_pool = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.admission_pool is not None:
+                self.admission_pool.release()
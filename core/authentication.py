@@ -0,0 +1,57 @@
+from urllib.parse import parse_qs
+
+from channels.middleware import BaseMiddleware
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+from .tokens import aauthenticate_key, authenticate_key
+
+
+async def get_token_user(key):
+    try:
+        user, _token = await aauthenticate_key(key)
+    except exceptions.AuthenticationFailed:
+        return None
+    return user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Аутентификация WebSocket по токену API: ws/notifications/?token=<key>.
+    Браузер не может передать заголовок Authorization при открытии сокета,
+    поэтому токен передается в строке запроса. Без токена остается
+    пользователь сессии из AuthMiddlewareStack.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        key = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if key:
+            user = await get_token_user(key[0])
+            if user is not None:
+                scope['user'] = user
+        return await super().__call__(scope, receive, send)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication через кэш токенов (core.tokens) со сроком действия.
+    Есть асинхронный вариант aauthenticate: асинхронные представления
+    при промахе кэша проверяют токен через асинхронный ORM, не занимая поток.
+    """
+
+    def authenticate_credentials(self, key):
+        return authenticate_key(key)
+
+    async def aauthenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+        return await aauthenticate_key(key)
@@ -0,0 +1,44 @@
+from django.db.backends.sqlite3 import base
+
+# Настройки соединения, которые не меняют сам файл базы. journal_mode
+# записывается в заголовок файла, поэтому WAL включается только явно:
+# DATABASE_URL=sqlite:///app.sqlite3?journal_mode=WAL
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 20000,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite с настройками для конкурентной записи.
+
+    OPTIONS['pragmas'] дополняет DEFAULT_PRAGMAS. В режиме WAL по умолчанию
+    synchronous=NORMAL: он не теряет целостность при сбое процесса и не
+    ждет fsync на каждой транзакции. Транзакции начинаются
+    с BEGIN IMMEDIATE: блокировка записи берется сразу и ожидает
+    busy_timeout, а не падает с "database is locked" при попытке
+    повысить уже открытую транзакцию чтения до записи.
+    """
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        if str(self.pragmas.get('journal_mode', '')).upper() == 'WAL':
+            self.pragmas.setdefault('synchronous', 'NORMAL')
+        self.transaction_mode = options.get('transaction_mode', 'IMMEDIATE')
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}'.strip())
@@ -0,0 +1,104 @@
+"""
+Счетчики ссылок на файлы хранилища core.storage и сборка мусора.
+
+Blob.refs меняется сигналами сохранения и удаления Submission и Lesson
+(см. core.signals). Массовые операции в обход сигналов (bulk_create,
+update) счетчик не трогают, поэтому сборщик перед удалением файла
+проверяет ссылки по индексу content_hash и исправляет счетчик, а не
+доверяет ему. Недавно затронутые файлы (моложе grace) не удаляются:
+их строка может быть еще не закоммичена.
+"""
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Blob, Lesson, Submission
+from .storage import BLOB_DIR, blob_path
+
+REFERENCING_MODELS = (Submission, Lesson)
+
+
+def touch_blob(digest, size):
+    """Создает запись файла или обновляет ее время, откладывая сборку мусора."""
+    now = timezone.now()
+    if Blob.objects.filter(pk=digest).update(updated_at=now):
+        return
+    try:
+        with transaction.atomic():
+            Blob.objects.create(sha256=digest, size=size, updated_at=now)
+    except IntegrityError:
+        Blob.objects.filter(pk=digest).update(updated_at=now)
+
+
+def retain(digest):
+    if digest:
+        Blob.objects.filter(pk=digest).update(refs=F('refs') + 1, updated_at=timezone.now())
+
+
+def release(digest):
+    if digest:
+        Blob.objects.filter(pk=digest, refs__gt=0).update(refs=F('refs') - 1, updated_at=timezone.now())
+
+
+def count_references(digest):
+    return sum(model.objects.filter(content_hash=digest).count() for model in REFERENCING_MODELS)
+
+
+def collect_garbage(grace=timedelta(hours=24), dry_run=False, storage=default_storage):
+    """
+    Удаляет файлы без ссылок, не затронутые дольше grace, и файлы
+    на диске без записи Blob (запись откатилась вместе с транзакцией).
+    Возвращает {'removed', 'freed', 'repaired', 'orphans'}.
+    """
+    cutoff = timezone.now() - grace
+    stats = dict.fromkeys(('removed', 'freed', 'repaired', 'orphans'), 0)
+    candidates = Blob.objects.filter(refs=0, updated_at__lt=cutoff).values_list('sha256', 'size')
+    for digest, size in list(candidates.iterator()):
+        references = count_references(digest)
+        if references:
+            Blob.objects.filter(pk=digest, refs=0).update(refs=references)
+            stats['repaired'] += 1
+            continue
+        if not dry_run:
+            with transaction.atomic():
+                # Условное удаление: параллельная загрузка того же файла обновила бы updated_at
+                deleted, _ = Blob.objects.filter(pk=digest, refs=0, updated_at__lt=cutoff).delete()
+                if not deleted:
+                    continue
+                _remove(storage.path(blob_path(digest)))
+        stats['removed'] += 1
+        stats['freed'] += size
+
+    stats['orphans'] = _collect_orphans(storage, cutoff, dry_run)
+    return stats
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _collect_orphans(storage, cutoff, dry_run):
+    root = storage.path(BLOB_DIR)
+    if not os.path.isdir(root):
+        return 0
+    orphans = 0
+    cutoff = cutoff.timestamp()
+    for prefix in os.scandir(root):
+        if not prefix.is_dir():
+            continue
+        # Во временном каталоге — записи, прерванные посреди загрузки
+        entries = [entry for entry in os.scandir(prefix.path) if entry.stat().st_mtime < cutoff]
+        known = set(Blob.objects.filter(pk__in=[entry.name for entry in entries]).values_list('pk', flat=True))
+        for entry in entries:
+            if entry.name not in known:
+                orphans += 1
+                if not dry_run:
+                    _remove(entry.path)
+    return orphans
@@ -0,0 +1,138 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_version(name):
+    """
+    Версия ресурса или области видимости — время последнего изменения в мс.
+    Она же служит значением Last-Modified для закэшированных ответов.
+    """
+    cache = get_cache()
+    key = f'core:version:{name}'
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        # add не перетирает версию, записанную параллельным воркером
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(*names):
+    """Инвалидирует все закэшированные ответы, зависящие от указанных версий."""
+    cache = get_cache()
+    now = int(time.time() * 1000)
+    for name in names:
+        key = f'core:version:{name}'
+        current = cache.get(key) or 0
+        cache.set(key, max(now, current + 1), timeout=None)
+
+
+def user_scope(user):
+    """Область видимости пользователя: преподаватели видят все, студенты — свои курсы."""
+    if not user.is_authenticated:
+        return 'anonymous'
+    if user.is_teacher:
+        return 'teacher'
+    return f'user:{user.pk}'
+
+
+class CachedResponseMixin:
+    """
+    Read-through кэш ответов list/retrieve для ViewSet.
+
+    Ключ строится из ресурса, его версии, области видимости пользователя
+    и полного URL запроса. Версии сдвигаются сигналами из core.signals,
+    поэтому устаревшие записи просто перестают находиться. Ответ хранится
+    уже отрендеренным вместе с ETag, так что повторный запрос или 304
+    не трогают ни базу, ни сериализатор.
+    """
+    cache_resource = None
+    cached_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aget_cached_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aget_cached_response(super().aretrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        scope = user_scope(request.user)
+        versions = [get_version(self.cache_resource)]
+        if scope != 'teacher':
+            # Запись или отчисление студента сдвигает только его область
+            versions.append(get_version(scope))
+        url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        key = ':'.join(['core:response', self.cache_resource, scope, *map(str, versions), url_hash])
+        return key, max(versions)
+
+    def is_cacheable(self, request):
+        return self.action in self.cached_actions and request.accepted_renderer.format == 'json'
+
+    def lookup_cached_entry(self, request):
+        key, version = self.get_cache_key(request)
+        return key, version, get_cache().get(key)
+
+    def store_cached_entry(self, request, key, version, response):
+        content = request.accepted_renderer.render(
+            response.data, request.accepted_media_type, self.get_renderer_context()
+        )
+        entry = {
+            'content': content,
+            'content_type': f'{request.accepted_media_type}; charset=utf-8',
+            'etag': quote_etag(hashlib.md5(content).hexdigest()),
+            'last_modified': version // 1000,
+        }
+        get_cache().set(key, entry, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+        return entry
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key, version, entry = self.lookup_cached_entry(request)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = self.store_cached_entry(request, key, version, response)
+        return self.build_cached_response(request, entry)
+
+    async def aget_cached_response(self, handler, request, *args, **kwargs):
+        """Асинхронный вариант get_cached_response; бэкенды кэша Django синхронные, поэтому они вызываются в потоке."""
+        if not self.is_cacheable(request):
+            return await handler(request, *args, **kwargs)
+
+        key, version, entry = await sync_to_async(self.lookup_cached_entry)(request)
+        if entry is None:
+            response = await handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = await sync_to_async(self.store_cached_entry)(request, key, version, response)
+        return self.build_cached_response(request, entry)
+
+    def build_cached_response(self, request, entry):
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return get_conditional_response(
+            request, etag=entry['etag'], last_modified=entry['last_modified'], response=response
+        )
@@ -1,15 +1,84 @@
 import json
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+from .instrumentation import InstrumentedConsumerMixin
+from .notifications import REPLAY_BATCH_SIZE, missed_notifications, user_groups
+
+class NotificationConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Уведомления пользователя. Сокет состоит в группе своего пользователя
+    и в группах курсов, которые он ведет или на которые записан, поэтому
+    событие получают только те, кого оно касается.
+
+    Клиент, переподключившийся с ?since=<seq>, сначала получает пропущенные
+    уведомления пачками ({"replay": [...]}), затем {"replay_complete": true,
+    "seq": ...} и после этого живые события.
+    """
     async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.last_seq = None
+        self.subscriptions = await self.get_groups(user)
+        # В группы вступаем до чтения журнала, чтобы между ними ничего не потерялось
+        for group in self.subscriptions:
+            await self.channel_layer.group_add(group, self.channel_name)
         await self.accept()
-        await self.channel_layer.group_add("notifications", self.channel_name)
+
+        since = self.get_since()
+        if since is not None:
+            await self.replay(since)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("notifications", self.channel_name)
+        for group in getattr(self, 'subscriptions', ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def replay(self, since):
+        while True:
+            batch = await self.get_missed(since)
+            if batch:
+                since = batch[-1]['seq']
+                await self.send(text_data=json.dumps({'replay': batch}))
+            if len(batch) < REPLAY_BATCH_SIZE:
+                break
+        self.last_seq = since
+        await self.send(text_data=json.dumps({'replay_complete': True, 'seq': since}))
 
     async def notify(self, event):
-        await self.send(text_data=json.dumps({
-            'message': event['message']
-        }))
\ No newline at end of file
+        seq = event.get('seq')
+        if seq is not None and self.last_seq is not None and seq <= self.last_seq:
+            # Уже отправлено при догоняющем чтении
+            return
+        payload = {'message': event['message']}
+        for key in ('seq', 'event', 'data'):
+            if key in event:
+                payload[key] = event[key]
+        await self.send(text_data=json.dumps(payload))
+
+    async def course_subscribe(self, event):
+        # Студента записали на курс, пока сокет открыт
+        self.subscriptions.add(event['group'])
+        await self.channel_layer.group_add(event['group'], self.channel_name)
+
+    async def course_unsubscribe(self, event):
+        self.subscriptions.discard(event['group'])
+        await self.channel_layer.group_discard(event['group'], self.channel_name)
+
+    def get_since(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return max(int(query['since'][0]), 0)
+        except (KeyError, ValueError):
+            return None
+
+    @database_sync_to_async
+    def get_groups(self, user):
+        return user_groups(user)
+
+    @database_sync_to_async
+    def get_missed(self, since):
+        return missed_notifications(self.subscriptions, since)
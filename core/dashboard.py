@@ -0,0 +1,70 @@
+"""
+Сводка страницы курса одним запросом API (CourseViewSet.dashboard).
+
+Число SQL-запросов не зависит от размера курса: курс вместе с рейтингом
+и числом студентов, уроки курса и задания всех уроков сразу — последние
+с аннотациями статуса сдачи вызывающего (Prefetch), без запроса на урок
+или задание. Разделы и поля, не запрошенные через fields[<набор>], не
+выбираются из базы: нет раздела lessons — нет и двух его запросов.
+"""
+from django.db.models import OuterRef, Prefetch, Subquery, prefetch_related_objects
+
+from .models import Assignment, CourseRating, Lesson, Submission
+from .serializers import CourseListSerializer, LessonListSerializer
+from .submissions import status_annotations
+
+
+def requested(fields, fieldset, name):
+    """Нужно ли поле name набора fieldset: без fields[<набор>] нужны все."""
+    names = fields.get(fieldset)
+    return names is None or name in names
+
+
+def _columns(fields, fieldset, names):
+    return [name for name in names if requested(fields, fieldset, name)]
+
+
+def dashboard_courses(queryset, fields):
+    """queryset курсов с аннотациями, которые нужны разделу course."""
+    if requested(fields, 'dashboard', 'course') and requested(fields, 'course', 'student_count'):
+        queryset = queryset.annotate(student_count=CourseListSerializer.annotations['student_count'])
+    return queryset
+
+
+def dashboard_assignments(user, fields):
+    queryset = Assignment.objects.order_by('deadline', 'id').only(
+        'id', 'lesson_id', *_columns(fields, 'assignment', ('title', 'description', 'deadline')),
+    )
+    if user.is_teacher:
+        return queryset
+    if requested(fields, 'assignment', 'status') or requested(fields, 'assignment', 'submitted_at'):
+        queryset = queryset.annotate(**status_annotations(user.pk))
+    if requested(fields, 'assignment', 'grade'):
+        graded = Submission.objects.filter(assignment=OuterRef('pk'), student=user.pk, grade__isnull=False)
+        queryset = queryset.annotate(grade=Subquery(graded.order_by('-submitted_at', '-id').values('grade')[:1]))
+    return queryset
+
+
+def dashboard_lessons(user, fields):
+    queryset = Lesson.objects.filter(deleting=False).order_by('id').only(
+        'id', 'course_id', *_columns(fields, 'lesson', ('title', 'content')),
+    )
+    if requested(fields, 'lesson', 'has_file'):
+        queryset = queryset.annotate(has_file=LessonListSerializer.annotations['has_file'])
+    if requested(fields, 'lesson', 'assignments'):
+        queryset = queryset.prefetch_related(Prefetch('assignments', queryset=dashboard_assignments(user, fields)))
+    return queryset
+
+
+def build_dashboard(course, user, fields):
+    """Данные для CourseDashboardSerializer; course — из dashboard_courses."""
+    lessons = []
+    if requested(fields, 'dashboard', 'lessons'):
+        prefetch_related_objects([course], Prefetch('lessons', queryset=dashboard_lessons(user, fields)))
+        lessons = course.lessons.all()
+    return {
+        'course': course,
+        # Отзывов еще не было — нулевой рейтинг без записи в базе
+        'rating': getattr(course, 'rating', None) or CourseRating(course=course),
+        'lessons': lessons,
+    }
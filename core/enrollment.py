@@ -0,0 +1,132 @@
+import csv
+import json
+from itertools import groupby, islice
+
+from django.db import transaction
+
+from .cache import bump_version
+from .models import Course, User
+from .notifications import sync_course_subscriptions
+
+ENROLLMENT_BATCH_SIZE = 1000
+# Статусы строк, которые ничего не изменили из-за ошибки во входных данных
+PROBLEM_STATUSES = ('invalid', 'other_course', 'unknown_course', 'unknown_user')
+
+Enrollment = Course.students.through
+
+
+def parse_roster(lines, fmt='csv', course_id=None):
+    """
+    Разбирает список записей из CSV (колонки course,user) или JSONL
+    ({"course": 1, "user": 2}) построчно, не читая файл целиком.
+
+    Если задан course_id, колонку course можно не указывать или оставить
+    пустой, а строки с другим курсом получают status='other_course'.
+    Возвращает генератор словарей {'row', 'course', 'user'}; строки с ошибками
+    сразу получают status='invalid'.
+    """
+    if fmt == 'csv':
+        records = csv.DictReader(lines)
+        start = 2  # первая строка — заголовок
+    elif fmt == 'jsonl':
+        records = _read_jsonl(lines)
+        start = 1
+    else:
+        raise ValueError(f'Неизвестный формат: {fmt}')
+
+    for row, record in enumerate(records, start=start):
+        if record is None:
+            continue
+        yield build_row(row, record.get('course'), record.get('user'), course_id=course_id)
+
+
+def _read_jsonl(lines):
+    for line in lines:
+        if not line.strip():
+            yield None
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = {}
+        yield record if isinstance(record, dict) else {}
+
+
+def build_row(row, course, user, course_id=None):
+    """Строка записи; пустой курс — course_id, другой курс при заданном course_id — ошибка."""
+    if course in (None, ''):
+        course = course_id
+    try:
+        result = {'row': row, 'course': int(course), 'user': int(user)}
+    except (TypeError, ValueError):
+        return {'row': row, 'course': course, 'user': user, 'status': 'invalid'}
+    if course_id is not None and result['course'] != course_id:
+        result['status'] = 'other_course'
+    return result
+
+
+def apply_enrollments(rows, unenroll=False, batch_size=ENROLLMENT_BATCH_SIZE):
+    """
+    Записывает (или отчисляет) студентов пачками по batch_size строк.
+
+    Каждая пачка — отдельная транзакция: несколько запросов на проверку
+    и один bulk_create с ignore_conflicts в промежуточную таблицу
+    Course.students. Генератор отдает результат по каждой строке, поэтому
+    память не зависит от размера входа.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return
+        yield from _apply_chunk(chunk, unenroll)
+
+
+def _apply_chunk(chunk, unenroll):
+    valid = [row for row in chunk if 'status' not in row]
+    course_ids = {row['course'] for row in valid}
+    user_ids = {row['user'] for row in valid}
+    # Курс в очереди на удаление для записи уже не существует
+    known_courses = set(Course.objects.filter(pk__in=course_ids, deleting=False).values_list('pk', flat=True))
+    known_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+
+    with transaction.atomic():
+        enrolled = set(Enrollment.objects.filter(
+            course_id__in=known_courses, user_id__in=known_users,
+        ).values_list('course_id', 'user_id'))
+
+        seen, changed = set(), set()
+        for row in valid:
+            pair = (row['course'], row['user'])
+            if row['course'] not in known_courses:
+                row['status'] = 'unknown_course'
+            elif row['user'] not in known_users:
+                row['status'] = 'unknown_user'
+            elif unenroll:
+                is_change = pair in enrolled and pair not in seen
+                row['status'] = 'unenrolled' if is_change else 'not_enrolled'
+            else:
+                is_change = pair not in enrolled and pair not in seen
+                row['status'] = 'enrolled' if is_change else 'already_enrolled'
+            if row['status'] in ('enrolled', 'unenrolled'):
+                changed.add(pair)
+            seen.add(pair)
+
+        if unenroll:
+            for course_id, pairs in groupby(sorted(changed), key=lambda pair: pair[0]):
+                Enrollment.objects.filter(
+                    course_id=course_id, user_id__in=[user_id for _, user_id in pairs],
+                ).delete()
+        else:
+            Enrollment.objects.bulk_create(
+                [Enrollment(course_id=course_id, user_id=user_id) for course_id, user_id in changed],
+                ignore_conflicts=True,
+            )
+
+        if changed:
+            # bulk_create и delete по промежуточной таблице не шлют m2m_changed
+            scopes = {f'user:{user_id}' for _, user_id in changed}
+            transaction.on_commit(lambda: bump_version('course', *scopes))
+            transaction.on_commit(lambda: sync_course_subscriptions(changed, subscribe=not unenroll))
+
+    return chunk
@@ -0,0 +1,22 @@
+class ValuesListMixin:
+    """
+    list отдает строки queryset.values() через list_serializer_class
+    (наследник ValuesSerializer), не создавая экземпляров моделей.
+
+    Подмена делается в filter_queryset — последнем шаге перед пагинацией,
+    поэтому фильтры видимости из get_queryset сохраняются, а ключи курсорной
+    пагинации берутся из словарей. Остальные действия работают с моделями
+    и полным serializer_class.
+    """
+    list_serializer_class = None
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.list_serializer_class is not None:
+            return self.list_serializer_class
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and self.list_serializer_class is not None:
+            return self.list_serializer_class.values_queryset(queryset)
+        return queryset
@@ -0,0 +1,258 @@
+import csv
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+from .models import Assignment, Submission, User
+
+CHUNK_SIZE = 2000
+# Сколько байт копится перед отправкой клиенту
+FLUSH_SIZE = 64 * 1024
+# Строк в одной группе строк Parquet
+PARQUET_ROW_GROUP = 10000
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def gradebook_columns(course):
+    """Задания курса в порядке дедлайнов — столбцы ведомости."""
+    return list(Assignment.objects.filter(lesson__course=course).order_by('deadline', 'id').values_list('id', 'title'))
+
+
+def gradebook_rows(course, assignment_ids):
+    """
+    Строки ведомости: (id студента, имя, оценки по заданиям). Студенты и оценки
+    читаются двумя курсорами на стороне сервера, оба упорядочены по студенту,
+    и сливаются на лету, поэтому в памяти всегда только одна строка.
+    Оценка задания — оценка последней по времени сдачи оцененной работы
+    (submitted_at), а не последняя по времени выставления: если старую
+    работу оценили позже новой, в ведомость попадет оценка новой.
+    """
+    students = (
+        User.objects.filter(courses_enrolled=course).order_by('id')
+        .values_list('id', 'username').iterator(chunk_size=CHUNK_SIZE)
+    )
+    grades = (
+        Submission.objects.filter(assignment__lesson__course=course, grade__isnull=False)
+        .order_by('student_id', 'submitted_at', 'id')
+        .values_list('student_id', 'assignment_id', 'grade').iterator(chunk_size=CHUNK_SIZE)
+    )
+    position = {assignment_id: index for index, assignment_id in enumerate(assignment_ids)}
+    pending = next(grades, None)
+    for student_id, username in students:
+        row = [None] * len(assignment_ids)
+        # Оценки отчисленных студентов пропускаем
+        while pending is not None and pending[0] < student_id:
+            pending = next(grades, None)
+        while pending is not None and pending[0] == student_id:
+            row[position[pending[1]]] = pending[2]
+            pending = next(grades, None)
+        yield student_id, username, row
+
+
+class _Buffer:
+    """Приемник байтов для писателей: накопленное забирается методом drain()."""
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.position = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self, force=False):
+        if not self.parts or (self.size < FLUSH_SIZE and not force):
+            return b''
+        data = b''.join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def write_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл UTF-8 без мастера импорта
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Ведомость" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '</Relationships>'
+)
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, (int, float)):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def write_xlsx(header, rows):
+    """
+    Минимальный XLSX без зависимостей: лист пишется в zip потоком
+    (строки inline, без таблицы общих строк), а zipfile в режиме
+    без seek дописывает размеры после данных каждой части.
+    """
+    sink = _Buffer()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(header).encode())
+            for row in rows:
+                sheet.write(_xlsx_row(row).encode())
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain(force=True)
+
+
+def write_parquet(header, rows):
+    """Столбцовый формат: по группе строк Parquet на PARQUET_ROW_GROUP студентов."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [pa.field(header[0], pa.int64()), pa.field(header[1], pa.string())]
+        + [pa.field(name, pa.int32()) for name in header[2:]]
+    )
+    sink = _Buffer()
+    batch = []
+
+    def flush_batch():
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+        ))
+        batch.clear()
+
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_ROW_GROUP:
+                flush_batch()
+                yield sink.drain(force=True)
+        if batch:
+            flush_batch()
+    finally:
+        writer.close()
+    yield sink.drain(force=True)
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx, 'parquet': write_parquet}
+
+
+def check_format(file_format):
+    if file_format not in FORMATS:
+        raise ValidationError({'file_format': f'Поддерживаются форматы: {", ".join(FORMATS)}.'})
+    if file_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValidationError({'file_format': 'Для выгрузки в Parquet установите пакет pyarrow.'})
+
+
+def export_gradebook(course, file_format):
+    """Генератор байтов ведомости курса в указанном формате."""
+    check_format(file_format)
+    columns = gradebook_columns(course)
+    header = ['student_id', 'username'] + [f'{title} (#{assignment_id})' for assignment_id, title in columns]
+    rows = ([student_id, username, *grades] for student_id, username, grades
+            in gradebook_rows(course, [assignment_id for assignment_id, _ in columns]))
+    return WRITERS[file_format](header, rows)
+
+
+async def _aiterate(iterator):
+    # Под ASGI Django 4.2 собрал бы синхронный итератор в список целиком,
+    # поэтому отдаем части по одной из того же потока, что держит курсор
+    sentinel = object()
+    get_next = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await get_next(iterator, sentinel)) is not sentinel:
+        if chunk:
+            yield chunk
+
+
+def streaming_export(request, chunks, file_format, filename):
+    content_type, extension = FORMATS[file_format]
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
@@ -0,0 +1,287 @@
+"""
+Инструментирование запросов: число SQL-запросов, время в базе,
+в сериализаторе и в проверке прав по представлениям и действиям.
+
+Трасса запроса живет в contextvar: ее создает InstrumentationMiddleware
+для HTTP и InstrumentedConsumerMixin для каждого сообщения WebSocket.
+Запросы к базе считает обертка execute_wrappers, которая ставится на
+каждое соединение при его открытии; вне трассы она только передает
+вызов дальше. sync_to_async и database_sync_to_async копируют контекст,
+поэтому запросы из потоков попадают в трассу своего запроса.
+
+Итоги запроса пишутся в гистограммы core.metrics (см. /metrics).
+Одинаковый SQL, выполненный в одном запросе n_plus_one_threshold раз
+и больше, отмечается как N+1. Медленные запросы с долей slow_sample_rate
+сохраняются вместе со списком SQL и доступны на /metrics/slow. Параметры
+запросов в трассу не попадают: среди них ключи токенов и хэши паролей.
+
+Оба адреса открыты только по заголовку Authorization: Bearer <METRICS_TOKEN>
+или сотрудникам (is_staff) с сессией админки. Адрес клиента не проверяется:
+за фронт-прокси на той же машине все запросы приходят с 127.0.0.1.
+"""
+import functools
+import hmac
+import logging
+import random
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse, JsonResponse
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+LABELS = ('view', 'action')
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+request_duration = metrics.histogram(
+    'core_request_duration_seconds', 'Время обработки запроса или сообщения WebSocket.', LABELS, TIME_BUCKETS,
+)
+request_queries = metrics.histogram('core_request_queries', 'SQL-запросов за запрос.', LABELS, QUERY_BUCKETS)
+request_db_time = metrics.histogram('core_request_db_seconds', 'Время в базе за запрос.', LABELS, TIME_BUCKETS)
+request_serializer_time = metrics.histogram(
+    'core_request_serializer_seconds', 'Время сериализации ответа, включая ее запросы к базе.', LABELS, TIME_BUCKETS,
+)
+request_permission_time = metrics.histogram(
+    'core_request_permission_seconds', 'Время проверки прав, включая ее запросы к базе.', LABELS, TIME_BUCKETS,
+)
+n_plus_one_requests = metrics.counter('core_n_plus_one_total', 'Запросы с повторяющимся одинаковым SQL (N+1).', LABELS)
+slow_requests_total = metrics.counter('core_slow_requests_total', 'Запросы дольше slow_request_seconds.', LABELS)
+
+current_trace = ContextVar('core_trace', default=None)
+
+# Последние сохраненные медленные запросы процесса
+slow_requests = deque(maxlen=50)
+
+
+def get_config():
+    return settings.INSTRUMENTATION
+
+
+class Trace:
+    """Счетчики одного HTTP-запроса или сообщения WebSocket."""
+
+    def __init__(self, view='unknown', action='unknown'):
+        self.view = view
+        self.action = action
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = {'serializer': 0.0, 'permission': 0.0}
+        self.statements = Counter()
+        self.log = []
+        self.max_log = get_config()['max_traced_queries']
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[sql] += 1
+        if len(self.log) < self.max_log:
+            self.log.append((sql, duration))
+
+    def measure(self, name, func):
+        """Оборачивает func, добавляя время ее вызовов к timings[name]."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.timings[name] += time.perf_counter() - started
+        return wrapper
+
+    def repeated_statements(self):
+        threshold = get_config()['n_plus_one_threshold']
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def finish(self, **details):
+        duration = time.perf_counter() - self.started
+        labels = {'view': self.view, 'action': self.action}
+        request_duration.observe(duration, **labels)
+        request_queries.observe(self.queries, **labels)
+        request_db_time.observe(self.db_time, **labels)
+        request_serializer_time.observe(self.timings['serializer'], **labels)
+        request_permission_time.observe(self.timings['permission'], **labels)
+
+        repeated = self.repeated_statements()
+        if repeated:
+            n_plus_one_requests.inc(**labels)
+            logger.warning('N+1 в %s.%s: %s', self.view, self.action,
+                           '; '.join(f'{count}× {sql}' for sql, count in repeated))
+
+        config = get_config()
+        if duration >= config['slow_request_seconds']:
+            slow_requests_total.inc(**labels)
+            if random.random() < config['slow_sample_rate']:
+                self.sample(duration, repeated, details)
+        return duration
+
+    def sample(self, duration, repeated, details):
+        entry = {
+            'view': self.view, 'action': self.action, **details,
+            'duration': round(duration, 6), 'queries': self.queries, 'db_time': round(self.db_time, 6),
+            'timings': {name: round(value, 6) for name, value in self.timings.items()},
+            'n_plus_one': [{'sql': sql, 'count': count} for sql, count in repeated],
+            'trace': [
+                {'sql': sql, 'duration': round(query_duration, 6)}
+                for sql, query_duration in self.log
+            ],
+        }
+        slow_requests.append(entry)
+        logger.warning('Медленный запрос %s.%s: %.3f с, %d SQL', self.view, self.action, duration, self.queries)
+
+
+def query_recorder(execute, sql, params, many, context):
+    trace = current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.record_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if query_recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_recorder)
+
+
+def view_labels(request):
+    """Имя класса представления и действие ViewSet (или метод) для меток."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', request.method.lower()
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name or match.func.__name__, request.method.lower()
+    actions = getattr(match.func, 'actions', None) or {}
+    return view_class.__name__, actions.get(request.method.lower(), request.method.lower())
+
+
+class InstrumentationMiddleware:
+    """
+    Открывает трассу на время запроса и записывает ее итоги в метрики.
+    Ставится первой в MIDDLEWARE, чтобы учесть запросы всех остальных.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_config()['enabled']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace = Trace()
+        token = current_trace.set(trace)
+        try:
+            return self.get_response(request)
+        finally:
+            current_trace.reset(token)
+            self.finish(trace, request)
+
+    async def __acall__(self, request):
+        trace = Trace()
+        token = current_trace.set(trace)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_trace.reset(token)
+            self.finish(trace, request)
+
+    def finish(self, trace, request):
+        trace.view, trace.action = view_labels(request)
+        trace.finish(method=request.method, path=request.path)
+
+
+class InstrumentedViewMixin:
+    """
+    Добавляет к трассе время проверки прав и сериализации ответа
+    (to_representation сериализатора из get_serializer).
+    """
+
+    def check_permissions(self, request):
+        self.measure('permission', super().check_permissions)(request)
+
+    def check_object_permissions(self, request, obj):
+        self.measure('permission', super().check_object_permissions)(request, obj)
+
+    async def acheck_permissions(self, request):
+        trace, started = current_trace.get(), time.perf_counter()
+        try:
+            await super().acheck_permissions(request)
+        finally:
+            if trace is not None:
+                trace.timings['permission'] += time.perf_counter() - started
+
+    async def acheck_object_permissions(self, request, obj):
+        trace, started = current_trace.get(), time.perf_counter()
+        try:
+            await super().acheck_object_permissions(request, obj)
+        finally:
+            if trace is not None:
+                trace.timings['permission'] += time.perf_counter() - started
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        trace = current_trace.get()
+        if trace is not None:
+            serializer.to_representation = trace.measure('serializer', serializer.to_representation)
+        return serializer
+
+    def measure(self, name, func):
+        trace = current_trace.get()
+        return func if trace is None else trace.measure(name, func)
+
+
+class InstrumentedConsumerMixin:
+    """Трасса на каждое сообщение потребителя Channels: действие — тип сообщения."""
+
+    async def dispatch(self, message):
+        if not get_config()['enabled']:
+            return await super().dispatch(message)
+        trace = Trace(type(self).__name__, message['type'])
+        token = current_trace.set(trace)
+        try:
+            return await super().dispatch(message)
+        finally:
+            current_trace.reset(token)
+            trace.finish(path=self.scope.get('path'))
+
+
+def _allowed(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+def serve_metrics(request):
+    """Метрики процесса в формате Prometheus; только по METRICS_TOKEN или сотрудникам."""
+    if not _allowed(request):
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def serve_slow_requests(request):
+    """Последние сохраненные медленные запросы процесса со списком SQL."""
+    if not _allowed(request):
+        raise Http404
+    return JsonResponse(list(slow_requests), safe=False, json_dumps_params={'ensure_ascii': False})
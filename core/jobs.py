@@ -0,0 +1,349 @@
+"""
+Фоновые задачи на таблице Job — очередь без внешнего брокера.
+
+Задача ставится через enqueue() внутри транзакции изменения данных: если
+транзакция откатится, задачи тоже не будет, а воркер увидит ее только
+после коммита. Воркеры (команда run_jobs) забирают задачи по приоритету,
+затем по времени запуска. Захват — условный UPDATE по статусу и номеру
+попытки: из нескольких воркеров, выбравших одну задачу, строку обновит
+только один, и это работает одинаково на SQLite и PostgreSQL.
+
+Воркер держит аренду задачи (locked_until) и продлевает ее в checkpoint()
+между пачками. Задача упавшего воркера после истечения аренды достается
+другому; поэтому задачи должны быть идемпотентными и продолжать работу
+с места, записанного в progress. checkpoint() прерывает задачу, если аренда
+перешла к другому воркеру или задачу отменили.
+
+Ошибка возвращает задачу в очередь с экспоненциальной задержкой, пока не
+исчерпаны max_attempts; после этого задача остается в статусе failed.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import metrics
+from .cache import bump_version
+from .enrollment import PROBLEM_STATUSES, apply_enrollments
+from .models import Assignment, Course, Job, Lesson, Review, Submission, UploadSession
+from .search import hide_scope, restore_scope
+from .storage import blob_hash
+from .uploads import discard_part
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('queued', 'running')
+
+jobs_finished = metrics.counter('core_jobs_total', 'Завершенные попытки фоновых задач.', ('kind', 'status'))
+job_duration = metrics.histogram(
+    'core_job_duration_seconds', 'Длительность попытки фоновой задачи.', ('kind',),
+    (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+
+class LeaseLost(Exception):
+    """Аренду задачи забрал другой воркер, или задачу отменили."""
+
+
+class Task:
+    def __init__(self, name, func, priority, max_attempts):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+
+registry = {}
+
+
+def task(name, priority=0, max_attempts=5):
+    """Регистрирует функцию func(job, **payload) как задачу вида name."""
+    def decorator(func):
+        registry[name] = Task(name, func, priority, max_attempts)
+        return func
+    return decorator
+
+
+def get_config():
+    return settings.JOBS
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def enqueue(kind, *, owner=None, priority=None, delay=0, **payload):
+    """Ставит задачу в очередь; payload должен сериализоваться в JSON."""
+    spec = registry[kind]
+    return Job.objects.create(
+        kind=kind, payload=payload, owner=owner,
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim(worker, kinds=None, candidates=10):
+    """Забирает следующую готовую задачу или возвращает None."""
+    now = timezone.now()
+    # Задача воркера, чья аренда истекла, готова так же, как ждущая в очереди
+    ready = Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+    queryset = Job.objects.filter(ready)
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+    pending = queryset.order_by('-priority', 'run_at', 'id').values_list('id', 'status', 'attempts')[:candidates]
+    lease = timedelta(seconds=get_config()['lease_seconds'])
+    for job_id, job_status, attempts in pending:
+        claimed = Job.objects.filter(ready, pk=job_id, status=job_status, attempts=attempts).update(
+            status='running', locked_by=worker, locked_until=now + lease,
+            attempts=F('attempts') + 1, started_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def checkpoint(job, **progress):
+    """
+    Записывает прогресс и продлевает аренду. Вызывается между пачками,
+    лучше в той же транзакции, что и сама пачка: тогда прогресс
+    и изменения данных фиксируются вместе.
+    """
+    job.progress.update(progress)
+    updated = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+        progress=job.progress,
+        locked_until=timezone.now() + timedelta(seconds=get_config()['lease_seconds']),
+    )
+    if not updated:
+        raise LeaseLost(f'Задача {job.pk} больше не принадлежит воркеру {job.locked_by}.')
+
+
+def execute(job):
+    """Выполняет захваченную задачу и записывает итог попытки."""
+    spec = registry.get(job.kind)
+    started = time.perf_counter()
+    try:
+        if spec is None:
+            raise LookupError(f'Неизвестный вид задачи: {job.kind}')
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Попытки исчерпаны: аренда истекла на последней попытке.')
+        result = spec.func(job, **job.payload)
+    except LeaseLost:
+        logger.warning('Задача %s прервана: аренда потеряна', job.pk)
+        outcome = 'lost'
+    except Exception:
+        logger.exception('Задача %s (%s) завершилась ошибкой', job.pk, job.kind)
+        outcome = fail(job, traceback.format_exc())
+    else:
+        outcome = finish(job, result)
+    jobs_finished.inc(kind=job.kind, status=outcome)
+    job_duration.observe(time.perf_counter() - started, kind=job.kind)
+    return outcome
+
+
+def _release(job, **fields):
+    return Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+        locked_until=None, **fields,
+    )
+
+
+def finish(job, result):
+    if not _release(job, status='succeeded', result=result, error='', finished_at=timezone.now()):
+        return 'lost'
+    return 'succeeded'
+
+
+def fail(job, error):
+    config = get_config()
+    if job.attempts >= job.max_attempts:
+        fields = {'status': 'failed', 'finished_at': timezone.now()}
+    else:
+        delay = min(config['retry_backoff'] * 2 ** (job.attempts - 1), config['retry_backoff_max'])
+        fields = {'status': 'queued', 'run_at': timezone.now() + timedelta(seconds=delay)}
+    if not _release(job, error=error, **fields):
+        return 'lost'
+    return fields['status']
+
+
+def run_pending(worker=None, kinds=None, limit=None):
+    """Выполняет готовые задачи, пока они есть; возвращает число попыток."""
+    worker = worker or worker_name()
+    done = 0
+    while limit is None or done < limit:
+        job = claim(worker, kinds)
+        if job is None:
+            break
+        execute(job)
+        done += 1
+    return done
+
+
+def cancel_job(job):
+    """
+    Отменяет задачу в очереди или выполняющуюся: воркер заметит отмену
+    на ближайшем checkpoint(), уже зафиксированные пачки останутся.
+    Курс или урок, который задача удаляла, снова становится видимым.
+    """
+    with transaction.atomic():
+        cancelled = Job.objects.filter(pk=job.pk, status__in=ACTIVE).update(
+            status='cancelled', locked_until=None, finished_at=timezone.now(),
+        )
+        if cancelled and job.kind in DELETION_TASKS:
+            model, field = DELETION_TASKS[job.kind]
+            _set_deleting(model, job.payload[field], False)
+    return cancelled
+
+
+def schedule_deletion(instance, owner=None):
+    """
+    Ставит удаление курса или урока в очередь и сразу скрывает его: до
+    прихода воркера на него нельзя записаться, сдать работу или добавить
+    содержимое. Повторный вызов возвращает уже поставленную задачу.
+    """
+    kind = next(kind for kind, (model, _) in DELETION_TASKS.items() if isinstance(instance, model))
+    field = DELETION_TASKS[kind][1]
+    with transaction.atomic():
+        job = find_active(kind, **{field: instance.pk}) or enqueue(kind, owner=owner, **{field: instance.pk})
+        _set_deleting(type(instance), instance.pk, True)
+    return job
+
+
+def _set_deleting(model, pk, deleting):
+    if model.objects.filter(pk=pk).exclude(deleting=deleting).update(deleting=deleting):
+        # Поисковый индекс меняется в той же транзакции, что и флаг
+        (hide_scope if deleting else restore_scope)(model, pk)
+        # update() не шлет post_save: кэш ответов сбрасываем сами, уроки — вместе с курсом
+        transaction.on_commit(lambda: bump_version('course', 'lesson'))
+
+
+def find_active(kind, **payload):
+    lookups = {f'payload__{key}': value for key, value in payload.items()}
+    return Job.objects.filter(kind=kind, status__in=ACTIVE, **lookups).order_by('id').first()
+
+
+def delete_files_later(names):
+    """
+    Ставит удаление файлов хранилища после коммита текущей транзакции.
+    Файлы с адресацией по содержимому пропускаются: их удаляет сборщик
+    мусора, когда на них не останется ссылок.
+    """
+    names = [name for name in names if name and not blob_hash(name)]
+    batch_size = get_config()['batch_size']
+    for start in range(0, len(names), batch_size):
+        enqueue('files.delete', names=names[start:start + batch_size])
+
+
+def delete_in_batches(job, step, queryset, fields=(), cleanup=None):
+    """
+    Удаляет строки queryset пачками по batch_size, каждую — в своей транзакции
+    вместе с записью прогресса. cleanup(objects) вызывается в той же
+    транзакции перед удалением пачки.
+    """
+    batch_size = get_config()['batch_size']
+    deleted = job.progress.get(step, 0)
+    while True:
+        with transaction.atomic():
+            objects = list(queryset.only('pk', *fields).order_by('pk')[:batch_size])
+            if not objects:
+                return deleted
+            if cleanup is not None:
+                cleanup(objects)
+            queryset.model.objects.filter(pk__in=[obj.pk for obj in objects]).delete()
+            deleted += len(objects)
+            checkpoint(job, **{step: deleted})
+
+
+def _delete_submission_files(submissions):
+    delete_files_later([submission.file.name for submission in submissions])
+
+
+def _delete_lesson_files(lessons):
+    delete_files_later([lesson.file.name for lesson in lessons if lesson.file])
+
+
+def _discard_parts(sessions):
+    def discard():
+        for session in sessions:
+            discard_part(session)
+    transaction.on_commit(discard)
+
+
+def delete_lesson_contents(job, **scope):
+    """
+    Удаляет работы, загрузки и задания уроков из scope (lesson=id или
+    lesson__course=id) снизу вверх, чтобы каскад на каждом шаге был коротким.
+    """
+    assignment_scope = {f'assignment__{key}': value for key, value in scope.items()}
+    delete_in_batches(job, 'submissions', Submission.objects.filter(**assignment_scope),
+                      fields=('file',), cleanup=_delete_submission_files)
+    delete_in_batches(job, 'uploads', UploadSession.objects.filter(Q(**assignment_scope) | Q(**scope)),
+                      cleanup=_discard_parts)
+    delete_in_batches(job, 'assignments', Assignment.objects.filter(**scope))
+
+
+DELETION_TASKS = {'course.delete': (Course, 'course'), 'lesson.delete': (Lesson, 'lesson')}
+
+
+@task('course.delete', priority=5)
+def delete_course(job, course):
+    delete_lesson_contents(job, lesson__course=course)
+    delete_in_batches(job, 'lessons', Lesson.objects.filter(course=course),
+                      fields=('file',), cleanup=_delete_lesson_files)
+    delete_in_batches(job, 'reviews', Review.objects.filter(course=course))
+    delete_in_batches(job, 'enrollments', Course.students.through.objects.filter(course_id=course))
+    with transaction.atomic():
+        Course.objects.filter(pk=course).delete()
+        checkpoint(job, courses=1)
+    return job.progress
+
+
+@task('lesson.delete', priority=5)
+def delete_lesson(job, lesson):
+    delete_lesson_contents(job, lesson=lesson)
+    delete_in_batches(job, 'lessons', Lesson.objects.filter(pk=lesson),
+                      fields=('file',), cleanup=_delete_lesson_files)
+    return job.progress
+
+
+@task('files.delete', priority=-5)
+def delete_files(job, names):
+    # Отсутствующий файл не ошибка: повторная попытка удаляет остаток
+    for name in names:
+        default_storage.delete(name)
+    return {'deleted': len(names)}
+
+
+@task('enrollment.bulk')
+def bulk_enrollment(job, rows, unenroll=False):
+    """
+    Массовая запись из API в фоне. Прогресс — число обработанных строк
+    и сводка; повторная попытка продолжает с первой необработанной пачки.
+    В результат попадают сводка и только строки с ошибками.
+    """
+    batch_size = get_config()['batch_size']
+    done = job.progress.get('rows', 0)
+    summary = Counter(job.progress.get('summary', {}))
+    problems = job.progress.get('problems', [])
+    remaining = iter(rows[done:])
+    while True:
+        chunk = list(islice(remaining, batch_size))
+        if not chunk:
+            break
+        for result in apply_enrollments(chunk, unenroll=unenroll, batch_size=batch_size):
+            summary[result['status']] += 1
+            if result['status'] in PROBLEM_STATUSES:
+                problems.append(result)
+        done += len(chunk)
+        checkpoint(job, rows=done, summary=dict(summary), problems=problems)
+    return {'summary': dict(summary), 'results': problems}
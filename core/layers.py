@@ -0,0 +1,207 @@
+import asyncio
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    local TEXT NOT NULL,
+    expires REAL NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_messages_local_idx ON channel_messages (local, id);
+CREATE TABLE IF NOT EXISTS channel_groups (
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (grp, channel)
+);
+"""
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Слой каналов поверх общего файла SQLite в режиме WAL.
+
+    Нужен там, где нет Redis: несколько ASGI-воркеров на одной машине
+    (и тесты) видят одни и те же группы и сообщения. Как и в channels_redis,
+    имена каналов процесса содержат общий префикс до "!", поэтому один
+    фоновый опрос на процесс забирает сообщения для всех его сокетов,
+    а не каждый сокет опрашивает базу сам.
+
+    Сообщения сериализуются pickle: файл базы должен быть доступен
+    только самому приложению.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.02, batch_size=500, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.client_prefix = uuid.uuid4().hex
+        self.receive_buffer = {}
+        self._local = threading.local()
+        self._poller = None
+
+    # Соединения: по одному на поток пула, в котором выполняются запросы
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _run(self, func, *args):
+        return func(self._connection(), *args)
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, self._run, func, *args)
+
+    def _local_name(self, channel):
+        return self.non_local_name(channel) if '!' in channel else channel
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        assert '__asgi_channel__' not in message
+        await self._call(self._send, channel, pickle.dumps(message))
+
+    def _send(self, connection, channel, body):
+        now = time.time()
+        if random.random() < 0.01:
+            self._clean_expired(connection, now)
+        (queued,) = connection.execute(
+            'SELECT COUNT(*) FROM channel_messages WHERE channel = ? AND expires > ?', (channel, now)
+        ).fetchone()
+        if queued >= self.get_capacity(channel):
+            raise ChannelFull(channel)
+        connection.execute(
+            'INSERT INTO channel_messages (channel, local, expires, body) VALUES (?, ?, ?, ?)',
+            (channel, self._local_name(channel), now + self.expiry, body),
+        )
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        if '!' not in channel:
+            # Общие именованные каналы опрашиваются напрямую
+            while True:
+                rows = await self._call(self._fetch, channel, 1)
+                if rows:
+                    return pickle.loads(rows[0][1])
+                await asyncio.sleep(self.poll_interval)
+
+        queue = self.receive_buffer.setdefault(channel, asyncio.Queue())
+        self._ensure_poller()
+        try:
+            return await queue.get()
+        finally:
+            if queue.empty():
+                self.receive_buffer.pop(channel, None)
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        """Забирает пачки сообщений для всех каналов процесса и раскладывает их по очередям."""
+        while self.receive_buffer:
+            fetched = 0
+            for local in {self._local_name(channel) for channel in self.receive_buffer}:
+                rows = await self._call(self._fetch, local, self.batch_size)
+                for channel, body in rows:
+                    self.receive_buffer.setdefault(channel, asyncio.Queue()).put_nowait(pickle.loads(body))
+                fetched = max(fetched, len(rows))
+            if fetched < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def _fetch(self, connection, local, limit):
+        return connection.execute(
+            'DELETE FROM channel_messages WHERE id IN ('
+            '  SELECT id FROM channel_messages WHERE local = ? AND expires > ? ORDER BY id LIMIT ?'
+            ') RETURNING channel, body',
+            (local, time.time(), limit),
+        ).fetchall()
+
+    async def new_channel(self, prefix='specific'):
+        return f'{prefix}.{self.client_prefix}!{uuid.uuid4().hex}'
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._call(self._group_add, group, channel)
+
+    def _group_add(self, connection, group, channel):
+        connection.execute(
+            'INSERT OR REPLACE INTO channel_groups (grp, channel, expires) VALUES (?, ?, ?)',
+            (group, channel, time.time() + self.group_expiry),
+        )
+
+    async def group_discard(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._call(self._group_discard, group, channel)
+
+    def _group_discard(self, connection, group, channel):
+        connection.execute('DELETE FROM channel_groups WHERE grp = ? AND channel = ?', (group, channel))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.valid_group_name(group), 'Group name not valid'
+        await self._call(self._group_send, group, pickle.dumps(message))
+
+    def _group_send(self, connection, group, body):
+        """Раскладывает сообщение всем участникам группы одной транзакцией."""
+        now = time.time()
+        channels = [row[0] for row in connection.execute(
+            'SELECT channel FROM channel_groups WHERE grp = ? AND expires > ?', (group, now)
+        )]
+        if not channels:
+            return
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO channel_messages (channel, local, expires, body) VALUES (?, ?, ?, ?)',
+                [(channel, self._local_name(channel), now + self.expiry, body) for channel in channels],
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    # Flush extension
+
+    async def flush(self):
+        self.receive_buffer = {}
+        await self._call(self._flush)
+
+    def _flush(self, connection):
+        connection.execute('DELETE FROM channel_messages')
+        connection.execute('DELETE FROM channel_groups')
+
+    async def close(self):
+        pass
+
+    def _clean_expired(self, connection, now):
+        connection.execute('DELETE FROM channel_messages WHERE expires <= ?', (now,))
+        connection.execute('DELETE FROM channel_groups WHERE expires <= ?', (now,))
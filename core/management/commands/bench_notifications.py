@@ -0,0 +1,86 @@
+import asyncio
+import statistics
+import time
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+from core.notifications import course_group
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест рассылки уведомлений: открывает N виртуальных сокетов '
+        'в слое каналов, рассылает события по группам курсов и измеряет задержку доставки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=10000)
+        parser.add_argument('--courses', type=int, default=100, help='Сколько групп курсов делят сокеты.')
+        parser.add_argument('--messages', type=int, default=50, help='Сколько событий разослать.')
+        parser.add_argument('--alias', default='default', help='Алиас слоя каналов из CHANNEL_LAYERS.')
+        parser.add_argument('--timeout', type=float, default=60.0)
+
+    def handle(self, *args, sockets, courses, messages, alias, timeout, **options):
+        layer = get_channel_layer(alias)
+        if layer is None:
+            raise CommandError(f'Слой каналов {alias!r} не настроен.')
+        latencies = asyncio.run(self.run(layer, sockets, courses, messages, timeout))
+        expected = messages * sockets // courses
+
+        if not latencies:
+            raise CommandError('Ни одно событие не доставлено.')
+        latencies.sort()
+        percentile = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+        self.stdout.write(f'Слой: {type(layer).__name__}, сокетов: {sockets}, групп: {courses}')
+        self.stdout.write(f'Доставлено: {len(latencies)} из {expected}')
+        self.stdout.write(
+            f'Задержка, мс: p50={percentile(0.5):.1f} p95={percentile(0.95):.1f} '
+            f'p99={percentile(0.99):.1f} max={latencies[-1] * 1000:.1f} '
+            f'среднее={statistics.mean(latencies) * 1000:.1f}'
+        )
+
+    async def run(self, layer, sockets, courses, messages, timeout):
+        channels = [await layer.new_channel() for _ in range(sockets)]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            layer.group_add(course_group(i % courses), channel) for i, channel in enumerate(channels)
+        ))
+        self.stdout.write(f'Подписка {sockets} сокетов: {time.perf_counter() - started:.2f} с')
+
+        expected = messages * sockets // courses
+        latencies = []
+        done = asyncio.Event()
+
+        async def socket(channel):
+            while True:
+                event = await layer.receive(channel)
+                latencies.append(time.time() - event['sent_at'])
+                if len(latencies) >= expected:
+                    done.set()
+
+        receivers = [asyncio.create_task(socket(channel)) for channel in channels]
+        # Дать получателям встать в очередь до начала рассылки
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        for i in range(messages):
+            await layer.group_send(course_group(i % courses), {
+                'type': 'notify', 'message': f'Событие {i}', 'sent_at': time.time(),
+            })
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Рассылка: {elapsed:.2f} с, {len(latencies) / elapsed:.0f} доставок/с')
+
+        for task in receivers:
+            task.cancel()
+        results = await asyncio.gather(*receivers, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception) and not isinstance(r, asyncio.CancelledError)]
+        if errors:
+            raise CommandError(f'Ошибка получателя: {errors[0]!r}')
+        await asyncio.gather(*(
+            layer.group_discard(course_group(i % courses), channel) for i, channel in enumerate(channels)
+        ))
+        return latencies
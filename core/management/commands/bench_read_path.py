@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+
+from core.models import Course, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает синхронный путь WSGI и асинхронный путь ASGI на GET-запросах '
+        'к спискам: C клиентов в замкнутом цикле, пропускная способность и p50/p99. '
+        'Обработчики Django вызываются в процессе, без сетевого сервера.'
+    )
+    # URLconf должен импортироваться уже с нужным ASYNC_READ_VIEWS
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both')
+        parser.add_argument('--path', default='/api/courses/')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=200, help='Сколько клиентов одновременно.')
+        parser.add_argument('--threads', type=int, default=8, help='Размер пула потоков WSGI-воркера.')
+        parser.add_argument('--json', action='store_true', help='Вывести результат одной строкой JSON.')
+
+    def handle(self, *args, mode, **options):
+        if mode == 'both':
+            return self.compare(options)
+
+        if Course.objects.count() == 0:
+            self.stderr.write('В базе нет курсов: ответы будут пустыми.')
+        user, _ = User.objects.get_or_create(username='bench_reader', defaults={'is_teacher': True, 'is_student': False})
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'HTTP_HOST': settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost',
+                   'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+        run = self.run_wsgi if mode == 'wsgi' else self.run_asgi
+        started = time.perf_counter()
+        latencies, errors = run(options, headers)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        percentile = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+        result = {
+            'mode': mode,
+            'async_views': settings.ASYNC_READ_VIEWS,
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': len(latencies) / elapsed,
+            'p50': percentile(0.5),
+            'p99': percentile(0.99),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+        else:
+            self.report([result])
+
+    def compare(self, options):
+        results = []
+        for mode, async_views in (('wsgi', '0'), ('asgi', '1')):
+            command = [
+                sys.executable, sys.argv[0], 'bench_read_path', '--mode', mode, '--json',
+                '--path', options['path'], '--requests', str(options['requests']),
+                '--concurrency', str(options['concurrency']), '--threads', str(options['threads']),
+            ]
+            env = dict(os.environ, ASYNC_READ_VIEWS=async_views)
+            output = subprocess.run(command, env=env, capture_output=True, text=True)
+            if output.returncode:
+                raise CommandError(output.stderr)
+            results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        self.report(results)
+
+    def report(self, results):
+        for result in results:
+            self.stdout.write(
+                f"{result['mode'].upper():5} async_views={result['async_views']!s:5} "
+                f"запросов={result['requests']} ошибок={result['errors']} "
+                f"{result['rps']:.0f} запр/с  p50={result['p50']:.1f} мс  p99={result['p99']:.1f} мс"
+            )
+
+    def run_wsgi(self, options, headers):
+        """Клиенты — потоки; воркер обслуживает не больше --threads запросов одновременно."""
+        handler = WSGIHandler()
+        environ = RequestFactory()._base_environ(PATH_INFO=options['path'], REQUEST_METHOD='GET', **headers)
+        worker = threading.Semaphore(options['threads'])
+        per_client = max(options['requests'] // options['concurrency'], 1)
+        latencies, errors = [], []
+
+        def start_response(status, response_headers):
+            if not status.startswith('200'):
+                errors.append(status)
+
+        def client():
+            for _ in range(per_client):
+                started = time.perf_counter()
+                with worker:
+                    b''.join(handler(dict(environ), start_response))
+                latencies.append(time.perf_counter() - started)
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for future in [pool.submit(client) for _ in range(options['concurrency'])]:
+                future.result()
+        return latencies, len(errors)
+
+    def run_asgi(self, options, headers):
+        """Клиенты — корутины в одном цикле событий, как на одном ASGI-воркере."""
+        handler = ASGIHandler()
+        path, _, query = options['path'].partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'query_string': query.encode(),
+            'headers': [(b'host', headers['HTTP_HOST'].encode()),
+                        (b'authorization', headers['HTTP_AUTHORIZATION'].encode())],
+        }
+        per_client = max(options['requests'] // options['concurrency'], 1)
+        latencies, errors = [], []
+
+        async def request():
+            status = None
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+
+            await handler(dict(scope), receive, send)
+            if status != 200:
+                errors.append(status)
+
+        async def client():
+            for _ in range(per_client):
+                started = time.perf_counter()
+                await request()
+                latencies.append(time.perf_counter() - started)
+
+        async def main():
+            await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+
+        asyncio.run(main())
+        return latencies, len(errors)
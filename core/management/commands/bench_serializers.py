@@ -0,0 +1,61 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Assignment, Course, Lesson, Submission
+from core.serializers import (
+    AssignmentListSerializer, AssignmentSerializer, CourseListSerializer, CourseSerializer,
+    LessonListSerializer, LessonSerializer, SubmissionListSerializer, SubmissionSerializer,
+)
+
+# Ресурс, queryset списка в порядке пагинации, полный и быстрый сериализаторы
+CASES = [
+    ('courses', lambda: Course.objects.select_related('rating').prefetch_related('students').order_by('-created_at', '-id'),
+     CourseSerializer, CourseListSerializer),
+    ('lessons', lambda: Lesson.objects.order_by('id'), LessonSerializer, LessonListSerializer),
+    ('assignments', lambda: Assignment.objects.order_by('deadline', 'id'), AssignmentSerializer, AssignmentListSerializer),
+    ('submissions', lambda: Submission.objects.order_by('-submitted_at', '-id'), SubmissionSerializer, SubmissionListSerializer),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает полные ModelSerializer и быстрый путь по values() на страницах списков: '
+        'время выборки и сериализации в JSON, число запросов и размер ответа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200, help='Строк на странице (max_page_size пагинации).')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, rows, repeat, **options):
+        renderer = JSONRenderer()
+        for name, queryset, full_serializer, list_serializer in CASES:
+            def full():
+                return renderer.render(full_serializer(list(queryset()[:rows]), many=True).data)
+
+            def lean():
+                page = list(list_serializer.values_queryset(queryset())[:rows])
+                return renderer.render(list_serializer(page, many=True).data)
+
+            results = [self.measure(run, repeat) for run in (full, lean)]
+            (full_ms, full_queries, full_size), (lean_ms, lean_queries, lean_size) = results
+            self.stdout.write(
+                f'{name:12} полный: {full_ms:8.2f} мс, запросов {full_queries}, {full_size / 1024:8.1f} КБ | '
+                f'быстрый: {lean_ms:7.2f} мс, запросов {lean_queries}, {lean_size / 1024:7.1f} КБ | '
+                f'ускорение ×{full_ms / lean_ms:.1f}'
+            )
+
+    def measure(self, run, repeat):
+        with CaptureQueriesContext(connection) as queries:
+            content = run()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), len(queries), len(content)
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import UploadSession
+from core.uploads import discard_part
+
+
+class Command(BaseCommand):
+    help = 'Удаляет заброшенные сессии загрузки файлов частями вместе с временными файлами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.CHUNKED_UPLOAD_TTL_HOURS,
+                            help='Через сколько часов без активности сессия считается заброшенной.')
+
+    def handle(self, *args, hours, **options):
+        cutoff = timezone.now() - timedelta(hours=hours)
+        stale = UploadSession.objects.filter(updated_at__lt=cutoff)
+        removed = 0
+        for session in stale.iterator():
+            discard_part(session)
+            removed += 1
+        stale.delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено сессий загрузки: {removed}.'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Сборщик мусора хранилища по содержимому: удаляет файлы, на которые не ссылается '
+        'ни одна работа и ни один урок, и файлы без записи в базе. Счетчики ссылок, '
+        'разошедшиеся с базой (массовые операции в обход сигналов), исправляет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=settings.BLOB_GC_GRACE_HOURS,
+                            help='Не трогать файлы, затронутые за последние столько часов.')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не удаляя.')
+
+    def handle(self, *args, grace_hours, dry_run, **options):
+        stats = collect_garbage(timedelta(hours=grace_hours), dry_run=dry_run)
+        prefix = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} файлов: {stats['removed']} ({stats['freed']} байт), без записи в базе: {stats['orphans']}; "
+            f"исправлено счетчиков: {stats['repaired']}."
+        ))
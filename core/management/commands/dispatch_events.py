@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.events import DISPATCH_BATCH_SIZE, dispatch_batch
+
+
+class Command(BaseCommand):
+    help = 'Фоновый диспетчер: отправляет события из outbox в группы WebSocket пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DISPATCH_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Пауза в секундах, когда outbox пуст.')
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать накопившиеся события и завершиться.')
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        total = 0
+        try:
+            while True:
+                sent = dispatch_batch(batch_size)
+                total += sent
+                if sent < batch_size:
+                    if once:
+                        break
+                    # Пачка неполная — outbox разобран, ждем новых событий
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Отправлено событий: {total}.'))
@@ -0,0 +1,41 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.blobs import retain
+from core.models import Lesson, Submission
+from core.storage import blob_hash
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит файлы работ и уроков, сохраненные до хранилища по содержимому, '
+        'в blobs/: одинаковые копии схлопываются в один файл, старые удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        moved = missing = 0
+        for model in (Submission, Lesson):
+            legacy = model.objects.filter(content_hash='').exclude(file='').exclude(file__isnull=True)
+            last = 0
+            while True:
+                rows = list(legacy.filter(pk__gt=last).order_by('pk').values_list('pk', 'file')[:batch_size])
+                if not rows:
+                    break
+                last = rows[-1][0]
+                for pk, name in rows:
+                    if not default_storage.exists(name):
+                        missing += 1
+                        continue
+                    with default_storage.open(name) as file:
+                        new_name = default_storage.save(name, file, max_length=255)
+                    with transaction.atomic():
+                        # Условно: файл могли заменить, пока он копировался
+                        if model.objects.filter(pk=pk, file=name).update(file=new_name, content_hash=blob_hash(new_name)):
+                            retain(blob_hash(new_name))
+                            transaction.on_commit(lambda name=name: default_storage.delete(name))
+                            moved += 1
+        self.stdout.write(self.style.SUCCESS(f'Перенесено файлов: {moved}, не найдено на диске: {missing}.'))
@@ -0,0 +1,45 @@
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.enrollment import ENROLLMENT_BATCH_SIZE, PROBLEM_STATUSES, apply_enrollments, parse_roster
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует список записей на курсы из CSV (колонки course,user) или JSONL. '
+        'Файл читается потоково, записи применяются пачками в отдельных транзакциях.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для stdin.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Формат файла; по умолчанию определяется по расширению.')
+        parser.add_argument('--course', type=int,
+                            help='Курс для строк без колонки course; строки других курсов отклоняются.')
+        parser.add_argument('--unenroll', action='store_true',
+                            help='Отчислить перечисленных студентов вместо записи.')
+        parser.add_argument('--batch-size', type=int, default=ENROLLMENT_BATCH_SIZE)
+
+    def handle(self, path, format=None, course=None, unenroll=False, batch_size=ENROLLMENT_BATCH_SIZE, **options):
+        fmt = format or ('jsonl' if path.endswith('.jsonl') else 'csv')
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        summary = Counter()
+        with stream:
+            rows = parse_roster(stream, fmt, course_id=course)
+            for result in apply_enrollments(rows, unenroll=unenroll, batch_size=batch_size):
+                summary[result['status']] += 1
+                if result['status'] in PROBLEM_STATUSES:
+                    self.stderr.write(
+                        f"Строка {result['row']}: {result['status']} "
+                        f"(course={result['course']}, user={result['user']})"
+                    )
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{status}: {count}' for status, count in sorted(summary.items())) or 'Нет записей.'
+        ))
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из журнала уведомления старше срока хранения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Сколько дней хранить уведомления.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, days, batch_size, **options):
+        cutoff = timezone.now() - timedelta(days=days)
+        expired = Notification.objects.filter(created_at__lt=cutoff).order_by('id')
+        removed = 0
+        # Удаляем пачками, чтобы не держать долгую блокировку на журнале
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            removed += Notification.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Удалено уведомлений: {removed}.'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import bump_version
+from core.models import CourseRating
+from core.ratings import RATING_VALUES, compute_ratings
+
+FIELDS = ['count', 'total'] + [f'rating_{r}' for r in RATING_VALUES]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегаты рейтингов курсов по таблице отзывов и проверяет расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только найти расхождения, ничего не записывая.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, check=False, batch_size=500, **options):
+        actual = compute_ratings()
+        existing = {rating.course_id: rating for rating in CourseRating.objects.all()}
+        empty = dict.fromkeys(FIELDS, 0)
+        now = timezone.now()
+
+        to_create, to_update = [], []
+        for course_id in actual.keys() | existing.keys():
+            expected = actual.get(course_id, empty)
+            rating = existing.get(course_id)
+            if rating is None:
+                to_create.append(CourseRating(course_id=course_id, updated_at=now, **expected))
+            elif any(getattr(rating, field) != expected[field] for field in FIELDS):
+                for field in FIELDS:
+                    setattr(rating, field, expected[field])
+                rating.updated_at = now
+                to_update.append(rating)
+
+        drift = len(to_create) + len(to_update)
+        if check:
+            if drift:
+                raise CommandError(f'Расхождения в агрегатах: {drift} курс(ов).')
+            self.stdout.write(self.style.SUCCESS('Агрегаты рейтингов совпадают с отзывами.'))
+            return
+
+        with transaction.atomic():
+            CourseRating.objects.bulk_create(to_create, batch_size=batch_size)
+            CourseRating.objects.bulk_update(to_update, FIELDS + ['updated_at'], batch_size=batch_size)
+        if drift:
+            bump_version('course')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {len(to_create)}, исправлено: {len(to_update)}.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.search import BATCH_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит поисковый индекс заново по всем курсам, урокам и заданиям. '
+        'Нужен после массовой загрузки в обход сигналов (bulk_create, loaddata, SQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, batch_size=BATCH_SIZE, **options):
+        total = rebuild_index(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано объектов: {total}.'))
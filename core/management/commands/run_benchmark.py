@@ -0,0 +1,246 @@
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from asgiref.testing import ApplicationCommunicator
+from channels.auth import AuthMiddlewareStack
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.authentication import TokenAuthMiddleware
+from core.instrumentation import request_queries
+from core.models import Course, Review, Submission, UploadSession, User
+from core.notifications import user_group
+from core.routing import websocket_urlpatterns
+from core.tokens import issue_token
+
+# Имя, роль, метод и путь; в пути подставляются объекты из fixtures()
+HTTP_SCENARIOS = [
+    ('courses.list', 'student', 'GET', '/api/courses/'),
+    ('courses.list.teacher', 'teacher', 'GET', '/api/courses/'),
+    ('courses.retrieve', 'student', 'GET', '/api/courses/{course}/'),
+    ('courses.enroll', 'student', 'POST', '/api/courses/{course}/enroll/'),
+    ('lessons.list', 'student', 'GET', '/api/lessons/'),
+    ('lessons.retrieve', 'student', 'GET', '/api/lessons/{lesson}/'),
+    ('assignments.list', 'student', 'GET', '/api/assignments/'),
+    ('assignments.retrieve', 'student', 'GET', '/api/assignments/{assignment}/'),
+    ('submissions.list', 'student', 'GET', '/api/submissions/'),
+    ('submissions.list.teacher', 'teacher', 'GET', '/api/submissions/'),
+    ('submissions.retrieve', 'student', 'GET', '/api/submissions/{submission}/'),
+    ('reviews.list', 'student', 'GET', '/api/reviews/'),
+    ('reviews.retrieve', 'student', 'GET', '/api/reviews/{review}/'),
+    ('uploads.list', 'student', 'GET', '/api/uploads/'),
+    ('uploads.retrieve', 'student', 'GET', '/api/uploads/{upload}/'),
+    ('notifications.list', 'student', 'GET', '/api/notifications/'),
+    ('search', 'student', 'GET', '/api/search/?{query}'),
+]
+WEBSOCKET_SCENARIOS = ['ws.connect', 'ws.notify']
+
+# Задержка считается регрессией, только если выросла и в разах, и в миллисекундах:
+# на ответах короче миллисекунды доля шума слишком велика
+MIN_LATENCY_DELTA_MS = 0.5
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries': statistics.median(queries) if queries else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет набор сценариев по всем ресурсам API, записи на курс и сокету уведомлений '
+        'на данных seed_benchmark: пропускная способность, p50/p99 и SQL-запросов на запрос. '
+        'С --save-baseline результат сохраняется как эталон; без него сравнивается с эталоном, '
+        'и рост числа запросов или задержки больше --tolerance завершает команду ошибкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--only', action='append', help='Прогнать только эти сценарии (можно несколько раз).')
+        parser.add_argument('--prefix', default='bench', help='Префикс пользователей seed_benchmark.')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Не сбрасывать кэш ответов перед запросами (по умолчанию измеряется путь до базы).')
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Допустимый рост p50, доля.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        names = [name for name, *_ in HTTP_SCENARIOS] + WEBSOCKET_SCENARIOS
+        selected = options['only'] or names
+        unknown = set(selected) - set(names)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}.')
+
+        users, objects, upload = self.fixtures()
+        results = {}
+        # Корзины ограничений частоты измеряли бы сами себя
+        throttles_off = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+        try:
+            with override_settings(REST_FRAMEWORK=throttles_off):
+                for name, role, method, path in HTTP_SCENARIOS:
+                    if name in selected:
+                        results[name] = self.run_http(method, path.format(**objects), users[role])
+            websocket = [name for name in WEBSOCKET_SCENARIOS if name in selected]
+            if websocket:
+                results.update(asyncio.run(self.run_websocket(users['student'], objects['student'], websocket)))
+        finally:
+            upload.delete()
+
+        self.report(results)
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'dataset': self.dataset(),
+            'options': {key: options[key] for key in ('requests', 'warm_cache')},
+            'results': results,
+        }
+        if options['save_baseline']:
+            Path(options['baseline']).write_text(json.dumps(report, ensure_ascii=False, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Эталон сохранен: {options['baseline']}"))
+        else:
+            self.compare(report)
+
+    def fixtures(self):
+        prefix = self.options['prefix']
+        review = (Review.objects.filter(student__username__startswith=f'{prefix}_student_')
+                  .select_related('student').order_by('id').first())
+        teacher = User.objects.filter(username__startswith=f'{prefix}_teacher_').order_by('id').first()
+        if review is None or teacher is None:
+            raise CommandError(f'Нет данных с префиксом {prefix!r}: сначала запустите seed_benchmark.')
+        student = review.student
+        submission = Submission.objects.filter(student=student).select_related('assignment__lesson').first()
+        if submission is None:
+            raise CommandError('У студента нет работ: увеличьте --submission-rate в seed_benchmark.')
+        assignment = submission.assignment
+        upload = UploadSession.objects.create(owner=student, kind='submission', assignment=assignment,
+                                              filename='bench.zip', size=1024)
+        objects = {
+            'course': assignment.lesson.course_id, 'lesson': assignment.lesson_id, 'assignment': assignment.pk,
+            'submission': submission.pk, 'review': review.pk, 'upload': upload.pk, 'student': student.pk,
+            'query': urlencode({'q': Course.objects.get(pk=review.course_id).title.split()[0]}),
+        }
+        users = {role: issue_token(user).key for role, user in (('student', student), ('teacher', teacher))}
+        return users, objects, upload
+
+    def dataset(self):
+        return {model.__name__: model.objects.count() for model in (Course, Submission, Review)}
+
+    def run_http(self, method, path, token):
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        path, _, query = path.partition('?')
+        headers = {'HTTP_HOST': settings.ALLOWED_HOSTS[0], 'HTTP_AUTHORIZATION': f'Token {token}'}
+        latencies, queries, errors = [], [], 0
+
+        def request():
+            environ = factory.generic(method, path, QUERY_STRING=query, **headers).environ
+            statuses = []
+            b''.join(handler(environ, lambda status, response_headers: statuses.append(status)))
+            return statuses[0]
+
+        for _ in range(self.options['warmup']):
+            request()
+        elapsed = 0.0
+        for _ in range(self.options['requests']):
+            if not self.options['warm_cache']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                status = request()
+                latency = time.perf_counter() - started
+            elapsed += latency
+            latencies.append(latency)
+            queries.append(len(captured))
+            errors += not status.startswith('2')
+        return summarize(latencies, queries, errors, elapsed)
+
+    async def run_websocket(self, token, student_id, names):
+        application = AuthMiddlewareStack(TokenAuthMiddleware(URLRouter(websocket_urlpatterns)))
+        layer = get_channel_layer()
+        scope = {'type': 'websocket', 'path': '/ws/notifications/', 'query_string': urlencode({'token': token}).encode(),
+                 'headers': [], 'subprotocols': []}
+        connect, notify, errors = [], [], 0
+        labels = {'view': 'NotificationConsumer', 'action': 'websocket.connect'}
+        observed, total = request_queries.value(**labels), request_queries.total(**labels)
+        started_all = time.perf_counter()
+        for iteration in range(self.options['warmup'] + self.options['requests']):
+            measured = iteration >= self.options['warmup']
+            communicator = ApplicationCommunicator(application, dict(scope))
+            started = time.perf_counter()
+            await communicator.send_input({'type': 'websocket.connect'})
+            accepted = await communicator.receive_output(timeout=5)
+            if measured:
+                connect.append(time.perf_counter() - started)
+                errors += accepted['type'] != 'websocket.accept'
+            if 'ws.notify' in names:
+                started = time.perf_counter()
+                await layer.group_send(user_group(student_id), {'type': 'notify', 'message': 'benchmark'})
+                await communicator.receive_output(timeout=5)
+                if measured:
+                    notify.append(time.perf_counter() - started)
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(timeout=5)
+        elapsed = time.perf_counter() - started_all
+        connections = request_queries.value(**labels) - observed
+        queries = [(request_queries.total(**labels) - total) / connections] if connections else []
+        results = {'ws.connect': summarize(connect, queries, errors, sum(connect) or elapsed)}
+        if notify:
+            results['ws.notify'] = summarize(notify, [0], 0, sum(notify))
+        return {name: result for name, result in results.items() if name in names}
+
+    def report(self, results):
+        self.stdout.write(f"{'сценарий':26} {'запр/с':>8} {'p50, мс':>9} {'p99, мс':>9} {'SQL':>5} {'ошибок':>7}")
+        for name, result in results.items():
+            queries = '—' if result['queries'] is None else f"{result['queries']:g}"
+            self.stdout.write(
+                f"{name:26} {result['rps']:8.1f} {result['p50']:9.2f} {result['p99']:9.2f} "
+                f"{queries:>5} {result['errors']:7}"
+            )
+
+    def compare(self, report):
+        path = Path(self.options['baseline'])
+        if not path.exists():
+            self.stdout.write(f'Эталона {path} нет; сохраните его с --save-baseline.')
+            return
+        baseline = json.loads(path.read_text())
+        if baseline['dataset'] != report['dataset'] or baseline['options'] != report['options']:
+            self.stderr.write('Данные или параметры прогона отличаются от эталона: задержки могут быть несравнимы.')
+
+        regressions = []
+        for name, result in report['results'].items():
+            expected = baseline['results'].get(name)
+            if expected is None:
+                continue
+            if result['errors'] > expected['errors']:
+                regressions.append(f"{name}: ошибок {result['errors']} (было {expected['errors']})")
+            if None not in (result['queries'], expected['queries']) and result['queries'] > expected['queries']:
+                regressions.append(f"{name}: SQL-запросов {result['queries']:g} (было {expected['queries']:g})")
+            limit = expected['p50'] * (1 + self.options['tolerance'])
+            if result['p50'] > limit and result['p50'] - expected['p50'] > MIN_LATENCY_DELTA_MS:
+                regressions.append(f"{name}: p50 {result['p50']:.2f} мс (было {expected['p50']:.2f} мс)")
+        if regressions:
+            raise CommandError('Регрессии относительно эталона:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий относительно эталона нет.'))
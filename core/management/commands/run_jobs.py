@@ -0,0 +1,87 @@
+import signal
+import subprocess
+import sys
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.jobs import claim, execute, worker_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер фоновых задач (core.jobs): --threads потоков в процессе, '
+        '--processes процессов. SIGINT/SIGTERM дают дозавершить текущие задачи; '
+        'задачи остановленного аварийно воркера заберут другие по истечении аренды.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help='Потоков-исполнителей в процессе.')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Процессов-воркеров; больше 1 — запускаются дочерние run_jobs.')
+        parser.add_argument('--kinds', action='append', help='Брать только задачи этих видов (можно несколько раз).')
+        parser.add_argument('--interval', type=float, default=settings.JOBS['poll_interval'],
+                            help='Пауза в секундах, когда готовых задач нет.')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+        if options['processes'] > 1:
+            return self.supervise(options)
+
+        self.counts = {}
+        self.lock = threading.Lock()
+        threads = [threading.Thread(target=self.work, args=(options,), daemon=True)
+                   for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+        summary = ', '.join(f'{outcome}: {count}' for outcome, count in sorted(self.counts.items()))
+        self.stdout.write(self.style.SUCCESS(f'Задачи выполнены ({summary or "нет"}).'))
+
+    def work(self, options):
+        worker = worker_name()
+        try:
+            while not self.stop.is_set():
+                job = claim(worker, options['kinds'])
+                if job is None:
+                    if options['once']:
+                        break
+                    self.stop.wait(options['interval'])
+                    continue
+                outcome = execute(job)
+                with self.lock:
+                    self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        finally:
+            # Соединение с базой у каждого потока свое
+            connection.close()
+
+    def supervise(self, options):
+        command = [sys.executable, sys.argv[0], 'run_jobs', '--threads', str(options['threads']),
+                   '--interval', str(options['interval'])]
+        if options['once']:
+            command.append('--once')
+        for kind in options['kinds'] or ():
+            command.extend(['--kinds', kind])
+        children = [subprocess.Popen(command) for _ in range(options['processes'])]
+        try:
+            while any(child.poll() is None for child in children):
+                if self.stop.wait(0.5):
+                    break
+        except KeyboardInterrupt:
+            pass
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+        for child in children:
+            child.wait()
@@ -0,0 +1,186 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import bump_version
+from core.models import Assignment, Course, Lesson, Review, Submission, User
+from core.search import rebuild_index
+
+WORDS = (
+    'алгоритм анализ архитектура база данные вычисление граф дерево задача запрос индекс интерфейс код '
+    'компилятор модель модуль очередь память поиск поток программа проект протокол сеть система сортировка '
+    'структура сервер тест транзакция функция кэш класс объект метод библиотека Python Django SQL HTTP API'
+).split()
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """
+    bulk_create проставляет auto_now_add текущим временем; на время
+    генерации поля принимают переданные значения, чтобы даты были разными.
+    """
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочных тестов: преподаватели, курсы, '
+        'студенты с записями, уроки, задания, выполненные работы с файлами и отзывы. '
+        'Генерация детерминирована (--seed) и идет пачками, память не растет с объемом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=10)
+        parser.add_argument('--courses-per-teacher', type=int, default=5)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--courses-per-student', type=int, default=3)
+        parser.add_argument('--lessons-per-course', type=int, default=10)
+        parser.add_argument('--assignments-per-lesson', type=int, default=2)
+        parser.add_argument('--submission-rate', type=float, default=0.7,
+                            help='Доля прошедших заданий, сданных каждым студентом курса.')
+        parser.add_argument('--review-rate', type=float, default=0.3, help='Доля студентов курса с отзывом.')
+        parser.add_argument('--file-size', type=int, default=512, help='Размер файла работы в байтах.')
+        parser.add_argument('--no-files', action='store_true', help='Не записывать файлы работ на диск.')
+        parser.add_argument('--prefix', default='bench', help='Префикс имен пользователей.')
+        parser.add_argument('--password', default='bench')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--clear', action='store_true', help='Сначала удалить данные с тем же префиксом.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+        prefix = options['prefix']
+        seeded = User.objects.filter(username__startswith=f'{prefix}_')
+        if seeded.exists():
+            if not options['clear']:
+                raise CommandError(f'Пользователи с префиксом {prefix!r} уже есть; запустите с --clear.')
+            files = Submission.objects.filter(student__in=seeded).exclude(file='').values_list('file', flat=True)
+            for name in files.iterator(chunk_size=options['batch_size']):
+                default_storage.delete(name)
+            Course.objects.filter(teacher__in=seeded).delete()
+            seeded.delete()
+
+        started = time.perf_counter()
+        self.counts = dict.fromkeys(('teachers', 'courses', 'lessons', 'assignments', 'students',
+                                     'enrollments', 'submissions', 'reviews'), 0)
+        self.password = make_password(options['password'])
+        # Задания курса нужны при генерации работ: память — O(заданий), а не O(работ)
+        self.assignments = {}
+        with explicit_timestamps(Course._meta.get_field('created_at'), Submission._meta.get_field('submitted_at')):
+            with transaction.atomic():
+                courses = self.create_courses()
+            self.create_students(courses)
+
+        self.stdout.write('Пересчет рейтингов и поискового индекса...')
+        call_command('rebuild_course_ratings', stdout=self.stdout)
+        rebuild_index()
+        bump_version('course', 'lesson')
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{name}: {count}' for name, count in self.counts.items())
+            + f' — за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize()
+
+    def users(self, role, count, start=0):
+        prefix = self.options['prefix']
+        return [
+            User(username=f'{prefix}_{role}_{index}', password=self.password,
+                 is_teacher=role == 'teacher', is_student=role == 'student')
+            for index in range(start, start + count)
+        ]
+
+    def create_courses(self):
+        options = self.options
+        teachers = User.objects.bulk_create(self.users('teacher', options['teachers']))
+        self.counts['teachers'] = len(teachers)
+        course_ids = []
+        for teacher in teachers:
+            courses = Course.objects.bulk_create([
+                Course(title=self.text(3), description=self.text(40), teacher=teacher,
+                       created_at=self.now - timedelta(days=self.random.randint(0, 365)))
+                for _ in range(options['courses_per_teacher'])
+            ])
+            for course in courses:
+                self.create_lessons(course)
+            course_ids.extend(course.pk for course in courses)
+        self.counts['courses'] = len(course_ids)
+        return course_ids
+
+    def create_lessons(self, course):
+        options = self.options
+        lessons = Lesson.objects.bulk_create([
+            Lesson(course=course, title=self.text(4), content=self.text(150))
+            for _ in range(options['lessons_per_course'])
+        ])
+        # Половина заданий уже прошла, половина впереди
+        assignments = Assignment.objects.bulk_create([
+            Assignment(lesson=lesson, title=self.text(4), description=self.text(60),
+                       deadline=self.now + timedelta(days=self.random.randint(-60, 60)))
+            for lesson in lessons for _ in range(options['assignments_per_lesson'])
+        ])
+        self.assignments[course.pk] = [(assignment.pk, assignment.deadline) for assignment in assignments]
+        self.counts['lessons'] += len(lessons)
+        self.counts['assignments'] += len(assignments)
+
+    def create_students(self, course_ids):
+        options = self.options
+        batch_size = options['batch_size']
+        per_student = min(options['courses_per_student'], len(course_ids))
+        for start in range(0, options['students'], batch_size):
+            students = self.users('student', min(batch_size, options['students'] - start), start)
+            enrollments, submissions, reviews = [], [], []
+            with transaction.atomic():
+                User.objects.bulk_create(students)
+                for student in students:
+                    for course_id in self.random.sample(course_ids, per_student):
+                        enrollments.append(Course.students.through(course_id=course_id, user_id=student.pk))
+                        submissions.extend(self.submissions(student, course_id))
+                        if self.random.random() < options['review_rate']:
+                            reviews.append(Review(course_id=course_id, student=student,
+                                                  rating=self.random.choices(range(1, 6), (1, 1, 3, 6, 6))[0],
+                                                  comment=self.text(12)))
+                Course.students.through.objects.bulk_create(enrollments, batch_size=batch_size)
+                Submission.objects.bulk_create(submissions, batch_size=batch_size)
+                Review.objects.bulk_create(reviews, batch_size=batch_size)
+            self.counts['students'] += len(students)
+            self.counts['enrollments'] += len(enrollments)
+            self.counts['submissions'] += len(submissions)
+            self.counts['reviews'] += len(reviews)
+            self.stdout.write(f"  студентов: {self.counts['students']}, работ: {self.counts['submissions']}")
+
+    def submissions(self, student, course_id):
+        options = self.options
+        for assignment_id, deadline in self.assignments[course_id]:
+            if deadline > self.now or self.random.random() >= options['submission_rate']:
+                continue
+            # Каждая десятая работа сдана после дедлайна
+            late = self.random.random() < 0.1
+            submitted_at = deadline + timedelta(hours=self.random.randint(1, 72) * (1 if late else -1))
+            submitted_at = min(submitted_at, self.now)
+            name = f'submissions/{options["prefix"]}/{assignment_id}/{student.pk}.zip'
+            if not options['no_files']:
+                name = default_storage.save(name, ContentFile(self.random.randbytes(options['file_size'])))
+            graded = self.random.random() < 0.6
+            yield Submission(
+                assignment_id=assignment_id, student=student, file=name, submitted_at=submitted_at,
+                is_late=submitted_at > deadline, grade=self.random.randint(2, 5) if graded else None,
+            )
@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик (DATABASE_REPLICA_URLS=sqlite:///...) '
+        'через online backup API. Нужна для локальной проверки маршрутизации чтения на реплики.'
+    )
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Основная база не SQLite: реплики настраиваются средствами СУБД.')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте DATABASE_REPLICA_URLS.')
+
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                replica = connections[alias]
+                if replica.vendor != 'sqlite':
+                    raise CommandError(f'Реплика {alias} не SQLite.')
+                replica.close()
+                target = sqlite3.connect(replica.settings_dict['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f'{alias}: {replica.settings_dict["NAME"]}'))
+        finally:
+            source.close()
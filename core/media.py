@@ -0,0 +1,142 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .storage import blob_hash, blob_path
+
+SIGNING_SALT = 'core.media'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def signed_media_url(name):
+    token = signing.dumps(name, salt=SIGNING_SALT, compress=True)
+    return reverse('protected_media', kwargs={'token': token, 'filename': os.path.basename(name)})
+
+
+def media_redirect(field_file):
+    """
+    Перенаправляет на подписанную ссылку на файл. Доступ уже проверен
+    представлением, а дальнейшие Range-запросы плеера идут по ссылке
+    без обращений к базе.
+    """
+    if not field_file:
+        raise Http404('Файл не прикреплен.')
+    return HttpResponseRedirect(signed_media_url(field_file.name))
+
+
+def serve_media(request, token, filename):
+    try:
+        name = signing.loads(token, salt=SIGNING_SALT, max_age=settings.MEDIA_URL_MAX_AGE)
+    except signing.BadSignature:
+        raise Http404('Ссылка недействительна или устарела.')
+    return file_response(request, name)
+
+
+class _RangeFile:
+    """
+    Ограничивает чтение файла диапазоном. fileno() отдается как есть,
+    поэтому wsgi.file_wrapper сервера может отправить диапазон через sendfile.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Разбирает одиночный диапазон bytes=a-b. Возвращает (start, end), None или False, если он невыполним."""
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def file_response(request, name, storage=default_storage):
+    """
+    Отдает файл хранилища с поддержкой Range, If-Range и условных GET.
+    Если задан MEDIA_ACCEL_REDIRECT_PREFIX, передача отдается фронт-прокси
+    через X-Accel-Redirect, и байты файла вовсе не проходят через Python.
+    """
+    if not storage.exists(name):
+        raise Http404('Файл не найден.')
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+    if accel_prefix:
+        response = HttpResponse(content_type=content_type)
+        # Файл по содержимому лежит на диске под хэшем, имя для скачивания — из ссылки
+        digest = blob_hash(name)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(blob_path(digest) if digest else name)
+        if digest:
+            response['Content-Disposition'] = content_disposition_header(False, os.path.basename(name))
+        return response
+
+    path = storage.path(name)
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{size:x}')
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if if_range is None or if_range == etag:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = FileResponse(_RangeFile(open(path, 'rb'), start, length),
+                            filename=os.path.basename(name), content_type=content_type)
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, max_age=settings.MEDIA_URL_MAX_AGE)
+    return response
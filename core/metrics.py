@@ -0,0 +1,139 @@
+"""
+Метрики процесса в текстовом формате Prometheus.
+
+Значения живут в памяти воркера: каждый процесс отдает свои, а суммирует
+их Prometheus. Обновление — словарь под блокировкой, без обращений
+к базе и кэшу, поэтому метрики можно писать на горячем пути.
+"""
+import threading
+from bisect import bisect_left
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def add(self, amount, labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(self.key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.add(amount, labels)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        self.add(amount, labels)
+
+    def dec(self, amount=1, **labels):
+        self.add(-amount, labels)
+
+
+class Histogram(Metric):
+    """Гистограмма с накопительными корзинами, как в клиенте Prometheus."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def value(self, **labels):
+        """Число наблюдений."""
+        state = self.values.get(self.key(labels))
+        return state[2] if state else 0
+
+    def total(self, **labels):
+        """Сумма наблюдений."""
+        state = self.values.get(self.key(labels))
+        return state[1] if state else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', {**labels, 'le': repr(float(bound))}, cumulative
+            yield f'{self.name}_bucket', {**labels, 'le': '+Inf'}, count
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+registry = {}
+
+
+def register(metric):
+    """Регистрирует метрику; повторная регистрация (перезагрузка модуля) возвращает уже известную."""
+    return registry.setdefault(metric.name, metric)
+
+
+def counter(name, documentation, labels=()):
+    return register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation, labels=()):
+    return register(Gauge(name, documentation, labels))
+
+
+def histogram(name, documentation, labels=(), buckets=()):
+    return register(Histogram(name, documentation, labels, buckets))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+    return '{%s}' % ','.join(f'{name}="{value}"' for name, value in escaped)
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    lines = []
+    for metric in sorted(registry.values(), key=lambda metric: metric.name):
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,73 @@
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .cache import get_cache
+from .routers import replica_aliases, replica_reads
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает безопасным запросам читать с реплик.
+
+    После изменяющего запроса клиент на DATABASE_REPLICA_STICKY_SECONDS
+    закрепляется за основной базой (read-your-writes): реплика могла
+    еще не получить только что записанные данные. Клиент определяется
+    по заголовку Authorization или cookie сессии, без обращения к базе.
+    Без настроенных реплик middleware отключается.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = replica_reads.set(self.can_read_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        self.remember_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        # Кэш синхронный: в поток уходим только там, где он нужен
+        safe = request.method in SAFE_METHODS
+        token = replica_reads.set(safe and await sync_to_async(self.can_read_replica)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        if not safe:
+            await sync_to_async(self.remember_write)(request, response)
+        return response
+
+    def sticky_key(self, request):
+        identity = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not identity:
+            return None
+        return 'core:db:primary:' + hashlib.md5(identity.encode()).hexdigest()
+
+    def can_read_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        key = self.sticky_key(request)
+        return key is None or get_cache().get(key) is None
+
+    def remember_write(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        key = self.sticky_key(request)
+        if key is not None:
+            get_cache().set(key, 1, timeout=settings.DATABASE_REPLICA_STICKY_SECONDS)
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['lesson', 'deadline', 'id'], name='assignment_lesson_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'id'], name='lesson_course_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_outbox_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('group', models.CharField(max_length=100)),
+                ('event', models.CharField(max_length=50)),
+                ('message', models.TextField()),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'id'], name='notification_group_seq_idx'), models.Index(fields=['created_at'], name='notification_created_idx')],
+            },
+        ),
+    ]
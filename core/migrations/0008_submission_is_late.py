@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:01
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def fill_is_late(apps, schema_editor):
+    Assignment = apps.get_model('core', 'Assignment')
+    Submission = apps.get_model('core', 'Submission')
+    Submission.objects.update(is_late=Exists(
+        Assignment.objects.filter(pk=OuterRef('assignment_id'), deadline__lt=OuterRef('submitted_at'))
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='is_late',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_is_late, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['assignment', 'student', 'is_late'], name='submission_status_idx'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:12
+
+from itertools import islice
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core.stemming import stem_text
+
+SQLITE_INDEX = [
+    # Внешнее содержимое: текст хранится только в core_searchdocument.
+    # Тип и курс индексируются, чтобы фильтровать ими внутри MATCH
+    "CREATE VIRTUAL TABLE core_searchdocument_fts USING fts5("
+    "title_terms, body_terms, kind, course_id, content='core_searchdocument', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    # Совпадение в названии весит в 10 раз больше, чем в тексте; фильтры в ранге не участвуют
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 0.0, 0.0)')",
+    "CREATE TRIGGER core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(rowid, title_terms, body_terms, kind, course_id) "
+    "VALUES (new.id, new.title_terms, new.body_terms, new.kind, new.course_id); END",
+    "CREATE TRIGGER core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, title_terms, body_terms, kind, course_id) "
+    "VALUES ('delete', old.id, old.title_terms, old.body_terms, old.kind, old.course_id); END",
+    "CREATE TRIGGER core_searchdocument_au AFTER UPDATE OF title_terms, body_terms, course_id ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, title_terms, body_terms, kind, course_id) "
+    "VALUES ('delete', old.id, old.title_terms, old.body_terms, old.kind, old.course_id); "
+    "INSERT INTO core_searchdocument_fts(rowid, title_terms, body_terms, kind, course_id) "
+    "VALUES (new.id, new.title_terms, new.body_terms, new.kind, new.course_id); END",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS core_searchdocument_ai',
+    'DROP TRIGGER IF EXISTS core_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS core_searchdocument_au',
+    'DROP TABLE IF EXISTS core_searchdocument_fts',
+]
+POSTGRES_INDEX = [
+    "ALTER TABLE core_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', title_terms), 'A') || "
+    "setweight(to_tsvector('russian', body_terms), 'B')) STORED",
+    'CREATE INDEX core_searchdocument_vector_idx ON core_searchdocument USING gin (search_vector)',
+]
+POSTGRES_DROP = ['ALTER TABLE core_searchdocument DROP COLUMN IF EXISTS search_vector']
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+    # Уже существующие объекты попадают в индекс сразу
+    prepare = stem_text if vendor == 'sqlite' else (lambda text: text)
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    sources = [
+        ('course', apps.get_model('core', 'Course').objects.values_list('id', 'id', 'title', 'description')),
+        ('lesson', apps.get_model('core', 'Lesson').objects.values_list('id', 'course_id', 'title', 'content')),
+        ('assignment', apps.get_model('core', 'Assignment').objects.values_list(
+            'id', 'lesson__course_id', 'title', 'description')),
+    ]
+    for kind, rows in sources:
+        rows = rows.order_by('id').iterator(chunk_size=1000)
+        while batch := [
+            SearchDocument(kind=kind, object_id=object_id, course_id=course_id, title=title,
+                           title_terms=prepare(title), body_terms=prepare(body))
+            for object_id, course_id, title, body in islice(rows, 1000)
+        ]:
+            SearchDocument.objects.bulk_create(batch)
+    if vendor == 'sqlite':
+        # После массовой вставки сегменты индекса сливаются в один
+        schema_editor.execute("INSERT INTO core_searchdocument_fts(core_searchdocument_fts) VALUES ('optimize')")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for statement in {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_submission_is_late'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Курс'), ('lesson', 'Урок'), ('assignment', 'Задание')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('title_terms', models.TextField()),
+                ('body_terms', models.TextField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.course')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_object_uniq'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:19
+
+import core.storage
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='content_hash',
+            field=core.storage.ContentHashField(),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='content_hash',
+            field=core.storage.ContentHashField(),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to='lesson_materials/'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='file',
+            field=models.FileField(max_length=255, upload_to='submissions/'),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refs', 'updated_at'], name='blob_gc_idx')],
+            },
+        ),
+    ]
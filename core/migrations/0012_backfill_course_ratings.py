@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+def backfill_course_ratings(apps, schema_editor):
+    """Агрегаты для отзывов, оставленных до появления CourseRating (как rebuild_course_ratings)."""
+    CourseRating = apps.get_model('core', 'CourseRating')
+    Review = apps.get_model('core', 'Review')
+    existing = set(CourseRating.objects.values_list('course_id', flat=True))
+    rows = Review.objects.values('course_id').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        **{f'rating_{r}': Count('id', filter=Q(rating=r)) for r in range(1, 6)},
+    )
+    CourseRating.objects.bulk_create(
+        [CourseRating(**row) for row in rows if row['course_id'] not in existing],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_course_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_backfill_course_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='deleting',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='deleting',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_deleting_flags'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('active', 'Загружается'), ('writing', 'Записывается часть'), ('complete', 'Завершена')], default='active', max_length=20),
+        ),
+    ]
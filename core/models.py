@@ -1,5 +1,13 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+from .storage import ContentHashField
 
 class User(AbstractUser):
     is_teacher = models.BooleanField(default=False)
@@ -11,12 +19,29 @@ class Course(models.Model):
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='courses_taught')
     students = models.ManyToManyField(User, related_name='courses_enrolled', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Удаление поставлено в очередь (core.jobs): курс скрыт, пока задача его не удалит
+    deleting = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Индекс под курсорную пагинацию по (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='course_created_id_idx'),
+        ]
 
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=200)
     content = models.TextField()
-    file = models.FileField(upload_to='lesson_materials/', null=True, blank=True)
+    file = models.FileField(upload_to='lesson_materials/', max_length=255, null=True, blank=True)
+    content_hash = ContentHashField()
+    # Удаление поставлено в очередь: урок скрыт, пока задача его не удалит
+    deleting = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Уроки курсов студента: фильтр по course_id + порядок по id
+            models.Index(fields=['course', 'id'], name='lesson_course_id_idx'),
+        ]
 
 class Assignment(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='assignments')
@@ -24,17 +49,229 @@ class Assignment(models.Model):
     description = models.TextField()
     deadline = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['deadline', 'id'], name='assignment_deadline_id_idx'),
+            models.Index(fields=['lesson', 'deadline', 'id'], name='assignment_lesson_idx'),
+        ]
+
 class Submission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions')
     student = models.ForeignKey(User, on_delete=models.CASCADE)
-    file = models.FileField(upload_to='submissions/')
+    file = models.FileField(upload_to='submissions/', max_length=255)
+    # SHA-256 файла: одинаковые работы разных студентов находятся по индексу
+    content_hash = ContentHashField()
     submitted_at = models.DateTimeField(auto_now_add=True)
-    
+    # Сдано после дедлайна; пересчитывается при сохранении и при переносе дедлайна
+    is_late = models.BooleanField(default=False)
+    grade = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['submitted_at', 'id'], name='submission_submitted_id_idx'),
+            # Студент видит только свои работы — фильтр + диапазон по одному индексу
+            models.Index(fields=['student', 'submitted_at', 'id'], name='submission_student_idx'),
+            # Статус сдачи (сдал / опоздал / не сдал) по заданию и студенту читается из индекса
+            models.Index(fields=['assignment', 'student', 'is_late'], name='submission_status_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        submitted_at = self.submitted_at or timezone.now()
+        self.is_late = submitted_at > self.assignment.deadline
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Submission by {self.student} for {self.assignment}"
 
 class Review(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='reviews')
     student = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.IntegerField()
-    comment = models.TextField()
\ No newline at end of file
+    rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    comment = models.TextField()
+
+class CourseRating(models.Model):
+    """
+    Денормализованные агрегаты отзывов курса: количество, сумма и гистограмма 1–5.
+    Обновляются атомарно в ReviewViewSet, пересчитываются командой rebuild_course_ratings.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 2) if self.count else None
+
+    @property
+    def histogram(self):
+        return {str(r): getattr(self, f'rating_{r}') for r in range(1, 6)}
+
+class UploadSession(models.Model):
+    """
+    Сессия загрузки файла частями: init, PUT частей по смещению, finalize.
+    Принятые байты лежат во временном файле part_path до финализации.
+    """
+    KIND_CHOICES = [
+        ('submission', 'Выполненное задание'),
+        ('lesson', 'Материалы урока'),
+    ]
+    STATUS_CHOICES = [
+        ('active', 'Загружается'),
+        ('writing', 'Записывается часть'),
+        ('complete', 'Завершена'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, null=True, blank=True)
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    crc32 = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    submission = models.ForeignKey(Submission, on_delete=models.SET_NULL, null=True, blank=True)
+    # Заявленный клиентом SHA-256: файл, уже загруженный этим пользователем, не передается повторно
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'status'], name='upload_owner_status_idx'),
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx'),
+        ]
+
+    @property
+    def part_path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{self.pk}.part')
+
+
+class OutboxEvent(models.Model):
+    """
+    Событие для рассылки по WebSocket. Записывается в той же транзакции,
+    что и изменение данных, и удаляется диспетчером после отправки.
+    """
+    kind = models.CharField(max_length=50)
+    group = models.CharField(max_length=100)
+    message = models.TextField()
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Notification(models.Model):
+    """
+    Отправленное уведомление. Хранится одной строкой на группу, а не на
+    получателя; id служит порядковым номером (seq), по которому клиент
+    догоняет пропущенные события после переподключения.
+    """
+    id = models.BigAutoField(primary_key=True)
+    group = models.CharField(max_length=100)
+    event = models.CharField(max_length=50)
+    message = models.TextField()
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', 'id'], name='notification_group_seq_idx'),
+            models.Index(fields=['created_at'], name='notification_created_idx'),
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    Строка поискового индекса: курс, урок или задание. Текст хранится уже
+    подготовленным для полнотекстового индекса базы (см. core.search),
+    а курс — для фильтра видимости. Обновляется сигналами при сохранении.
+    """
+    KIND_CHOICES = [
+        ('course', 'Курс'),
+        ('lesson', 'Урок'),
+        ('assignment', 'Задание'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=200)
+    title_terms = models.TextField()
+    body_terms = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_object_uniq'),
+        ]
+
+
+class Job(models.Model):
+    """
+    Фоновая задача очереди core.jobs. Воркер забирает задачу, продлевая
+    аренду (locked_until) между пачками; задача упавшего воркера после
+    истечения аренды достается другому. Ошибка переводит задачу обратно
+    в очередь с задержкой, пока не исчерпаны попытки.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('succeeded', 'Выполнена'),
+        ('failed', 'Ошибка'),
+        ('cancelled', 'Отменена'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    # Больше — раньше
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    progress = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Выбор следующей задачи: статус, затем порядок выдачи — по одному индексу
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_claim_idx'),
+            models.Index(fields=['owner', 'id'], name='job_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+
+class Blob(models.Model):
+    """
+    Файл хранилища core.storage, общий для всех ссылок с тем же содержимым.
+    refs — число ссылок из Submission.file и Lesson.file; файл без ссылок
+    удаляет сборщик мусора (команда collect_blobs).
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Последнее изменение счетчика или повторная запись того же файла
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['refs', 'updated_at'], name='blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.sha256} ({self.refs})'
@@ -0,0 +1,57 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Course, Notification
+
+# Сколько пропущенных уведомлений отправляется одним кадром при переподключении
+REPLAY_BATCH_SIZE = 200
+
+
+def user_group(user_id):
+    """Группа всех сокетов одного пользователя."""
+    return f'user.{user_id}'
+
+
+def course_group(course_id):
+    """Группа сокетов студентов и преподавателя курса."""
+    return f'course.{course_id}'
+
+
+def user_groups(user):
+    """Все группы, уведомления которых получает пользователь."""
+    taught = Course.objects.filter(teacher=user).values_list('id', flat=True)
+    enrolled = Course.students.through.objects.filter(user_id=user.pk).values_list('course_id', flat=True)
+    return {user_group(user.pk)} | {course_group(course_id) for course_id in set(taught) | set(enrolled)}
+
+
+def notification_payload(notification):
+    return {
+        'seq': notification.id,
+        'event': notification.event,
+        'message': notification.message,
+        'data': notification.data,
+    }
+
+
+def missed_notifications(groups, since, limit=REPLAY_BATCH_SIZE):
+    """Уведомления групп с порядковым номером больше since, по возрастанию."""
+    queryset = Notification.objects.filter(group__in=groups, id__gt=since).order_by('id')[:limit]
+    return [notification_payload(notification) for notification in queryset]
+
+
+def group_send(group, message):
+    """Синхронная отправка события группе; для вызова из представлений и сигналов."""
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(group, message)
+
+
+def sync_course_subscriptions(pairs, subscribe=True):
+    """
+    Подписывает (или отписывает) уже открытые сокеты студентов на группы курсов
+    после записи/отчисления, чтобы не ждать переподключения.
+    pairs — пары (course_id, user_id).
+    """
+    event_type = 'course.subscribe' if subscribe else 'course.unsubscribe'
+    for course_id, user_id in pairs:
+        group_send(user_group(user_id), {'type': event_type, 'group': course_group(course_id)})
@@ -0,0 +1,227 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, Cursor, CursorPagination, _positive_int, _reverse_ordering
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по составному ключу, например (submitted_at, id).
+
+    В отличие от стандартной CursorPagination, курсор хранит значения всех
+    полей сортировки, а последнее поле (id) уникально, поэтому смещение
+    не нужно: каждая страница — это диапазон по составному индексу,
+    и глубокие страницы стоят столько же, сколько первая.
+
+    Порядок сортировки берется из атрибута `ordering` представления.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        assert ordering[-1].lstrip('-') in ('id', 'pk'), (
+            'Последним полем сортировки должен быть уникальный id.'
+        )
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный вариант paginate_queryset для асинхронных представлений."""
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([obj async for obj in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor.reverse if self.cursor else False
+        self.position = self.cursor.position if self.cursor else None
+
+        ordering = _reverse_ordering(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self._get_keyset_filter(ordering, self.position))
+
+        # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Назад идти некуда: следующая страница — это первая страница
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if not all(isinstance(value, str) for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        # Курсор приходит от клиента: значения приводятся к типам полей здесь,
+        # а не в запросе, где ошибка превратилась бы в 500
+        try:
+            position = [self._get_field(order).to_python(value) for order, value in zip(self.ordering, position)]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def _get_field(self, order):
+        field_name = order.lstrip('-')
+        if field_name == 'pk':
+            return self.model._meta.pk
+        return self.model._meta.get_field(field_name)
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = cursor._replace(position=json.dumps(cursor.position, separators=(',', ':')))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            position.append(None if attr is None else str(attr))
+        return position
+
+    def _get_keyset_filter(self, ordering, position):
+        """
+        Строит условие (a, b, id) > (x, y, z) с учетом направления каждого поля:
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z).
+        """
+        keyset_filter = Q()
+        equal = Q()
+        for order, value in zip(ordering, position):
+            field_name = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') else '__gt'
+            keyset_filter |= equal & Q(**{field_name + lookup: value})
+            equal &= Q(**{field_name: value})
+        return keyset_filter
+
+
+class RankedPagination(BasePagination):
+    """
+    Постраничная выдача ранжированных результатов поиска по номеру страницы.
+
+    Общее число совпадений не считается: COUNT по индексу для частого слова
+    дороже самого поиска. Глубина ограничена max_page — OFFSET растет
+    с номером страницы, а так далеко в выдачу никто не листает.
+    Представление запрашивает limit/offset через get_limits и передает
+    найденное в set_page.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    page_query_param = 'page'
+    max_page = 50
+    invalid_page_message = 'Неверный номер страницы.'
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param],
+                                 strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_limits(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page_number = _positive_int(request.query_params.get(self.page_query_param, 1), strict=True)
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        if self.page_number > self.max_page:
+            raise NotFound(self.invalid_page_message)
+        # На одну запись больше, чтобы узнать, есть ли следующая страница
+        return self.page_size + 1, (self.page_number - 1) * self.page_size
+
+    def set_page(self, results):
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size and self.page_number < self.max_page
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
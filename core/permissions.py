@@ -1,6 +1,57 @@
 from rest_framework import permissions
 from core.models import Course
 
+
+def _enrollment_cache(request, course_id):
+    """Возвращает словарь-кэш проверок на время запроса и ключ для курса."""
+    user = request.user
+    if not user.is_authenticated:
+        return None, None
+    try:
+        course_id = int(course_id)
+    except (TypeError, ValueError):
+        return None, None
+
+    # Кэш храним на исходном HttpRequest, он общий для всех обёрток запроса
+    http_request = getattr(request, '_request', request)
+    cache = getattr(http_request, '_enrollment_cache', None)
+    if cache is None:
+        cache = http_request._enrollment_cache = {}
+    return cache, (user.pk, course_id)
+
+
+def _enrollment_query(key):
+    user_id, course_id = key
+    return Course.students.through.objects.filter(course_id=course_id, user_id=user_id)
+
+
+def is_enrolled(request, course_id):
+    """
+    Проверяет, записан ли текущий пользователь на курс.
+
+    Выполняет один EXISTS-запрос по уникальному индексу (course_id, user_id)
+    промежуточной таблицы Course.students вместо загрузки всего списка студентов.
+    Результат запоминается на время запроса, поэтому несколько классов
+    разрешений делят один ответ.
+    """
+    cache, key = _enrollment_cache(request, course_id)
+    if cache is None:
+        return False
+    if key not in cache:
+        cache[key] = _enrollment_query(key).exists()
+    return cache[key]
+
+
+async def ais_enrolled(request, course_id):
+    """Асинхронный вариант is_enrolled для асинхронных представлений."""
+    cache, key = _enrollment_cache(request, course_id)
+    if cache is None:
+        return False
+    if key not in cache:
+        cache[key] = await _enrollment_query(key).aexists()
+    return cache[key]
+
+
 class IsTeacherOrReadOnly(permissions.BasePermission):
     """
     Разрешение: только преподаватели могут создавать, редактировать и удалять ресурсы.
@@ -13,6 +64,13 @@ class IsTeacherOrReadOnly(permissions.BasePermission):
         # Разрешить создание/изменение/удаление только преподавателям
         return request.user.is_authenticated and request.user.is_teacher
 
+class IsTeacher(permissions.BasePermission):
+    """
+    Разрешение: только преподаватели, в том числе для чтения.
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_teacher
+
 class IsOwnerOrTeacher(permissions.BasePermission):
     """
     Разрешение: студенты могут видеть только свои выполненные задания.
@@ -30,7 +88,7 @@ class IsOwnerOrTeacher(permissions.BasePermission):
         if request.user.is_teacher:
             return True
         # Студенты могут видеть/редактировать только свои выполненные задания
-        return obj.student == request.user
+        return obj.student_id == request.user.pk
 
 class IsEnrolledOrTeacher(permissions.BasePermission):
     """
@@ -49,8 +107,23 @@ class IsEnrolledOrTeacher(permissions.BasePermission):
         if request.user.is_teacher:
             return True
         # Студенты могут видеть курс, только если они на него записаны
-        return request.user in obj.students.all()
+        return is_enrolled(request, obj.pk)
+
+    async def ahas_object_permission(self, request, view, obj):
+        if request.user.is_teacher:
+            return True
+        return await ais_enrolled(request, obj.pk)
     
+class CanEnroll(permissions.BasePermission):
+    """
+    Разрешение: записаться на курс могут студенты и преподаватели.
+    Общие разрешения курса здесь не подходят: IsTeacherOrReadOnly запрещает
+    студентам POST, а IsEnrolledOrTeacher — курс, на который они еще не записаны.
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        return user.is_authenticated and (user.is_teacher or user.is_student)
+
 class CanReviewCourse(permissions.BasePermission):
     """
     Разрешение: студенты могут оставлять отзывы только на курсы, на которые они записаны.
@@ -62,9 +135,6 @@ class CanReviewCourse(permissions.BasePermission):
             course_id = request.data.get('course')
             if not course_id:
                 return False
-            try:
-                course = Course.objects.get(id=course_id)
-                return request.user in course.students.all()
-            except Course.DoesNotExist:
-                return False
+            # Несуществующий курс дает ту же пустую выборку, отдельный запрос не нужен
+            return is_enrolled(request, course_id)
         return True
\ No newline at end of file
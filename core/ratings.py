@@ -0,0 +1,61 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import CourseRating, Review
+
+RATING_VALUES = range(1, 6)
+
+
+def apply_review(course_id, rating, sign=1):
+    """
+    Учитывает (sign=1) или вычитает (sign=-1) один отзыв в агрегатах курса.
+
+    Обновление выполняется одним UPDATE с выражениями F(), поэтому параллельные
+    отзывы на один курс не теряют друг друга. Вызывается внутри транзакции
+    вместе с изменением самого отзыва, причем так, чтобы отзыв в этот момент
+    был в таблице: прибавление — после сохранения, вычитание — до удаления
+    или изменения. Если строки агрегатов у курса еще нет (отзывы оставлены
+    до ее появления), она строится по таблице отзывов, где этот отзыв уже
+    учтен, и уходить ниже нуля нечему.
+    """
+    if not CourseRating.objects.filter(course_id=course_id).exists() and _create_from_reviews(course_id):
+        if sign > 0:
+            transaction.on_commit(lambda: bump_version('course'))
+            return
+    updates = {
+        'count': F('count') + sign,
+        'total': F('total') + sign * rating,
+        'updated_at': timezone.now(),
+    }
+    # Старые отзывы могли попасть в базу до валидации диапазона 1–5
+    if rating in RATING_VALUES:
+        updates[f'rating_{rating}'] = F(f'rating_{rating}') + sign
+    CourseRating.objects.filter(course_id=course_id).update(**updates)
+    # Рейтинг входит в представление курса — сбрасываем кэш после коммита
+    transaction.on_commit(lambda: bump_version('course'))
+
+
+def _create_from_reviews(course_id):
+    """Создает строку агрегатов курса по его отзывам; False, если ее уже создал параллельный запрос."""
+    values = compute_ratings([course_id]).get(course_id, {})
+    try:
+        with transaction.atomic():
+            CourseRating.objects.create(course_id=course_id, **values)
+    except IntegrityError:
+        return False
+    return True
+
+
+def compute_ratings(course_ids=None):
+    """Считает агрегаты по таблице отзывов одним GROUP BY запросом."""
+    reviews = Review.objects.all()
+    if course_ids is not None:
+        reviews = reviews.filter(course_id__in=course_ids)
+    rows = reviews.values('course_id').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        **{f'rating_{r}': Count('id', filter=Q(rating=r)) for r in RATING_VALUES},
+    )
+    return {row.pop('course_id'): row for row in rows}
@@ -0,0 +1,43 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Можно ли текущему запросу читать с реплики. Вне HTTP-запросов
+# (команды, воркеры, shell) все идет в основную базу
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись — в основную базу, чтение моделей core — с реплик, если запрос
+    это разрешил (см. ReplicaRoutingMiddleware). Реплики не мигрируются:
+    это копии основной базы.
+    """
+    app_label = 'core'
+
+    def __init__(self, replicas=None):
+        self.replicas = replica_aliases() if replicas is None else list(replicas)
+
+    def db_for_read(self, model, **hints):
+        if self.replicas and model._meta.app_label == self.app_label and replica_reads.get():
+            return random.choice(self.replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas:
+            return False
+        return None
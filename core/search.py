@@ -0,0 +1,217 @@
+"""
+Полнотекстовый поиск по курсам, урокам и заданиям.
+
+Индекс — таблица SearchDocument, по строке на объект; над ней строит
+инвертированный индекс сама база: в SQLite — таблица FTS5 с внешним
+содержимым, которую синхронизируют триггеры, в PostgreSQL — хранимый
+столбец tsvector с GIN-индексом (обе создает миграция 0009).
+
+SQLite умеет стемминг только английских слов, поэтому русские слова
+приводятся к основе в Python (core.stemming) и при индексации, и в запросе.
+Конфигурация russian в PostgreSQL сама стеммит и русские, и английские слова.
+
+Ранжируются все совпадения, а работа ограничена страницей: ORDER BY rank
+с LIMIT — база держит только лучшие offset + limit строк, а не сортирует
+все найденные. Выдачу нельзя обрезать по свежести до ранжирования:
+точное совпадение в старом документе для частого слова тогда пропало
+бы целиком. Время ответа на частое слово растет с числом совпадений;
+глубина выдачи ограничена RankedPagination.max_page.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .models import Assignment, Course, Lesson, SearchDocument
+from .stemming import stem_text
+
+BATCH_SIZE = 1000
+
+FTS_TABLE = 'core_searchdocument_fts'
+
+
+class SQLiteBackend:
+    """
+    FTS5: тип и курс тоже столбцы индекса, поэтому фильтры видимости
+    пересекаются со списками совпадений внутри MATCH, а не проверяются
+    по строкам после него.
+    """
+    def prepare(self, text):
+        return stem_text(text)
+
+    def search(self, cursor, query, kind, course_ids, limit, offset):
+        terms = stem_text(query).split()
+        if not terms:
+            return []
+        # Каждое слово в кавычках: синтаксис FTS5 из запроса не интерпретируется
+        expression = '{title_terms body_terms} : (%s)' % ' '.join(f'"{term}"' for term in terms)
+        if kind is not None:
+            expression += f' AND kind : "{kind}"'
+        if course_ids is not None:
+            expression += ' AND course_id : (%s)' % ' OR '.join(f'"{course_id}"' for course_id in course_ids)
+        # rank настроен в миграции как bm25 с весами столбцов: меньше — лучше.
+        # Страница выбирается по одному индексу FTS, документы читаются только для нее
+        cursor.execute(
+            f'SELECT d.kind, d.object_id, d.course_id, d.title, m.rank '
+            f'FROM (SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'      ORDER BY rank, rowid LIMIT %s OFFSET %s) m '
+            f'JOIN core_searchdocument d ON d.id = m.rowid ORDER BY m.rank, d.id',
+            [expression, limit, offset],
+        )
+        return cursor.fetchall()
+
+    def optimize(self, cursor):
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+class PostgresBackend:
+    def prepare(self, text):
+        return text
+
+    def search(self, cursor, query, kind, course_ids, limit, offset):
+        if not query.strip():
+            return []
+        where, params = ['d.search_vector @@ q.query'], [query]
+        if kind is not None:
+            where.append('d.kind = %s')
+            params.append(kind)
+        if course_ids is not None:
+            where.append('d.course_id = ANY(%s)')
+            params.append(list(course_ids))
+        # Совпадения находит GIN-индекс, ts_rank считается по хранимому столбцу
+        cursor.execute(
+            "SELECT d.kind, d.object_id, d.course_id, d.title, -ts_rank(d.search_vector, q.query) AS rank "
+            "FROM plainto_tsquery('russian', %%s) AS q(query), core_searchdocument d "
+            "WHERE %s ORDER BY rank, d.id LIMIT %%s OFFSET %%s" % ' AND '.join(where),
+            params + [limit, offset],
+        )
+        return cursor.fetchall()
+
+    def optimize(self, cursor):
+        cursor.execute('ANALYZE core_searchdocument')
+
+
+BACKENDS = {'sqlite': SQLiteBackend(), 'postgresql': PostgresBackend()}
+
+
+def get_backend(using):
+    return BACKENDS[connections[using].vendor]
+
+
+MODEL_KINDS = {Course: 'course', Lesson: 'lesson', Assignment: 'assignment'}
+
+# Курс или урок, поставленный на удаление, пропадает из выдачи вместе
+# с содержимым сразу, а не когда до него дойдет воркер (core.jobs)
+VISIBLE = {
+    Course: Q(deleting=False),
+    Lesson: Q(deleting=False, course__deleting=False),
+    Assignment: Q(lesson__deleting=False, lesson__course__deleting=False),
+}
+
+
+def document_fields(instance):
+    """Курс, название и текст объекта для индекса."""
+    if isinstance(instance, Course):
+        return instance.pk, instance.title, instance.description
+    if isinstance(instance, Lesson):
+        return instance.course_id, instance.title, instance.content
+    return instance.lesson.course_id, instance.title, instance.description
+
+
+def build_document(instance, backend):
+    course_id, title, body = document_fields(instance)
+    return SearchDocument(
+        kind=MODEL_KINDS[type(instance)], object_id=instance.pk, course_id=course_id, title=title,
+        title_terms=backend.prepare(title), body_terms=backend.prepare(body),
+    )
+
+
+def index_object(instance):
+    """Добавляет или обновляет объект в индексе."""
+    model = type(instance)
+    if not model.objects.filter(VISIBLE[model], pk=instance.pk).exists():
+        remove_object(instance)
+        return
+    using = router.db_for_write(SearchDocument)
+    document = build_document(instance, get_backend(using))
+    SearchDocument.objects.using(using).update_or_create(
+        kind=document.kind, object_id=document.object_id,
+        defaults={field: getattr(document, field) for field in ('course_id', 'title', 'title_terms', 'body_terms')},
+    )
+    if document.kind == 'lesson':
+        # Урок могли перенести в другой курс вместе с заданиями
+        SearchDocument.objects.using(using).filter(
+            kind='assignment', object_id__in=instance.assignments.values('id'),
+        ).exclude(course_id=document.course_id).update(course_id=document.course_id)
+
+
+def remove_object(instance):
+    """Убирает объект из индекса."""
+    SearchDocument.objects.filter(kind=MODEL_KINDS[type(instance)], object_id=instance.pk).delete()
+
+
+def _scope(model, pk):
+    """Курс с уроками и заданиями или урок с заданиями."""
+    if model is Course:
+        return [Course.objects.filter(pk=pk), Lesson.objects.filter(course_id=pk),
+                Assignment.objects.select_related('lesson').filter(lesson__course_id=pk)]
+    return [Lesson.objects.filter(pk=pk), Assignment.objects.select_related('lesson').filter(lesson_id=pk)]
+
+
+def hide_scope(model, pk):
+    """Убирает из индекса курс или урок вместе с содержимым."""
+    for queryset in _scope(model, pk):
+        SearchDocument.objects.filter(kind=MODEL_KINDS[queryset.model], object_id__in=queryset.values('id')).delete()
+
+
+def restore_scope(model, pk):
+    """Возвращает в индекс видимое содержимое курса или урока после отмены удаления."""
+    for queryset in _scope(model, pk):
+        for instance in queryset.filter(VISIBLE[queryset.model]).iterator(chunk_size=BATCH_SIZE):
+            index_object(instance)
+
+
+def rebuild_index(batch_size=BATCH_SIZE):
+    """Строит индекс заново по всем объектам; возвращает число документов."""
+    using = router.db_for_write(SearchDocument)
+    backend = get_backend(using)
+    querysets = [
+        Course.objects.filter(VISIBLE[Course]).order_by('id'),
+        Lesson.objects.filter(VISIBLE[Lesson]).order_by('id'),
+        Assignment.objects.filter(VISIBLE[Assignment]).select_related('lesson').order_by('id'),
+    ]
+    total = 0
+    # Пока индекс строится, поиск видит старый
+    with transaction.atomic(using=using):
+        SearchDocument.objects.using(using).all().delete()
+        for queryset in querysets:
+            batch = []
+            for instance in queryset.iterator(chunk_size=batch_size):
+                batch.append(build_document(instance, backend))
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.using(using).bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            SearchDocument.objects.using(using).bulk_create(batch)
+            total += len(batch)
+    with connections[using].cursor() as cursor:
+        backend.optimize(cursor)
+    return total
+
+
+def search(user, query, kind=None, course_id=None, limit=20, offset=0):
+    """
+    Результаты поиска по убыванию релевантности. Преподаватели ищут по всем
+    курсам, студенты — только по тем, на которые записаны.
+    """
+    using = router.db_for_read(SearchDocument)
+    course_ids = None if course_id is None else [course_id]
+    if not user.is_teacher:
+        enrollments = Course.students.through.objects.using(using).filter(user_id=user.pk)
+        if course_id is not None:
+            enrollments = enrollments.filter(course_id=course_id)
+        course_ids = list(enrollments.values_list('course_id', flat=True))
+        if not course_ids:
+            return []
+
+    with connections[using].cursor() as cursor:
+        rows = get_backend(using).search(cursor, query, kind, course_ids, limit, offset)
+    return [dict(zip(('kind', 'id', 'course', 'title', 'rank'), row)) for row in rows]
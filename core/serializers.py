@@ -1,6 +1,134 @@
+import os
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.urls import reverse
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, NullIf, Round
+from django.utils.text import get_valid_filename
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_serializer
 from .models import *
+from .submissions import assignment_status
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+class ValuesListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        return self.child.represent_rows(data)
+
+
+class ValuesSerializer(serializers.Serializer):
+    """
+    Сериализатор только для чтения поверх строк queryset.values().
+
+    Поля объявляются как обычно (по ним строится схема API), source поля —
+    путь ORM, например lesson__course_id, или имя аннотации из annotations.
+    Список собирается одним проходом по словарям: to_representation
+    вызывается только у полей, значение которых из базы рендерер JSON
+    не выведет так же (например, даты при USE_TZ в другом часовом поясе).
+    """
+    annotations = {}
+
+    class Meta:
+        list_serializer_class = ValuesListSerializer
+
+    @classmethod
+    def values_queryset(cls, queryset):
+        sources = [field.source or name for name, field in cls._declared_fields.items()]
+        return queryset.annotate(**cls.annotations).values(*sources)
+
+    def _plain(self, field):
+        if isinstance(field, serializers.DateTimeField):
+            return not settings.USE_TZ or settings.TIME_ZONE == 'UTC'
+        return type(field) in (serializers.IntegerField, serializers.CharField,
+                               serializers.BooleanField, serializers.FloatField)
+
+    def represent_rows(self, rows):
+        fields = [(name, field.source, None if self._plain(field) else field.to_representation)
+                  for name, field in self.fields.items()]
+        return [
+            {name: value if convert is None or value is None else convert(value)
+             for name, source, convert in fields for value in (row[source],)}
+            for row in rows
+        ]
+
+    def to_representation(self, row):
+        return self.represent_rows([row])[0]
+
+
+SPARSE_FIELDS_RE = re.compile(r'^fields\[(\w+)\]$')
+
+
+class SparseFieldsMixin:
+    """
+    Разреженные наборы полей: context['fields'][fieldset] — список полей,
+    которые нужно вывести, остальные пропускаются. Без списка выводятся
+    все поля, поэтому схема API строится по полному набору.
+    """
+    fieldset = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields', {}).get(self.fieldset)
+        if requested is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in requested}
+
+
+def sparse_fieldsets(serializer):
+    """Наборы полей сериализатора и вложенных в него SparseFieldsMixin: {набор: [поля]}."""
+    fieldsets = {serializer.fieldset: list(serializer.fields)}
+    for field in serializer.fields.values():
+        field = getattr(field, 'child', field)
+        if isinstance(field, SparseFieldsMixin):
+            fieldsets.update(sparse_fieldsets(field))
+    return fieldsets
+
+
+def parse_sparse_fields(query_params, serializer):
+    """
+    Разбирает параметры fields[<набор>]=поле,поле для serializer.
+    Неизвестный набор или поле — ValidationError, а не молча пустой ответ.
+    """
+    allowed = sparse_fieldsets(serializer)
+    fields, errors = {}, {}
+    for key, value in query_params.items():
+        match = SPARSE_FIELDS_RE.match(key)
+        if not match:
+            continue
+        fieldset = match.group(1)
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        if fieldset not in allowed:
+            errors[key] = f'Неизвестный набор полей. Допустимые: {", ".join(allowed)}.'
+        elif unknown := [name for name in names if name not in allowed[fieldset]]:
+            errors[key] = f'Неизвестные поля: {", ".join(unknown)}. Допустимые: {", ".join(allowed[fieldset])}.'
+        else:
+            fields[fieldset] = names
+    if errors:
+        raise serializers.ValidationError(errors)
+    return fields
+
+
+class ProtectedFileField(serializers.FileField):
+    """
+    Файл принимается как в FileField, а в ответе вместо адреса в хранилище
+    (/media/ не раздается) — ссылка на действие file ViewSet: оно проверяет
+    доступ и перенаправляет на временную подписанную ссылку (core.media).
+    """
+
+    def __init__(self, view_name, **kwargs):
+        self.view_name = view_name
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value or value.instance.pk is None:
+            return None
+        url = reverse(self.view_name, kwargs={'pk': value.instance.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
 
 @extend_schema_serializer(component_name="User")
 class UserSerializer(serializers.ModelSerializer):
@@ -14,8 +142,25 @@ class UserSerializer(serializers.ModelSerializer):
             'is_student': {'help_text': 'Является ли пользователь студентом'},
         }
 
+@extend_schema_serializer(component_name="CourseRating")
+class CourseRatingSerializer(serializers.ModelSerializer):
+    average = serializers.FloatField(read_only=True, allow_null=True, help_text='Средняя оценка курса')
+    histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True,
+                                      help_text='Количество отзывов по каждой оценке от 1 до 5')
+
+    class Meta:
+        model = CourseRating
+        fields = ['count', 'total', 'average', 'histogram', 'updated_at']
+        extra_kwargs = {
+            'count': {'help_text': 'Количество отзывов'},
+            'total': {'help_text': 'Сумма оценок'},
+            'updated_at': {'help_text': 'Дата последнего обновления рейтинга'},
+        }
+
 @extend_schema_serializer(component_name="Course")
 class CourseSerializer(serializers.ModelSerializer):
+    rating = CourseRatingSerializer(read_only=True, allow_null=True, help_text='Агрегированный рейтинг курса')
+
     class Meta:
         model = Course
         fields = '__all__'
@@ -26,21 +171,57 @@ class CourseSerializer(serializers.ModelSerializer):
             'teacher': {'help_text': 'Идентификатор преподавателя'},
             'students': {'help_text': 'Список идентификаторов студентов, записанных на курс'},
             'created_at': {'help_text': 'Дата создания курса'},
+            'deleting': {'help_text': 'Курс удаляется фоновой задачей', 'read_only': True},
         }
 
+@extend_schema_serializer(component_name="CourseListItem")
+class CourseListSerializer(ValuesSerializer):
+    """Курс в списке: вместо списка студентов — их количество."""
+    annotations = {
+        # Подзапрос считается только для строк страницы, без GROUP BY по всем курсам
+        'student_count': Coalesce(Subquery(
+            Course.students.through.objects.filter(course_id=OuterRef('pk'))
+            .values('course_id').annotate(count=Count('*')).values('count')
+        ), 0),
+        'rating_average': Round(F('rating__total') * 1.0 / NullIf(F('rating__count'), 0), 2),
+    }
+
+    id = serializers.IntegerField(help_text='Уникальный идентификатор курса')
+    title = serializers.CharField(help_text='Название курса')
+    teacher = serializers.IntegerField(source='teacher_id', help_text='Идентификатор преподавателя')
+    created_at = serializers.DateTimeField(help_text='Дата создания курса')
+    student_count = serializers.IntegerField(help_text='Количество записанных студентов')
+    rating_average = serializers.FloatField(allow_null=True, help_text='Средняя оценка курса')
+    rating_count = serializers.IntegerField(source='rating__count', allow_null=True, help_text='Количество отзывов')
+
 @extend_schema_serializer(component_name="Lesson")
 class LessonSerializer(serializers.ModelSerializer):
+    file = ProtectedFileField('lesson-file', max_length=255, required=False, allow_null=True,
+                              help_text='Файл с материалами урока (если есть); ссылка ведет на /lessons/{id}/file/')
+
     class Meta:
         model = Lesson
         fields = '__all__'
         extra_kwargs = {
             'id': {'help_text': 'Уникальный идентификатор урока'},
-            'course': {'help_text': 'Идентификатор курса, к которому относится урок'},
+            # Курсы и уроки в очереди на удаление не принимают нового содержимого
+            'course': {'help_text': 'Идентификатор курса, к которому относится урок', 'queryset': Course.objects.filter(deleting=False)},
             'title': {'help_text': 'Название урока'},
             'content': {'help_text': 'Содержание урока'},
-            'file': {'help_text': 'Файл с материалами урока (если есть)'},
+            'content_hash': {'help_text': 'SHA-256 файла (пусто для файлов, загруженных до хранилища по содержимому)'},
+            'deleting': {'help_text': 'Урок удаляется фоновой задачей', 'read_only': True},
         }
 
+@extend_schema_serializer(component_name="LessonListItem")
+class LessonListSerializer(ValuesSerializer):
+    """Урок в списке: без текста, только признак прикрепленного файла."""
+    annotations = {'has_file': ExpressionWrapper(Q(file__isnull=False) & ~Q(file=''), output_field=BooleanField())}
+
+    id = serializers.IntegerField(help_text='Уникальный идентификатор урока')
+    course = serializers.IntegerField(source='course_id', help_text='Идентификатор курса, к которому относится урок')
+    title = serializers.CharField(help_text='Название урока')
+    has_file = serializers.BooleanField(help_text='Есть ли у урока файл с материалами')
+
 @extend_schema_serializer(component_name="Assignment")
 class AssignmentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -48,26 +229,58 @@ class AssignmentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         extra_kwargs = {
             'id': {'help_text': 'Уникальный идентификатор задания'},
-            'lesson': {'help_text': 'Идентификатор урока, к которому относится задание'},
+            'lesson': {'help_text': 'Идентификатор урока, к которому относится задание', 'queryset': Lesson.objects.filter(deleting=False, course__deleting=False)},
             'title': {'help_text': 'Название задания'},
             'description': {'help_text': 'Описание задания'},
             'deadline': {'help_text': 'Крайний срок сдачи задания'},
         }
 
+@extend_schema_serializer(component_name="AssignmentListItem")
+class AssignmentListSerializer(ValuesSerializer):
+    """Задание в списке: без описания, с курсом для группировки на клиенте."""
+    id = serializers.IntegerField(help_text='Уникальный идентификатор задания')
+    lesson = serializers.IntegerField(source='lesson_id', help_text='Идентификатор урока, к которому относится задание')
+    course = serializers.IntegerField(source='lesson__course_id', help_text='Идентификатор курса')
+    title = serializers.CharField(help_text='Название задания')
+    deadline = serializers.DateTimeField(help_text='Крайний срок сдачи задания')
+
 @extend_schema_serializer(component_name="Submission")
 class SubmissionSerializer(serializers.ModelSerializer):
+    file = ProtectedFileField('submission-file', max_length=255,
+                              help_text='Файл с выполненным заданием; ссылка ведет на /submissions/{id}/file/')
+
     class Meta:
         model = Submission
         fields = '__all__'
         extra_kwargs = {
             'id': {'help_text': 'Уникальный идентификатор выполненного задания'},
-            'assignment': {'help_text': 'Идентификатор задания'},
+            'assignment': {'help_text': 'Идентификатор задания', 'queryset': Assignment.objects.filter(lesson__deleting=False, lesson__course__deleting=False)},
             'student': {'help_text': 'Идентификатор студента, который выполнил задание'},
-            'file': {'help_text': 'Файл с выполненным заданием'},
+            'content_hash': {'help_text': 'SHA-256 файла: одинаковые работы имеют одинаковый хэш'},
             'submitted_at': {'help_text': 'Дата и время отправки задания'},
-            'grade': {'help_text': 'Оценка за задание (если есть)'},
+            'is_late': {'help_text': 'Отправлено после дедлайна', 'read_only': True},
+            'grade': {'help_text': 'Оценка за задание (если есть); выставляет преподаватель', 'read_only': True},
         }
 
+@extend_schema_serializer(component_name="SubmissionListItem")
+class SubmissionListSerializer(ValuesSerializer):
+    """Выполненное задание в списке: без ссылки на файл (она в /submissions/{id}/file/)."""
+    id = serializers.IntegerField(help_text='Уникальный идентификатор выполненного задания')
+    assignment = serializers.IntegerField(source='assignment_id', help_text='Идентификатор задания')
+    student = serializers.IntegerField(source='student_id', help_text='Идентификатор студента, который выполнил задание')
+    submitted_at = serializers.DateTimeField(help_text='Дата и время отправки задания')
+    is_late = serializers.BooleanField(help_text='Отправлено после дедлайна')
+    grade = serializers.IntegerField(allow_null=True, help_text='Оценка за задание (если есть)')
+
+@extend_schema_serializer(component_name="Grade")
+class GradeSerializer(serializers.ModelSerializer):
+    grade = serializers.IntegerField(min_value=0, max_value=100, allow_null=True,
+                                     help_text='Оценка от 0 до 100; null снимает оценку')
+
+    class Meta:
+        model = Submission
+        fields = ['grade']
+
 @extend_schema_serializer(component_name="Review")
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
@@ -75,8 +288,213 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = '__all__'
         extra_kwargs = {
             'id': {'help_text': 'Уникальный идентификатор отзыва'},
-            'course': {'help_text': 'Идентификатор курса, на который оставлен отзыв'},
+            'course': {'help_text': 'Идентификатор курса, на который оставлен отзыв', 'queryset': Course.objects.filter(deleting=False)},
             'student': {'help_text': 'Идентификатор студента, оставившего отзыв'},
             'rating': {'help_text': 'Оценка курса (от 1 до 5)'},
             'comment': {'help_text': 'Комментарий к отзыву'},
-        }
\ No newline at end of file
+        }
+@extend_schema_serializer(component_name="BulkEnrollment")
+class BulkEnrollmentSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=['enroll', 'unenroll'], default='enroll',
+                                     help_text='enroll — записать, unenroll — отчислить')
+    users = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                  help_text='Идентификаторы студентов (только для конкретного курса)')
+    enrollments = serializers.ListField(child=serializers.DictField(), required=False,
+                                        help_text='Список записей вида {"course": 1, "user": 2}')
+    file = serializers.FileField(required=False, help_text='Файл со списком записей в формате CSV (course,user) или JSONL')
+    format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False,
+                                     help_text='Формат файла; по умолчанию определяется по расширению')
+    background = serializers.BooleanField(default=False,
+                                          help_text='Выполнить в фоне: ответ 202 с задачей, результат — в /jobs/{id}/')
+
+    def validate(self, attrs):
+        if not any(key in attrs for key in ('users', 'enrollments', 'file')):
+            raise serializers.ValidationError('Укажите users, enrollments или file.')
+        return attrs
+
+@extend_schema_serializer(component_name="EnrollmentResult")
+class EnrollmentResultSerializer(serializers.Serializer):
+    row = serializers.IntegerField(help_text='Номер строки во входных данных')
+    course = serializers.IntegerField(help_text='Идентификатор курса')
+    user = serializers.IntegerField(help_text='Идентификатор студента')
+    status = serializers.CharField(help_text='Результат: enrolled, already_enrolled, unenrolled, not_enrolled, unknown_course, unknown_user, invalid или other_course (курс строки не совпадает с курсом в адресе)')
+
+
+@extend_schema_serializer(component_name="UploadSession")
+class UploadSessionSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(min_value=1, help_text='Полный размер файла в байтах')
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'kind', 'assignment', 'lesson', 'filename', 'size', 'sha256', 'offset', 'crc32',
+                  'status', 'submission', 'created_at', 'updated_at']
+        read_only_fields = ['offset', 'crc32', 'status', 'submission', 'created_at', 'updated_at']
+        extra_kwargs = {
+            'id': {'help_text': 'Идентификатор сессии загрузки'},
+            'kind': {'help_text': 'Что загружается: submission — выполненное задание, lesson — материалы урока'},
+            'assignment': {'help_text': 'Идентификатор задания (для kind=submission)', 'queryset': Assignment.objects.filter(lesson__deleting=False, lesson__course__deleting=False)},
+            'lesson': {'help_text': 'Идентификатор урока (для kind=lesson)', 'queryset': Lesson.objects.filter(deleting=False, course__deleting=False)},
+            'filename': {'help_text': 'Имя файла'},
+            'sha256': {'help_text': 'SHA-256 файла (необязательно). Если вы уже загружали этот файл, '
+                                    'offset сразу равен size и можно вызывать finalize'},
+            'offset': {'help_text': 'Сколько байт уже принято; следующая часть начинается с этого смещения'},
+            'crc32': {'help_text': 'CRC32 принятых байт'},
+            'status': {'help_text': 'Состояние загрузки'},
+            'submission': {'help_text': 'Созданное выполненное задание после финализации'},
+        }
+
+    def validate_filename(self, value):
+        return get_valid_filename(os.path.basename(value))
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and not SHA256_RE.match(value):
+            raise serializers.ValidationError('Ожидается SHA-256: 64 шестнадцатеричных символа.')
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if attrs['kind'] == 'submission':
+            if not attrs.get('assignment'):
+                raise serializers.ValidationError({'assignment': 'Укажите задание.'})
+            attrs['lesson'] = None
+        else:
+            if not user.is_teacher:
+                raise serializers.ValidationError({'kind': 'Материалы урока загружают только преподаватели.'})
+            if not attrs.get('lesson'):
+                raise serializers.ValidationError({'lesson': 'Укажите урок.'})
+            attrs['assignment'] = None
+        return attrs
+
+
+@extend_schema_serializer(component_name="Job")
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'priority', 'attempts', 'max_attempts', 'run_at',
+                  'progress', 'result', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+        extra_kwargs = {
+            'id': {'help_text': 'Идентификатор задачи'},
+            'kind': {'help_text': 'Вид задачи, например course.delete'},
+            'status': {'help_text': 'queued — в очереди, running — выполняется, succeeded — выполнена, failed — ошибка, cancelled — отменена'},
+            'priority': {'help_text': 'Приоритет: задачи с большим выполняются раньше'},
+            'attempts': {'help_text': 'Сделано попыток'},
+            'max_attempts': {'help_text': 'Сколько попыток допускается до статуса failed'},
+            'run_at': {'help_text': 'Не раньше какого времени задача будет выполнена (повтор после ошибки — с задержкой)'},
+            'progress': {'help_text': 'Прогресс: сколько строк обработано на каждом шаге'},
+            'result': {'help_text': 'Результат выполненной задачи'},
+            'error': {'help_text': 'Трассировка последней ошибки'},
+            'created_at': {'help_text': 'Время постановки в очередь'},
+            'started_at': {'help_text': 'Начало последней попытки'},
+            'finished_at': {'help_text': 'Время завершения'},
+        }
+
+
+@extend_schema_serializer(component_name="Notification")
+class NotificationSerializer(serializers.ModelSerializer):
+    seq = serializers.IntegerField(source='id', read_only=True, help_text='Порядковый номер уведомления')
+
+    class Meta:
+        model = Notification
+        fields = ['seq', 'event', 'message', 'data', 'created_at']
+        extra_kwargs = {
+            'event': {'help_text': 'Тип события, например assignment.created'},
+            'message': {'help_text': 'Текст уведомления'},
+            'data': {'help_text': 'Данные события'},
+            'created_at': {'help_text': 'Время отправки'},
+        }
+
+
+@extend_schema_serializer(component_name="StudentSubmissionStatus")
+class StudentSubmissionStatusSerializer(serializers.Serializer):
+    id = serializers.IntegerField(help_text='Идентификатор студента')
+    username = serializers.CharField(help_text='Имя пользователя')
+    submitted_at = serializers.DateTimeField(allow_null=True, help_text='Время последней отправки (если есть)')
+
+
+@extend_schema_serializer(component_name="AssignmentSubmissionStatus")
+class AssignmentSubmissionStatusSerializer(serializers.Serializer):
+    id = serializers.IntegerField(help_text='Идентификатор задания')
+    title = serializers.CharField(help_text='Название задания')
+    deadline = serializers.DateTimeField(help_text='Крайний срок сдачи')
+    status = serializers.SerializerMethodField(help_text='submitted — сдано вовремя, late — с опозданием, missing — не сдано')
+    submitted_at = serializers.DateTimeField(allow_null=True, help_text='Время последней отправки (если есть)')
+
+    def get_status(self, obj) -> str:
+        return assignment_status(obj)
+
+
+@extend_schema_serializer(component_name="SearchResult")
+class SearchResultSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=SearchDocument.KIND_CHOICES, help_text='Что найдено: course, lesson или assignment')
+    id = serializers.IntegerField(help_text='Идентификатор найденного объекта')
+    course = serializers.IntegerField(help_text='Идентификатор курса, к которому относится объект')
+    title = serializers.CharField(help_text='Название')
+    rank = serializers.FloatField(help_text='Релевантность: чем меньше, тем выше в выдаче')
+
+
+@extend_schema_serializer(component_name="DashboardCourse")
+class DashboardCourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    fieldset = 'course'
+    student_count = serializers.IntegerField(read_only=True, help_text='Количество записанных студентов')
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'description', 'teacher', 'created_at', 'student_count']
+        extra_kwargs = {
+            'id': {'help_text': 'Уникальный идентификатор курса'},
+            'title': {'help_text': 'Название курса'},
+            'description': {'help_text': 'Описание курса'},
+            'teacher': {'help_text': 'Идентификатор преподавателя'},
+            'created_at': {'help_text': 'Дата создания курса'},
+        }
+
+
+@extend_schema_serializer(component_name="DashboardAssignment")
+class DashboardAssignmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    fieldset = 'assignment'
+    status = serializers.SerializerMethodField(help_text='Статус сдачи вызывающего: submitted — вовремя, late — с опозданием, missing — не сдано; null для преподавателя')
+    submitted_at = serializers.DateTimeField(read_only=True, allow_null=True, help_text='Время последней отправки вызывающего (если есть)')
+    grade = serializers.IntegerField(read_only=True, allow_null=True, help_text='Оценка последней по времени сдачи оцененной работы вызывающего (если есть)')
+
+    class Meta:
+        model = Assignment
+        fields = ['id', 'title', 'description', 'deadline', 'status', 'submitted_at', 'grade']
+        extra_kwargs = {
+            'id': {'help_text': 'Уникальный идентификатор задания'},
+            'title': {'help_text': 'Название задания'},
+            'description': {'help_text': 'Описание задания'},
+            'deadline': {'help_text': 'Крайний срок сдачи задания'},
+        }
+
+    def get_status(self, obj) -> Optional[str]:
+        # Аннотаций статуса нет у преподавателя: своих работ у него нет
+        if not hasattr(obj, 'on_time'):
+            return None
+        return assignment_status(obj)
+
+
+@extend_schema_serializer(component_name="DashboardLesson")
+class DashboardLessonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    fieldset = 'lesson'
+    has_file = serializers.BooleanField(read_only=True, help_text='Есть ли у урока файл с материалами (ссылка — /lessons/{id}/file/)')
+    assignments = DashboardAssignmentSerializer(many=True, read_only=True, help_text='Задания урока по дедлайну')
+
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'content', 'has_file', 'assignments']
+        extra_kwargs = {
+            'id': {'help_text': 'Уникальный идентификатор урока'},
+            'title': {'help_text': 'Название урока'},
+            'content': {'help_text': 'Содержание урока'},
+        }
+
+
+@extend_schema_serializer(component_name="CourseDashboard")
+class CourseDashboardSerializer(SparseFieldsMixin, serializers.Serializer):
+    """Страница курса целиком; разделы и их поля выбираются параметрами fields[<набор>]."""
+    fieldset = 'dashboard'
+    course = DashboardCourseSerializer(read_only=True, help_text='Курс')
+    rating = CourseRatingSerializer(read_only=True, help_text='Агрегированный рейтинг курса')
+    lessons = DashboardLessonSerializer(many=True, read_only=True, help_text='Уроки курса по порядку создания')
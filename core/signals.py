@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .blobs import release, retain
+from .cache import bump_version
+from .models import Assignment, Course, Lesson, Submission, User
+from .notifications import sync_course_subscriptions
+from .search import index_object, remove_object
+from .submissions import refresh_late_flags
+from .tokens import invalidate_token, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def revoke_cached_token(sender, instance, **kwargs):
+    # Сразу и после коммита: иначе параллельный запрос успеет вернуть в кэш старое.
+    # Ключ — первичный ключ, после удаления Django обнулит его у instance
+    key = instance.key
+    invalidate_token(key)
+    transaction.on_commit(lambda: invalidate_token(key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_token_cache(sender, instance, created, raw=False, **kwargs):
+    # Флаги пользователя (is_active, is_teacher, ...) хранятся в кэше токенов
+    if not created and not raw:
+        invalidate_user_tokens(instance.pk)
+        transaction.on_commit(lambda: invalidate_user_tokens(instance.pk))
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    # После коммита: иначе параллельный GET закэширует старые строки под новой версией
+    transaction.on_commit(lambda: bump_version('course'))
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_version('lesson'))
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Assignment)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    # Фикстуры (loaddata) загружаются без индекса: rebuild_search_index
+    if not raw:
+        index_object(instance)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Assignment)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_object(instance)
+
+
+@receiver(post_save, sender=Assignment)
+def update_late_submissions(sender, instance, created, **kwargs):
+    # Дедлайн могли перенести — флаги опоздания уже сданных работ устарели
+    if not created:
+        refresh_late_flags(instance)
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def invalidate_enrollment_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Список студентов входит в представление курса
+    names = ['course']
+    if action == 'post_clear':
+        # Затронутые студенты неизвестны — сбрасываем уроки целиком
+        names.append('lesson')
+    elif reverse:
+        names.append(f'user:{instance.pk}')
+    else:
+        names.extend(f'user:{pk}' for pk in pk_set)
+    transaction.on_commit(lambda: bump_version(*names))
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def sync_enrollment_subscriptions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        pairs = [(course_id, instance.pk) for course_id in pk_set]
+    else:
+        pairs = [(instance.pk, user_id) for user_id in pk_set]
+    transaction.on_commit(lambda: sync_course_subscriptions(pairs, subscribe=action == 'post_add'))
+
+
+@receiver(post_init, sender=Submission)
+@receiver(post_init, sender=Lesson)
+def remember_content_hash(sender, instance, **kwargs):
+    # Через __dict__: отложенное поле (only/defer) не должно загружаться запросом
+    instance._saved_content_hash = instance.__dict__.get('content_hash', '')
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_save, sender=Lesson)
+def count_file_references(sender, instance, raw=False, **kwargs):
+    if raw or instance.content_hash == instance._saved_content_hash:
+        return
+    release(instance._saved_content_hash)
+    retain(instance.content_hash)
+    instance._saved_content_hash = instance.content_hash
+
+
+@receiver(post_delete, sender=Submission)
+@receiver(post_delete, sender=Lesson)
+def release_file_reference(sender, instance, **kwargs):
+    release(instance._saved_content_hash)
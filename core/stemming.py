@@ -0,0 +1,126 @@
+"""
+Стеммер Портера (Snowball) для русского языка.
+
+SQLite FTS5 умеет стемминг только английских слов (токенизатор porter),
+поэтому русские слова приводятся к основе до записи в индекс и в запросе.
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+     'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+))
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+# Служебные слова не индексируются, как и в словарях PostgreSQL: они есть почти
+# в каждом документе, ничего не дают ранжированию и дорого стоят в запросе
+STOP_WORDS = frozenset('''
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот
+от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять
+уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб
+без будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один
+почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после
+над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+иногда лучше чуть том нельзя такой им более всегда конечно всю между это
+a an and are as at be but by for from has have if in into is it its of on or that the their then there
+these they this to was were will with
+'''.split())
+
+CYRILLIC = re.compile('[а-я]')
+
+
+def _after_vowel_consonant(word, start):
+    """Начало области после первой пары «гласная, согласная» начиная со start."""
+    for i in range(start + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, rv, groups):
+    """
+    Отрезает самое длинное окончание из групп в области RV. Окончания
+    первой группы отрезаются, только если перед ними стоит «а» или «я».
+    Возвращает новое слово или None, если окончание не найдено.
+    """
+    first, second = groups
+    for suffix in sorted(first + second, key=len, reverse=True):
+        start = len(word) - len(suffix)
+        if start < rv or not word.endswith(suffix):
+            continue
+        if suffix in second:
+            return word[:start]
+        if start - 1 >= rv and word[start - 1] in 'ая':
+            return word[:start]
+        return None
+    return None
+
+
+# Словарь реальных текстов невелик, а основа слова нужна при каждой индексации
+@lru_cache(maxsize=100_000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+    r2 = _after_vowel_consonant(word, _after_vowel_consonant(word, 0))
+
+    # Шаг 1: деепричастие, иначе возвратная частица и одно из окончаний
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        word = stripped
+    else:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stripped = _strip(word, rv, ADJECTIVE)
+        if stripped is not None:
+            word = _strip(stripped, rv, PARTICIPLE) or stripped
+        else:
+            for groups in (VERB, NOUN):
+                stripped = _strip(word, rv, groups)
+                if stripped is not None:
+                    word = stripped
+                    break
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3: словообразовательное окончание в R2
+    for suffix in DERIVATIONAL:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r2:
+            word = word[:-len(suffix)]
+            break
+
+    # Шаг 4
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    for suffix in SUPERLATIVE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= rv:
+            word = word[:-len(suffix)]
+            return word[:-1] if word.endswith('нн') and len(word) - 2 >= rv else word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def stem_text(text):
+    """
+    Текст в нижнем регистре без служебных слов, русские слова приведены
+    к основе, остальные оставлены как есть.
+    """
+    return ' '.join(stem(token) if CYRILLIC.search(token) else token
+                    for token in re.findall(r'\w+', text.lower().replace('ё', 'е')) if token not in STOP_WORDS)
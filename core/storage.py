@@ -0,0 +1,142 @@
+"""
+Хранилище файлов с адресацией по содержимому.
+
+Файл сохраняется один раз под своим SHA-256: blobs/ab/<sha256>. Имя
+в модели — blobs/ab/<sha256>/<исходное имя>, поэтому у каждой ссылки
+остается свое имя для скачивания, а на диске лежит одна копия. Хэш
+считается по ходу записи во временный файл, так что одинаковая повторная
+загрузка стоит одного чтения тела и не занимает места.
+
+Ссылки считает core.blobs (Blob.refs) по сигналам моделей; delete() для
+таких имен ничего не делает — ненужные файлы удаляет сборщик мусора
+(команда collect_blobs). Старые имена без префикса blobs/ обслуживаются
+как в FileSystemStorage.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+BLOB_NAME_RE = re.compile(r'^blobs/[0-9a-f]{2}/([0-9a-f]{64})/')
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def blob_hash(name):
+    """SHA-256 из имени файла в хранилище или '' для имени вне blobs/."""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group(1) if match else ''
+
+
+def blob_path(digest):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}'
+
+
+def blob_name(digest, filename):
+    return f'{blob_path(digest)}/{os.path.basename(filename)}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def path(self, name):
+        digest = blob_hash(name)
+        return super().path(blob_path(digest) if digest else name)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым и не конфликтует; укорачиваем только исходное имя
+        if max_length is None:
+            return name
+        root, ext = os.path.splitext(os.path.basename(name))
+        room = max_length - len(blob_name('0' * 64, ''))
+        return root[:max(room - len(ext), 1)] + ext
+
+    def _save(self, name, content):
+        from .blobs import touch_blob
+
+        temporary = getattr(content, 'temporary_file_path', None)
+        if temporary is not None:
+            # Файл уже на диске (часть загрузки, большой upload): читаем и переносим без копии
+            source = temporary()
+            digest, size = self._hash_file(source)
+        else:
+            source, digest, size = self._spool(content)
+
+        # Запись Blob обновляется до появления файла: сборщик мусора удаляет
+        # строку и файл в одной транзакции и не тронет только что затронутую
+        touch_blob(digest, size)
+        target = self.path(blob_path(digest))
+        if os.path.exists(target):
+            if temporary is None:
+                os.remove(source)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            file_move_safe(source, target, allow_overwrite=True)
+            # Перенос сохраняет mtime исходника; сборщик сирот смотрит на него
+            os.utime(target)
+            if self.file_permissions_mode is not None:
+                os.chmod(target, self.file_permissions_mode)
+        return blob_name(digest, name)
+
+    def _hash_file(self, path):
+        digest, size = hashlib.sha256(), 0
+        with open(path, 'rb') as file:
+            while block := file.read(READ_BLOCK_SIZE):
+                digest.update(block)
+                size += len(block)
+        return digest.hexdigest(), size
+
+    def _spool(self, content):
+        directory = super().path(os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory)
+        digest, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    spool.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, digest.hexdigest(), size
+
+    def delete(self, name):
+        if not blob_hash(name):
+            super().delete(name)
+
+
+class ContentHashField(models.CharField):
+    """
+    SHA-256 содержимого файлового поля source, взятый из имени файла.
+    Объявляется после поля source: значения полей при сохранении готовятся
+    по порядку объявления, и к этому моменту файл уже записан в хранилище.
+    """
+
+    def __init__(self, *args, source='file', **kwargs):
+        self.source = source
+        kwargs.setdefault('max_length', 64)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.source != 'file':
+            kwargs['source'] = self.source
+        for key, default in (('max_length', 64), ('blank', True), ('editable', False), ('db_index', True)):
+            if kwargs.get(key, not default) == default:
+                kwargs.pop(key, None)
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = blob_hash(getattr(model_instance, self.source).name)
+        setattr(model_instance, self.attname, value)
+        return value
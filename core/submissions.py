@@ -0,0 +1,77 @@
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q, Subquery
+
+from .events import record_event
+from .models import Assignment, Course, Submission, User
+from .notifications import user_group
+
+SUBMITTED = 'submitted'
+LATE = 'late'
+MISSING = 'missing'
+STATUSES = (SUBMITTED, LATE, MISSING)
+
+
+def record_submission_created(submission):
+    """Уведомление преподавателю о новой работе; вызывается в транзакции ее создания."""
+    teacher_id = Course.objects.filter(lessons__assignments=submission.assignment_id).values_list('teacher_id', flat=True).first()
+    record_event(
+        'submission.created', user_group(teacher_id),
+        f'{submission.student.username} сдал задание «{submission.assignment.title}»',
+        submission=submission.pk, assignment=submission.assignment_id, student=submission.student_id,
+    )
+
+
+def refresh_late_flags(assignment):
+    """Пересчитывает is_late всех работ задания одним UPDATE, например после переноса дедлайна."""
+    return Submission.objects.filter(assignment=assignment).update(
+        is_late=ExpressionWrapper(Q(submitted_at__gt=assignment.deadline), output_field=BooleanField())
+    )
+
+
+def _status_filter(submissions, status):
+    """
+    Студент сдал вовремя, если есть хоть одна работа до дедлайна; опоздал —
+    если работы есть, но все после дедлайна; не сдал — если работ нет.
+    Каждое условие — проверка по индексу (assignment, student, is_late).
+    """
+    on_time = Exists(submissions.filter(is_late=False))
+    if status == SUBMITTED:
+        return on_time
+    if status == LATE:
+        return Exists(submissions) & ~on_time
+    return ~Exists(submissions)
+
+
+def students_by_status(assignment, status):
+    """Студенты курса задания с указанным статусом сдачи и временем последней работы."""
+    submissions = Submission.objects.filter(assignment=assignment, student=OuterRef('pk'))
+    return (
+        User.objects.filter(courses_enrolled=assignment.lesson.course_id)
+        .filter(_status_filter(submissions, status))
+        .annotate(submitted_at=Subquery(submissions.order_by('-submitted_at').values('submitted_at')[:1]))
+        .only('id', 'username')
+    )
+
+
+def status_annotations(student_id):
+    """Аннотации queryset заданий, по которым assignment_status определяет статус студента."""
+    submissions = Submission.objects.filter(assignment=OuterRef('pk'), student=student_id)
+    return {
+        'on_time': Exists(submissions.filter(is_late=False)),
+        'submitted_at': Subquery(submissions.order_by('-submitted_at').values('submitted_at')[:1]),
+    }
+
+
+def assignment_statuses(course_id, student_id):
+    """Задания курса с отметками, сдал ли студент вовремя и сдавал ли вообще."""
+    return (
+        Assignment.objects.filter(lesson__course=course_id)
+        .annotate(**status_annotations(student_id))
+        .only('id', 'title', 'deadline')
+    )
+
+
+def assignment_status(assignment):
+    """Статус по аннотациям assignment_statuses."""
+    if assignment.on_time:
+        return SUBMITTED
+    return LATE if assignment.submitted_at is not None else MISSING
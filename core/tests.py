@@ -1,3 +1,1722 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from learning_platform.settings import _database
+
+from .models import User, Course, CourseRating, Lesson, Assignment, Submission, Review, UploadSession, OutboxEvent, Notification, SearchDocument, Job, Blob
+from .consumers import NotificationConsumer
+from .middleware import ReplicaRoutingMiddleware
+from .pagination import KeysetCursorPagination
+from .uploads import UploadError, write_chunk
+from .routers import PrimaryReplicaRouter
+from .views import AssignmentViewSet, CourseViewSet, LessonViewSet
+from .events import COALESCE_THRESHOLD, dispatch_batch, record_event
+from .layers import SQLiteChannelLayer
+from .notifications import course_group, user_group
+from .permissions import is_enrolled
+from .tokens import authenticate_key, get_cache, local_cache
+from .throttling import parse_rate, throttled_requests
+from .instrumentation import Trace, current_trace, n_plus_one_requests, request_queries
+from .admission import Overloaded, get_pool, queued_requests, rejected_requests
+from .blobs import collect_garbage
+from .jobs import LeaseLost, checkpoint, claim, enqueue, registry, run_pending, task
+from .stemming import stem_text
+
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class CoreTestCase(TestCase):
+    def setUp(self):
+        # Кэш ответов locmem живет дольше тестовой базы
+        cache.clear()
+
+
+class KeysetPaginationTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        for i in range(5):
+            Course.objects.create(title=f'Курс {i}', description='', teacher=self.teacher)
+        # Одинаковое время создания: порядок должен держаться на id
+        Course.objects.update(created_at=timezone.now())
+
+    def test_walks_all_pages_forward_and_back(self):
+        seen = []
+        url = '/api/courses/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.json()['results'])
+            last_page = response.json()
+            url = last_page['next']
+        expected = list(Course.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(last_page['previous'])
+        self.assertEqual([item['id'] for item in response.json()['results']], expected[2:4])
+
+    def test_page_size_is_bounded(self):
+        # Граница меньше числа курсов: запрос сверх нее урезается до max_page_size
+        with mock.patch.object(KeysetCursorPagination, 'max_page_size', 3):
+            response = self.client.get('/api/courses/?page_size=100000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/courses/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_forged_cursor_positions(self):
+        # Позиция курсора приходит от клиента и не должна доходить до запроса как есть
+        for position in (['not-a-date', 'x'], [None, None], [[1], {}], ['2024-01-01T00:00:00', 'x']):
+            cursor = base64.b64encode(urlencode({'p': json.dumps(position)}).encode()).decode()
+            response = self.client.get('/api/courses/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+
+
+class EnrollmentCheckTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.course.students.add(self.student)
+        # Большой список студентов не должен влиять на число запросов
+        others = User.objects.bulk_create(User(username=f'user{i}') for i in range(50))
+        self.course.students.add(*others)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _request(self, user):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user)
+        return APIView().initialize_request(request)
+
+    def test_membership_is_memoized_per_request(self):
+        request = self._request(self.student)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_enrolled(request, self.course.pk))
+            self.assertTrue(is_enrolled(request, str(self.course.pk)))
+
+    def test_not_enrolled(self):
+        stranger = User.objects.create_user('stranger', password='pass')
+        with self.assertNumQueries(1):
+            self.assertFalse(is_enrolled(self._request(stranger), self.course.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_enrolled(self._request(stranger), 'abc'))
+
+    def test_review_create_checks_enrollment_with_single_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/reviews/', {
+                'course': self.course.pk, 'student': self.student.pk, 'rating': 5, 'comment': 'ok',
+            })
+        self.assertEqual(response.status_code, 201)
+        roster_queries = [q['sql'] for q in queries if 'core_course_students' in q['sql']]
+        self.assertEqual(len(roster_queries), 1)
+        self.assertIn('LIMIT 1', roster_queries[0])
+
+    def test_course_retrieve_does_not_load_roster_for_permission(self):
+        # Курс, EXISTS по записи, id студентов для сериализатора
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/courses/{self.course.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_review_forbidden_for_missing_course(self):
+        response = self.client.post('/api/reviews/', {
+            'course': 999, 'student': self.student.pk, 'rating': 5, 'comment': 'ok',
+        })
+        self.assertEqual(response.status_code, 403)
+
+
+class VisibilityScopingTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.enrolled = Course.objects.create(title='Мой курс', description='', teacher=self.teacher)
+        self.enrolled.students.add(self.student)
+        self.other = Course.objects.create(title='Чужой курс', description='', teacher=self.teacher)
+        deadline = timezone.now()
+        for course in (self.enrolled, self.other):
+            for i in range(3):
+                lesson = Lesson.objects.create(course=course, title=f'Урок {i}', content='')
+                Assignment.objects.create(lesson=lesson, title='Задание', description='', deadline=deadline)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _ids(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {item['id'] for item in response.json()['results']}
+
+    def test_student_sees_only_enrolled_courses(self):
+        # Число студентов считается подзапросом в том же запросе
+        self.assertEqual(self._ids('/api/courses/', 1), {self.enrolled.pk})
+
+    def test_student_sees_only_enrolled_lessons(self):
+        expected = set(self.enrolled.lessons.values_list('id', flat=True))
+        self.assertEqual(self._ids('/api/lessons/', 1), expected)
+
+    def test_student_sees_only_enrolled_assignments(self):
+        expected = set(Assignment.objects.filter(lesson__course=self.enrolled).values_list('id', flat=True))
+        self.assertEqual(self._ids('/api/assignments/', 1), expected)
+
+    def test_hidden_lesson_is_not_found(self):
+        lesson = self.other.lessons.first()
+        self.assertEqual(self.client.get(f'/api/lessons/{lesson.pk}/').status_code, 404)
+
+    def test_teacher_sees_everything(self):
+        self.client.force_authenticate(self.teacher)
+        self.assertEqual(self._ids('/api/lessons/', 1), set(Lesson.objects.values_list('id', flat=True)))
+
+    def test_anonymous_sees_nothing(self):
+        self.client.force_authenticate(None)
+        for url in ('/api/lessons/', '/api/assignments/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'], [])
+        lesson = self.enrolled.lessons.first()
+        self.assertEqual(self.client.get(f'/api/lessons/{lesson.pk}/').status_code, 404)
+
+
+class SubmissionStatusTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.on_time, self.late, self.missing = [User.objects.create_user(name, password='pass')
+                                                 for name in ('on_time', 'late', 'missing')]
+        self.course.students.add(self.on_time, self.late, self.missing)
+        lesson = Lesson.objects.create(course=self.course, title='Урок', content='')
+        self.assignment = Assignment.objects.create(lesson=lesson, title='Эссе', description='',
+                                                    deadline=timezone.now() + timezone.timedelta(hours=1))
+        Submission.objects.create(assignment=self.assignment, student=self.on_time, file='submissions/a.txt')
+        # Дедлайн прошел: обновление в обход save() не трогает уже сданные работы
+        Assignment.objects.filter(pk=self.assignment.pk).update(deadline=timezone.now() - timezone.timedelta(hours=1))
+        self.assignment.refresh_from_db()
+        Submission.objects.create(assignment=self.assignment, student=self.late, file='submissions/b.txt')
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def _usernames(self, status):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/assignments/{self.assignment.pk}/{status}/')
+        return [item['username'] for item in response.json()['results']]
+
+    def test_status_lists(self):
+        self.assertEqual(self._usernames('submitted'), ['on_time'])
+        self.assertEqual(self._usernames('late'), ['late'])
+        self.assertEqual(self._usernames('missing'), ['missing'])
+
+    def test_moving_deadline_refreshes_late_flags(self):
+        self.assignment.deadline = timezone.now() - timezone.timedelta(days=1)
+        self.assignment.save()
+        self.assertEqual(self._usernames('late'), ['on_time', 'late'])
+
+    def test_students_cannot_list_others(self):
+        self.client.force_authenticate(self.late)
+        self.assertEqual(self.client.get(f'/api/assignments/{self.assignment.pk}/missing/').status_code, 403)
+
+    def test_student_status_across_course(self):
+        url = f'/api/assignments/student_status/?course={self.course.pk}'
+        self.client.force_authenticate(self.late)
+        self.assertEqual([item['status'] for item in self.client.get(url).json()['results']], ['late'])
+        self.assertEqual(self.client.get(f'{url}&student={self.missing.pk}').status_code, 403)
+
+        self.client.force_authenticate(self.teacher)
+        response = self.client.get(f'{url}&student={self.missing.pk}')
+        self.assertEqual([item['status'] for item in response.json()['results']], ['missing'])
+
+
+class GradebookTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.anna, self.boris, dropped = [User.objects.create_user(name, password='pass')
+                                          for name in ('anna', 'boris', 'dropped')]
+        self.course.students.add(self.anna, self.boris)
+        lesson = Lesson.objects.create(course=self.course, title='Урок', content='')
+        deadline = timezone.now() + timezone.timedelta(days=1)
+        self.first = Assignment.objects.create(lesson=lesson, title='Эссе', description='', deadline=deadline)
+        self.second = Assignment.objects.create(lesson=lesson, title='Тест, часть 2', description='',
+                                                deadline=deadline + timezone.timedelta(days=1))
+        self.submission = Submission.objects.create(assignment=self.first, student=self.anna, file='submissions/a.txt')
+        Submission.objects.create(assignment=self.second, student=self.boris, file='submissions/b.txt', grade=70)
+        Submission.objects.create(assignment=self.first, student=dropped, file='submissions/c.txt', grade=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        self.url = f'/api/courses/{self.course.pk}/gradebook/'
+
+    def test_grade_action(self):
+        url = f'/api/submissions/{self.submission.pk}/grade/'
+        self.assertEqual(self.client.post(url, {'grade': 95}).json()['grade'], 95)
+        self.assertEqual(self.client.post(url, {'grade': 101}).status_code, 400)
+        self.client.force_authenticate(self.anna)
+        self.assertEqual(self.client.post(url, {'grade': 100}).status_code, 403)
+        self.assertEqual(self.client.patch(f'/api/submissions/{self.submission.pk}/', {'grade': 100}).json()['grade'], 95)
+
+    def test_csv_export(self):
+        self.client.post(f'/api/submissions/{self.submission.pk}/grade/', {'grade': 95})
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows, [
+            ['student_id', 'username', f'Эссе (#{self.first.pk})', f'Тест, часть 2 (#{self.second.pk})'],
+            [str(self.anna.pk), 'anna', '95', ''],
+            [str(self.boris.pk), 'boris', '', '70'],
+        ])
+
+    def test_xlsx_export(self):
+        response = self.client.get(self.url, {'file_format': 'xlsx'})
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        rows = sheet.findall(f'{namespace}sheetData/{namespace}row')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([cell.findtext(f'{namespace}v') for cell in rows[2]], [str(self.boris.pk), None, None, '70'])
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow не установлен')
+    def test_parquet_export(self):
+        import pyarrow.parquet as pq
+        response = self.client.get(self.url, {'file_format': 'parquet'})
+        table = pq.read_table(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('username').to_pylist(), ['anna', 'boris'])
+        self.assertEqual(table.column(f'Тест, часть 2 (#{self.second.pk})').to_pylist(), [None, 70])
+
+    def test_students_cannot_export(self):
+        self.client.force_authenticate(self.anna)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class ListSerializerTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.students = [User.objects.create_user(f'student{i}', password='pass') for i in range(3)]
+        self.course = Course.objects.create(title='Курс', description='Длинное описание', teacher=self.teacher)
+        self.course.students.add(*self.students)
+        CourseRating.objects.create(course=self.course, count=3, total=13)
+        self.empty = Course.objects.create(title='Пустой курс', description='', teacher=self.teacher)
+        self.lesson = Lesson.objects.create(course=self.course, title='Урок', content='Текст',
+                                            file='lesson_materials/a.pdf')
+        Lesson.objects.create(course=self.course, title='Без файла', content='Текст')
+        self.assignment = Assignment.objects.create(lesson=self.lesson, title='Задание', description='',
+                                                    deadline=timezone.now())
+        for student in self.students:
+            Submission.objects.create(assignment=self.assignment, student=student, file='submissions/a.txt', grade=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def test_course_list_is_compact(self):
+        results = {item['id']: item for item in self.client.get('/api/courses/').json()['results']}
+        self.assertEqual(results[self.course.pk]['student_count'], 3)
+        self.assertEqual(results[self.course.pk]['rating_average'], 4.33)
+        self.assertEqual(results[self.empty.pk]['student_count'], 0)
+        self.assertIsNone(results[self.empty.pk]['rating_average'])
+        self.assertNotIn('students', results[self.course.pk])
+        self.assertNotIn('description', results[self.course.pk])
+
+    def test_lesson_and_assignment_lists(self):
+        lessons = self.client.get('/api/lessons/').json()['results']
+        self.assertEqual([item['has_file'] for item in lessons], [True, False])
+        assignment = self.client.get('/api/assignments/').json()['results'][0]
+        self.assertEqual(assignment['course'], self.course.pk)
+
+    def test_list_items_match_full_serializer(self):
+        for settings_kwargs in ({}, {'USE_TZ': True, 'TIME_ZONE': 'Europe/Moscow'}):
+            with override_settings(**settings_kwargs):
+                with self.assertNumQueries(1):
+                    page = self.client.get('/api/submissions/?page_size=2').json()
+                item = page['results'][0]
+                detail = self.client.get(f"/api/submissions/{item['id']}/").json()
+                self.assertEqual(item, {key: detail[key] for key in item})
+                # Курсор следующей страницы строится по полям словаря
+                rest = self.client.get(page['next']).json()['results']
+                self.assertEqual(len(page['results']) + len(rest), 3)
+
+
+class ResponseCacheTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.course.students.add(self.student)
+        self.lesson = Lesson.objects.create(course=self.course, title='Урок', content='Текст')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.url = f'/api/lessons/{self.lesson.pk}/'
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertIn('ETag', second)
+        self.assertIn('Last-Modified', second)
+
+    def test_conditional_get_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_lesson_save_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.lesson.title = 'Новое название'
+            self.lesson.save()
+        # Версия меняется только после коммита, а до него кэш отдает прежний ответ
+        self.assertEqual(self.client.get(self.url).json()['title'], 'Урок')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.url).json()['title'], 'Новое название')
+
+    def test_unenroll_invalidates_student_scope(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.students.remove(self.student)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_course_list_follows_enrollment(self):
+        self.client.force_authenticate(self.teacher)
+        self.client.get('/api/courses/')
+        other = User.objects.create_user('other', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.students.add(other)
+        course = self.client.get('/api/courses/').json()['results'][0]
+        self.assertEqual(course['student_count'], 2)
+
+
+class AsyncReadPathTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.other = Course.objects.create(title='Чужой курс', description='', teacher=self.teacher)
+        self.course.students.add(self.student)
+        lesson = Lesson.objects.create(course=self.course, title='Урок', content='')
+        Assignment.objects.create(lesson=lesson, title='Задание', description='', deadline=timezone.now())
+        self.token = Token.objects.create(user=self.student)
+        self.factory = APIRequestFactory()
+
+    def _get(self, viewset, action, path, **kwargs):
+        with override_settings(ASYNC_READ_VIEWS=True):
+            view = viewset.as_view({'get': action})
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        request = self.factory.get(path, HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_list_matches_sync_path(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        for viewset, path in ((CourseViewSet, '/api/courses/'), (AssignmentViewSet, '/api/assignments/')):
+            response = self._get(viewset, 'list', path)
+            self.assertEqual(response.status_code, 200)
+            cache.clear()
+            self.assertEqual(json.loads(response.content), client.get(path).json())
+
+    def test_retrieve_checks_enrollment(self):
+        response = self._get(CourseViewSet, 'retrieve', f'/api/courses/{self.course.pk}/', pk=self.course.pk)
+        self.assertEqual(json.loads(response.content)['students'], [self.student.pk])
+        response = self._get(CourseViewSet, 'retrieve', f'/api/courses/{self.other.pk}/', pk=self.other.pk)
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_token_is_rejected(self):
+        self.token.delete()
+        self.assertEqual(self._get(LessonViewSet, 'list', '/api/lessons/').status_code, 401)
+
+
+class TokenCacheTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.token = Token.objects.create(user=self.teacher)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = f'/api/courses/{self.course.pk}/'
+
+    def test_hot_path_is_query_free(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Токен из кэша, ответ из кэша ответов: ни одного запроса
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_revoked_token_is_rejected(self):
+        self.client.get(self.url)
+        self.assertEqual(self.client.post('/api-token-revoke/').status_code, 204)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertFalse(Token.objects.filter(user=self.teacher).exists())
+
+    def test_user_change_invalidates_cache(self):
+        self.client.get(self.url)
+        self.teacher.is_teacher = False
+        self.teacher.is_student = False
+        self.teacher.save()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.teacher.is_active = False
+        self.teacher.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_expired_token_is_rotated_on_login(self):
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timezone.timedelta(days=31))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        anonymous = APIClient()
+        response = anonymous.post('/api-token-auth/', {'username': 'teacher', 'password': 'pass'})
+        new_key = response.json()['token']
+        self.assertNotEqual(new_key, self.token.key)
+        self.assertIsNotNone(response.json()['expires_at'])
+        # Повторный вход возвращает тот же токен, rotate=true — новый; строка всегда одна
+        self.assertEqual(anonymous.post('/api-token-auth/', {'username': 'teacher', 'password': 'pass'}).json()['token'], new_key)
+        rotated = anonymous.post('/api-token-auth/', {'username': 'teacher', 'password': 'pass', 'rotate': 'true'}).json()['token']
+        self.assertNotEqual(rotated, new_key)
+        self.assertEqual(Token.objects.filter(user=self.teacher).count(), 1)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {new_key}')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {rotated}')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_revoke_during_cache_miss_is_not_cached(self):
+        key = self.token.key
+        token_cache = get_cache()
+        store = token_cache.set
+
+        def revoke_then_store(cache_key, value, *args, **kwargs):
+            # Отзыв успевает между чтением токена из базы и записью в кэш
+            if cache_key.startswith('core:token:') and Token.objects.filter(key=key).exists():
+                with self.captureOnCommitCallbacks(execute=True):
+                    Token.objects.filter(key=key).delete()
+            store(cache_key, value, *args, **kwargs)
+
+        with mock.patch.object(token_cache, 'set', side_effect=revoke_then_store):
+            authenticate_key(key)
+        local_cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            authenticate_key(key)
+
+    def test_cached_user_loads_other_fields_lazily(self):
+        self.teacher.email = 'teacher@example.com'
+        self.teacher.save()
+        user, _token = authenticate_key(self.token.key)
+        user, _token = authenticate_key(self.token.key)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'teacher@example.com')
+
+
+class DatabaseRoutingTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.router = PrimaryReplicaRouter(replicas=['replica0'])
+        self.factory = APIRequestFactory()
+        self.seen = None
+
+    def _view(self, request):
+        self.seen = self.router.db_for_read(Course)
+        return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+    def _request(self, method):
+        with override_settings(DATABASE_REPLICAS=['replica0']):
+            middleware = ReplicaRoutingMiddleware(self._view)
+        request = getattr(self.factory, method)('/api/courses/', HTTP_AUTHORIZATION='Token abc')
+        middleware(request)
+        return self.seen
+
+    def test_reads_go_to_replica_outside_requests_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Course), 'default')
+        self.assertEqual(self.router.db_for_write(Course), 'default')
+        self.assertEqual(self._request('get'), 'replica0')
+        self.assertFalse(self.router.allow_migrate('replica0', 'core'))
+
+    def test_read_your_writes_after_post(self):
+        self.assertEqual(self._request('post'), 'default')
+        self.assertEqual(self._request('get'), 'default')
+        cache.clear()
+        self.assertEqual(self._request('get'), 'replica0')
+
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    def test_wal_only_when_requested(self):
+        # Режим журнала пишется в файл базы: без явного запроса файл не меняется
+        self.assertEqual(_database('sqlite:///')['OPTIONS']['pragmas'], {})
+        self.assertEqual(_database('sqlite:///app.sqlite3?journal_mode=WAL')['OPTIONS']['pragmas'], {'journal_mode': 'WAL'})
+
+
+class CourseRatingTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.course.students.add(self.student)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _review(self, rating):
+        response = self.client.post('/api/reviews/', {
+            'course': self.course.pk, 'student': self.student.pk, 'rating': rating, 'comment': 'ok',
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_aggregates_follow_review_changes(self):
+        first = self._review(5)
+        self._review(3)
+        self.client.patch(f'/api/reviews/{first}/', {'rating': 4})
+        rating = self.client.get(f'/api/courses/{self.course.pk}/rating/').json()
+        self.assertEqual(rating['count'], 2)
+        self.assertEqual(rating['average'], 3.5)
+        self.assertEqual(rating['histogram'], {'1': 0, '2': 0, '3': 1, '4': 1, '5': 0})
+
+        self.client.delete(f'/api/reviews/{first}/')
+        course = self.client.get(f'/api/courses/{self.course.pk}/').json()
+        self.assertEqual(course['rating']['count'], 1)
+        self.assertEqual(course['rating']['total'], 3)
+
+    def test_rating_out_of_range_is_rejected(self):
+        response = self.client.post('/api/reviews/', {
+            'course': self.course.pk, 'student': self.student.pk, 'rating': 6, 'comment': 'ok',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_command_fixes_drift(self):
+        self._review(2)
+        Review.objects.create(course=self.course, student=self.student, rating=4, comment='')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_course_ratings', '--check', stdout=StringIO())
+        call_command('rebuild_course_ratings', stdout=StringIO())
+        call_command('rebuild_course_ratings', '--check', stdout=StringIO())
+        rating = CourseRating.objects.get(course=self.course)
+        self.assertEqual((rating.count, rating.total, rating.rating_4), (2, 6, 1))
+
+    def test_reviews_without_rating_row(self):
+        # Отзывы, оставленные до появления агрегатов
+        old = Review.objects.create(course=self.course, student=self.student, rating=5, comment='')
+        Review.objects.create(course=self.course, student=self.student, rating=3, comment='')
+        self.assertEqual(self.client.delete(f'/api/reviews/{old.pk}/').status_code, 204)
+        rating = CourseRating.objects.get(course=self.course)
+        self.assertEqual((rating.count, rating.total, rating.rating_3, rating.rating_5), (1, 3, 1, 0))
+
+        CourseRating.objects.all().delete()
+        self._review(4)
+        rating = CourseRating.objects.get(course=self.course)
+        self.assertEqual((rating.count, rating.total), (2, 7))
+
+    def test_migration_backfills_ratings(self):
+        Review.objects.create(course=self.course, student=self.student, rating=2, comment='')
+        Review.objects.create(course=self.course, student=self.student, rating=4, comment='')
+        migration = importlib.import_module('core.migrations.0012_backfill_course_ratings')
+        migration.backfill_course_ratings(django_apps, None)
+        rating = CourseRating.objects.get(course=self.course)
+        self.assertEqual((rating.count, rating.total, rating.rating_2, rating.rating_4), (2, 6, 1, 1))
+
+
+class CourseDashboardTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.course.students.add(self.student)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _add_lessons(self, count, assignments=2):
+        deadline = timezone.now() + timezone.timedelta(days=1)
+        for i in range(count):
+            lesson = Lesson.objects.create(course=self.course, title=f'Урок {i}', content='Текст')
+            for j in range(assignments):
+                assignment = Assignment.objects.create(lesson=lesson, title=f'Задание {i}.{j}', description='', deadline=deadline)
+                Submission.objects.create(assignment=assignment, student=self.student, file='submissions/a.txt', grade=j or None)
+
+    def _dashboard(self, query='', queries=None):
+        url = f'/api/courses/{self.course.pk}/dashboard/{query}'
+        if queries is None:
+            return self.client.get(url)
+        with self.assertNumQueries(queries):
+            return self.client.get(url)
+
+    def test_query_count_does_not_depend_on_course_size(self):
+        # Курс с рейтингом, проверка записи, уроки, задания со статусами
+        self._add_lessons(1)
+        small = self._dashboard(queries=4).json()
+        self._add_lessons(20)
+        data = self._dashboard(queries=4).json()
+        self.assertEqual(len(small['lessons']), 1)
+        self.assertEqual(len(data['lessons']), 21)
+        self.assertEqual(data['course']['student_count'], 1)
+        self.assertEqual(data['rating']['count'], 0)
+        first, second = data['lessons'][0]['assignments']
+        self.assertEqual((first['status'], first['grade']), ('submitted', None))
+        self.assertEqual((second['status'], second['grade']), ('submitted', 1))
+
+        self.client.force_authenticate(self.teacher)
+        data = self._dashboard(queries=3).json()
+        self.assertIsNone(data['lessons'][0]['assignments'][0]['status'])
+
+    def test_sparse_fieldsets_skip_unrequested_parts(self):
+        self._add_lessons(3)
+        data = self._dashboard('?fields[dashboard]=course,rating&fields[course]=id,title', queries=2).json()
+        self.assertEqual(data, {'course': {'id': self.course.pk, 'title': 'Курс'},
+                                'rating': data['rating']})
+
+        data = self._dashboard('?fields[dashboard]=lessons&fields[lesson]=title,assignments'
+                               '&fields[assignment]=title,status', queries=4).json()
+        self.assertEqual(set(data), {'lessons'})
+        self.assertEqual(data['lessons'][0], {'title': 'Урок 0', 'assignments': [
+            {'title': 'Задание 0.0', 'status': 'submitted'}, {'title': 'Задание 0.1', 'status': 'submitted'},
+        ]})
+
+        response = self._dashboard('?fields[lesson]=title,file')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields[lesson]', response.json())
+        self.assertEqual(self._dashboard('?fields[review]=id').status_code, 400)
+
+    def test_students_see_only_enrolled_courses(self):
+        self.course.students.remove(self.student)
+        self.assertEqual(self._dashboard().status_code, 404)
+
+
+class BulkEnrollmentTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.other = Course.objects.create(title='Другой курс', description='', teacher=self.teacher)
+        self.students = User.objects.bulk_create(User(username=f'student{i}') for i in range(5))
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def test_bulk_enroll_reports_each_row(self):
+        self.course.students.add(self.students[0])
+        ids = [s.pk for s in self.students] + [self.students[1].pk, 999999]
+        response = self.client.post(f'/api/courses/{self.course.pk}/bulk_enroll/', {'users': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = [row['status'] for row in response.json()['results']]
+        self.assertEqual(statuses, ['already_enrolled'] + ['enrolled'] * 4 + ['already_enrolled', 'unknown_user'])
+        self.assertEqual(self.course.students.count(), 5)
+
+    def test_bulk_unenroll_across_courses(self):
+        self.course.students.add(*self.students)
+        self.other.students.add(self.students[0])
+        enrollments = [
+            {'course': self.course.pk, 'user': self.students[0].pk},
+            {'course': self.other.pk, 'user': self.students[0].pk},
+            {'course': self.other.pk, 'user': self.students[1].pk},
+        ]
+        response = self.client.post('/api/courses/bulk_enroll/',
+                                    {'action': 'unenroll', 'enrollments': enrollments}, format='json')
+        self.assertEqual(response.json()['summary'], {'unenrolled': 2, 'not_enrolled': 1})
+        self.assertEqual(self.course.students.count(), 4)
+        self.assertFalse(self.other.students.exists())
+
+    def test_rows_cannot_leave_the_url_course(self):
+        enrollments = [
+            {'course': self.other.pk, 'user': self.students[0].pk},
+            {'course': self.course.pk, 'user': self.students[1].pk},
+            {'user': self.students[2].pk},
+        ]
+        response = self.client.post(f'/api/courses/{self.course.pk}/bulk_enroll/',
+                                    {'enrollments': enrollments}, format='json')
+        self.assertEqual([row['status'] for row in response.json()['results']],
+                         ['other_course', 'enrolled', 'enrolled'])
+        self.assertFalse(self.other.students.exists())
+
+        roster = SimpleUploadedFile('roster.csv', f'course,user\n,{self.students[3].pk}\n{self.other.pk},{self.students[4].pk}\n'.encode())
+        response = self.client.post(f'/api/courses/{self.course.pk}/bulk_enroll/', {'file': roster})
+        self.assertEqual([row['status'] for row in response.json()['results']], ['enrolled', 'other_course'])
+        self.assertEqual(self.course.students.count(), 3)
+        self.assertFalse(self.other.students.exists())
+
+    def test_students_cannot_bulk_enroll(self):
+        self.client.force_authenticate(self.students[0])
+        response = self.client.post(f'/api/courses/{self.course.pk}/bulk_enroll/',
+                                    {'users': [self.students[0].pk]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_who_may_enroll(self):
+        url = f'/api/courses/{self.course.pk}/enroll/'
+        anonymous = APIClient()
+        self.assertEqual(anonymous.post(url).status_code, 401)
+        # Ни студент, ни преподаватель (например, только сотрудник)
+        staff = User.objects.create_user('staff', password='pass', is_staff=True, is_student=False)
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.post(url).status_code, 403)
+        # Студент записывается сам на курс, которого еще не видит
+        self.client.force_authenticate(self.students[0])
+        self.assertEqual(self.client.get(f'/api/courses/{self.course.pk}/').status_code, 404)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.client.force_authenticate(self.teacher)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(set(self.course.students.values_list('username', flat=True)), {'student0', 'teacher'})
+
+    def test_import_roster_command(self):
+        lines = ['course,user'] + [f'{self.course.pk},{s.pk}' for s in self.students] + ['x,1']
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as roster:
+            roster.write('\n'.join(lines))
+        self.addCleanup(os.unlink, roster.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_roster', roster.name, '--batch-size', '2', stdout=out, stderr=err)
+        self.assertIn('enrolled: 5', out.getvalue())
+        self.assertIn('Строка 7: invalid', err.getvalue())
+        self.assertEqual(self.course.students.count(), 5)
+
+    def test_background_bulk_enroll(self):
+        ids = [s.pk for s in self.students] + [999999]
+        response = self.client.post(f'/api/courses/{self.course.pk}/bulk_enroll/',
+                                    {'users': ids, 'background': True}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(self.course.students.exists())
+        with override_settings(JOBS={**settings.JOBS, 'batch_size': 2}):
+            run_pending()
+        job = self.client.get(f"/api/jobs/{response.json()['id']}/").json()
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result']['summary'], {'enrolled': 5, 'unknown_user': 1})
+        self.assertEqual([row['user'] for row in job['result']['results']], [999999])
+        self.assertEqual(self.course.students.count(), 5)
+
+
+
+class ChunkedUploadTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            CHUNKED_UPLOAD_DIR=os.path.join(media_root, 'chunked_uploads'),
+            CHUNKED_UPLOAD_MAX_CHUNK_SIZE=1024,
+            CHUNKED_UPLOAD_USER_QUOTA=10 * 1024,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        lesson = Lesson.objects.create(course=course, title='Урок', content='')
+        self.assignment = Assignment.objects.create(lesson=lesson, title='Задание', description='',
+                                                    deadline=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.payload = os.urandom(2500)
+
+    def _start(self, size=None):
+        response = self.client.post('/api/uploads/', {
+            'kind': 'submission', 'assignment': self.assignment.pk,
+            'filename': '../project.zip', 'size': size or len(self.payload),
+        })
+        self.assertEqual(response.status_code, 201)
+        return f"/api/uploads/{response.json()['id']}/"
+
+    def _put(self, url, offset, data):
+        return self.client.put(f'{url}chunk/?offset={offset}', data=data,
+                               content_type='application/octet-stream')
+
+    def test_resume_and_finalize(self):
+        url = self._start()
+        self.assertEqual(self._put(url, 0, self.payload[:1000]).json()['offset'], 1000)
+        # Повтор уже принятой части после обрыва — клиент узнает верное смещение
+        response = self._put(url, 0, self.payload[:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 1000)
+        self.assertEqual(self.client.get(url).json()['offset'], 1000)
+        self._put(url, 1000, self.payload[1000:2000])
+        self._put(url, 2000, self.payload[2000:])
+
+        response = self.client.post(f'{url}finalize/', {'checksum': zlib.crc32(self.payload)})
+        self.assertEqual(response.status_code, 201)
+        submission = Submission.objects.get()
+        self.assertEqual(submission.student, self.student)
+        self.assertTrue(submission.file.name.endswith('/project.zip'))
+        self.assertEqual(submission.content_hash, hashlib.sha256(self.payload).hexdigest())
+        with submission.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.payload)
+        # Преподаватель узнает о работе так же, как при обычной отправке
+        event = OutboxEvent.objects.get(kind='submission.created')
+        self.assertEqual(event.group, user_group(self.teacher.pk))
+        self.assertEqual(event.payload, {'submission': submission.pk, 'assignment': self.assignment.pk, 'student': self.student.pk})
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 409)
+
+    def test_concurrent_writers_of_one_chunk(self):
+        url = self._start()
+        session = UploadSession.objects.get()
+        self._put(url, 0, self.payload[:1000])
+        session.refresh_from_db()
+        winner_data, loser_data = self.payload[1000:2000], os.urandom(1000)
+        outcome = {}
+
+        class InterleavedStream(BytesIO):
+            # Пока первый запрос пишет часть, второй приходит с тем же смещением
+            def read(stream, size=-1):
+                if not outcome:
+                    rival = UploadSession.objects.get(pk=session.pk)
+                    try:
+                        write_chunk(rival, BytesIO(loser_data), 1000, len(loser_data))
+                    except UploadError as error:
+                        outcome['loser'] = error.status_code
+                    # Следующая часть тоже ждет, пока захват не снят
+                    outcome['next'] = self._put(url, 2000, self.payload[2000:]).status_code
+                return super().read(size)
+
+        write_chunk(session, InterleavedStream(winner_data), 1000, len(winner_data))
+        self.assertEqual(outcome, {'loser': 409, 'next': 409})
+        self._put(url, 2000, self.payload[2000:])
+        response = self.client.post(f'{url}finalize/', {'checksum': zlib.crc32(self.payload)})
+        self.assertEqual(response.status_code, 201)
+        with Submission.objects.get().file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.payload)
+
+    def test_finalize_rejects_incomplete_and_bad_checksum(self):
+        url = self._start()
+        self._put(url, 0, self.payload[:1000])
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 409)
+        self._put(url, 1000, self.payload[1000:2000])
+        self._put(url, 2000, self.payload[2000:])
+        self.assertEqual(self.client.post(f'{url}finalize/', {'checksum': 1}).status_code, 422)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_limits(self):
+        url = self._start()
+        self.assertEqual(self._put(url, 0, self.payload[:2000]).status_code, 413)
+        response = self.client.post('/api/uploads/', {
+            'kind': 'submission', 'assignment': self.assignment.pk, 'filename': 'big.zip', 'size': 9 * 1024,
+        })
+        self.assertEqual(response.status_code, 413)
+
+    def test_students_cannot_upload_lesson_materials(self):
+        response = self.client.post('/api/uploads/', {
+            'kind': 'lesson', 'lesson': self.assignment.lesson_id, 'filename': 'notes.pdf', 'size': 10,
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class ContentAddressedStorageTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, CHUNKED_UPLOAD_DIR=os.path.join(media_root, 'parts'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.anna = User.objects.create_user('anna', password='pass')
+        self.boris = User.objects.create_user('boris', password='pass')
+        course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        lesson = Lesson.objects.create(course=course, title='Урок', content='')
+        self.assignment = Assignment.objects.create(lesson=lesson, title='Задание', description='',
+                                                    deadline=timezone.now() + timezone.timedelta(days=1))
+        self.content = b'archive' * 100
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.client = APIClient()
+
+    def submit(self, student, filename):
+        self.client.force_authenticate(student)
+        response = self.client.post('/api/submissions/', {
+            'assignment': self.assignment.pk, 'student': student.pk, 'file': SimpleUploadedFile(filename, self.content),
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        return Submission.objects.get(pk=response.json()['id'])
+
+    def blob_files(self):
+        return [name for _, _, files in os.walk(os.path.join(settings.MEDIA_ROOT, 'blobs')) for name in files]
+
+    def test_identical_files_are_stored_once(self):
+        first = self.submit(self.anna, 'work.zip')
+        second = self.submit(self.boris, 'copy.zip')
+        self.assertEqual((first.content_hash, second.content_hash), (self.digest, self.digest))
+        self.assertTrue(second.file.name.endswith('/copy.zip'))
+        self.assertEqual(self.blob_files(), [self.digest])
+        self.assertEqual(Blob.objects.get().refs, 2)
+
+        self.client.force_authenticate(self.teacher)
+        response = self.client.get(f'/api/submissions/{first.pk}/duplicates/')
+        self.assertEqual([item['id'] for item in response.json()['results']], [second.pk])
+
+        self.client.delete(f'/api/submissions/{first.pk}/')
+        self.assertEqual(collect_garbage(timezone.timedelta(0))['removed'], 0)
+        with second.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.client.delete(f'/api/submissions/{second.pk}/')
+        self.assertEqual(collect_garbage(timezone.timedelta(0))['removed'], 1)
+        self.assertEqual(self.blob_files(), [])
+
+    def test_known_file_is_not_uploaded_again(self):
+        self.submit(self.anna, 'work.zip')
+        self.client.force_authenticate(self.anna)
+        response = self.client.post('/api/uploads/', {
+            'kind': 'submission', 'assignment': self.assignment.pk, 'filename': 'again.zip',
+            'size': len(self.content), 'sha256': self.digest,
+        })
+        self.assertEqual(response.json()['offset'], len(self.content))
+        response = self.client.post(f"/api/uploads/{response.json()['id']}/finalize/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Submission.objects.get(pk=response.json()['id']).content_hash, self.digest)
+        self.assertEqual(Blob.objects.get().refs, 2)
+
+        # Хэш чужой работы не дает доступа к ее файлу
+        self.client.force_authenticate(self.boris)
+        response = self.client.post('/api/uploads/', {
+            'kind': 'submission', 'assignment': self.assignment.pk, 'filename': 'stolen.zip',
+            'size': len(self.content), 'sha256': self.digest,
+        })
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertEqual(self.client.post(f"/api/uploads/{response.json()['id']}/finalize/").status_code, 409)
+
+    def test_collector_repairs_counts_and_removes_orphans(self):
+        submission = self.submit(self.anna, 'work.zip')
+        # bulk_create идет в обход сигналов и счетчика
+        Submission.objects.bulk_create([Submission(assignment=self.assignment, student=self.boris, file=submission.file.name)])
+        Submission.objects.filter(pk=submission.pk).delete()
+        self.assertEqual(Blob.objects.get().refs, 0)
+
+        orphan = os.path.join(settings.MEDIA_ROOT, 'blobs', 'ff', 'f' * 64)
+        os.makedirs(os.path.dirname(orphan), exist_ok=True)
+        with open(orphan, 'wb') as file:
+            file.write(b'lost')
+        os.utime(orphan, (0, 0))
+        stats = collect_garbage(timezone.timedelta(0))
+        self.assertEqual((stats['removed'], stats['repaired'], stats['orphans']), (0, 1, 1))
+        self.assertEqual(Blob.objects.get().refs, 1)
+        self.assertEqual(self.blob_files(), [self.digest])
+
+    def test_import_legacy_files(self):
+        for student in (self.anna, self.boris):
+            name = FileSystemStorage().save('submissions/work.zip', ContentFile(self.content))
+            Submission.objects.create(assignment=self.assignment, student=student, file=name)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_blobs', stdout=StringIO())
+        self.assertEqual(set(Submission.objects.values_list('content_hash', flat=True)), {self.digest})
+        self.assertEqual(Blob.objects.get().refs, 2)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'submissions')) and
+                         os.listdir(os.path.join(settings.MEDIA_ROOT, 'submissions')))
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class ThrottlingTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.students = [User.objects.create_user(f'student{i}', password='pass') for i in range(3)]
+        self.client = APIClient()
+
+    def enroll(self, student):
+        self.client.force_authenticate(student)
+        return self.client.post(f'/api/courses/{self.course.pk}/enroll/')
+
+    @throttle_rates(enroll='2/min')
+    def test_user_bucket(self):
+        rejected = throttled_requests.value(scope='enroll', bucket='user')
+        self.assertEqual(self.enroll(self.students[0]).status_code, 200)
+        self.assertEqual(self.enroll(self.students[0]).status_code, 200)
+        response = self.enroll(self.students[0])
+        self.assertEqual(response.status_code, 429)
+        # Маркер возвращается за 30 секунд
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(throttled_requests.value(scope='enroll', bucket='user'), rejected + 1)
+        # Другим пользователям и другим действиям лимит не мешает
+        self.assertEqual(self.enroll(self.students[1]).status_code, 200)
+        self.assertEqual(self.client.get('/api/courses/').status_code, 200)
+
+    @throttle_rates(**{'enroll': '10/min', 'enroll.all': '2/min'})
+    def test_scope_bucket(self):
+        self.assertEqual(self.enroll(self.students[0]).status_code, 200)
+        self.assertEqual(self.enroll(self.students[1]).status_code, 200)
+        self.assertEqual(self.enroll(self.students[2]).status_code, 429)
+
+    @throttle_rates(**{'enroll': '2/min', 'enroll.all': '5/min'})
+    def test_flooding_user_does_not_drain_scope_bucket(self):
+        for _ in range(10):
+            self.enroll(self.students[0])
+        # Два маркера общей корзины потрачены, отказы первому студенту — нет
+        self.assertEqual(self.enroll(self.students[1]).status_code, 200)
+        self.assertEqual(self.enroll(self.students[2]).status_code, 200)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('30/min'), (30, 0.5))
+        self.assertEqual(parse_rate('10/s'), (10, 10))
+
+
+@override_settings(ADMISSION_POOLS={'uploads': {'limit': 1, 'queue': 1, 'timeout': 0.05, 'retry_after': 7}})
+class AdmissionControlTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = get_pool('uploads')
+
+    def test_overloaded_uploads_get_retry_after(self):
+        student = User.objects.create_user('student', password='pass')
+        session = UploadSession.objects.create(owner=student, kind='submission', filename='a.zip', size=10)
+        client = APIClient()
+        client.force_authenticate(student)
+        rejected = rejected_requests.value(pool='uploads', reason='timeout')
+
+        self.pool.acquire()
+        try:
+            response = client.put(f'/api/uploads/{session.pk}/chunk/?offset=0', data=b'x',
+                                  content_type='application/octet-stream')
+        finally:
+            self.pool.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(rejected_requests.value(pool='uploads', reason='timeout'), rejected + 1)
+        # Чтение пулом не ограничено, а свободное место снова пропускает загрузку
+        self.assertEqual(client.get(f'/api/uploads/{session.pk}/').status_code, 200)
+        self.assertEqual(client.post(f'/api/uploads/{session.pk}/finalize/').status_code, 409)
+        self.assertEqual(self.pool.in_flight, 0)
+
+    def test_queue(self):
+        queued = queued_requests.value(pool='uploads')
+        self.pool.acquire()
+        waiter = threading.Thread(target=self.pool.acquire)
+        waiter.start()
+        while not self.pool.waiting:
+            time.sleep(0.001)
+        # Очередь из одного места занята — следующий запрос отклоняется сразу
+        with self.assertRaises(Overloaded):
+            self.pool.acquire()
+        self.pool.release()
+        waiter.join()
+        self.assertEqual(self.pool.in_flight, 1)
+        self.pool.release()
+        self.assertEqual(queued_requests.value(pool='uploads'), queued + 1)
+
+
+class InstrumentationTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(METRICS_TOKEN='secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.auth = {'HTTP_AUTHORIZATION': 'Bearer secret'}
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.course.students.add(self.student)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_metrics_by_view_and_action(self):
+        labels = {'view': 'CourseViewSet', 'action': 'retrieve'}
+        observed, queries = request_queries.value(**labels), request_queries.total(**labels)
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(f'/api/courses/{self.course.pk}/').status_code, 200)
+        self.assertEqual(request_queries.value(**labels), observed + 1)
+        self.assertEqual(request_queries.total(**labels), queries + len(captured))
+
+        body = self.client.get('/metrics', **self.auth).content.decode()
+        self.assertIn('# TYPE core_request_duration_seconds histogram', body)
+        self.assertIn('core_request_queries_count{view="CourseViewSet",action="retrieve"}', body)
+        self.assertIn('core_request_serializer_seconds_bucket{view="CourseViewSet",action="retrieve",le="+Inf"}', body)
+
+    def test_metrics_require_token_or_staff(self):
+        # Запросы через фронт-прокси приходят с 127.0.0.1 — адрес ничего не разрешает
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            for url in ('/metrics', '/metrics/slow'):
+                self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1', **headers).status_code, 404)
+        staff = User.objects.create_user('admin', password='pass', is_staff=True)
+        client = Client()
+        client.force_login(staff)
+        self.assertEqual(client.get('/metrics/slow').status_code, 200)
+
+    def test_repeated_queries_flagged_as_n_plus_one(self):
+        flagged = n_plus_one_requests.value(view='test', action='loop')
+        token = current_trace.set(Trace('test', 'loop'))
+        try:
+            # Как проверка прав через obj.students.all() для каждого курса страницы
+            for _ in range(12):
+                list(self.course.students.all())
+            trace = current_trace.get()
+        finally:
+            current_trace.reset(token)
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            trace.finish()
+        self.assertEqual(n_plus_one_requests.value(view='test', action='loop'), flagged + 1)
+        self.assertIn('12×', logs.output[0])
+
+    def test_slow_requests_keep_query_trace(self):
+        config = {**settings.INSTRUMENTATION, 'slow_request_seconds': 0, 'slow_sample_rate': 1}
+        with override_settings(INSTRUMENTATION=config), self.assertLogs('core.instrumentation', 'WARNING'):
+            self.client.get(f'/api/courses/{self.course.pk}/')
+        entry = self.client.get('/metrics/slow', **self.auth).json()[-1]
+        self.assertEqual((entry['view'], entry['action'], entry['method']), ('CourseViewSet', 'retrieve', 'GET'))
+        self.assertEqual(entry['queries'], len(entry['trace']))
+        self.assertTrue(any('core_course_students' in query['sql'] for query in entry['trace']))
+        self.assertGreater(entry['timings']['permission'], 0)
+        self.assertTrue(all(set(query) == {'sql', 'duration'} for query in entry['trace']))
+
+
+class BenchmarkSuiteTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def seed(self, **options):
+        options = {'teachers': 2, 'courses_per_teacher': 2, 'students': 20, 'lessons_per_course': 2,
+                   'assignments_per_lesson': 3, 'batch_size': 7, **options}
+        call_command('seed_benchmark', stdout=StringIO(), **options)
+
+    def test_seed_is_consistent_and_reproducible(self):
+        self.seed()
+        self.assertEqual(User.objects.filter(is_teacher=True).count(), 2)
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertEqual(Assignment.objects.count(), 24)
+        self.assertEqual(Course.students.through.objects.count(), 60)
+        submission = Submission.objects.select_related('assignment').first()
+        self.assertTrue(submission.file.storage.exists(submission.file.name))
+        for submission in Submission.objects.select_related('assignment'):
+            self.assertEqual(submission.is_late, submission.submitted_at > submission.assignment.deadline)
+        # Агрегаты рейтингов и поисковый индекс пересчитаны после bulk_create
+        call_command('rebuild_course_ratings', check=True, stdout=StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 4 + 8 + 24)
+
+        submissions = list(Submission.objects.order_by('id').values_list('assignment__title', 'student__username', 'grade'))
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed(clear=True)
+        self.assertEqual(
+            list(Submission.objects.order_by('id').values_list('assignment__title', 'student__username', 'grade')),
+            submissions,
+        )
+
+    def test_regressions_fail_against_baseline(self):
+        self.seed(no_files=True)
+        baseline = os.path.join(settings.MEDIA_ROOT, 'baseline.json')
+        options = {'requests': 3, 'warmup': 1, 'only': ['courses.retrieve', 'courses.enroll'],
+                   'baseline': baseline, 'stdout': StringIO()}
+        call_command('run_benchmark', save_baseline=True, **options)
+        with open(baseline) as file:
+            report = json.load(file)
+        self.assertEqual(report['results']['courses.retrieve']['errors'], 0)
+        call_command('run_benchmark', tolerance=100, **options)
+
+        report['results']['courses.enroll']['queries'] -= 1
+        with open(baseline, 'w') as file:
+            json.dump(report, file)
+        with self.assertRaisesMessage(CommandError, 'courses.enroll: SQL-запросов'):
+            call_command('run_benchmark', tolerance=100, **options)
+
+
+class JobQueueTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, CHUNKED_UPLOAD_DIR=media_root,
+            JOBS={**settings.JOBS, 'batch_size': 2, 'retry_backoff': 60},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def register(self, name, func, **options):
+        task(name, **options)(func)
+        self.addCleanup(registry.pop, name)
+
+    def test_course_delete_runs_in_batches(self):
+        course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        course.students.add(self.student)
+        # Файл, сохраненный до хранилища по содержимому, удаляется задачей files.delete
+        legacy = FileSystemStorage().save('lesson_materials/notes.pdf', ContentFile(b'notes'))
+        lesson = Lesson.objects.create(course=course, title='Урок', content='', file=legacy)
+        assignment = Assignment.objects.create(lesson=lesson, title='Задание', description='', deadline=timezone.now())
+        for i in range(3):
+            submission = Submission(assignment=assignment, student=self.student)
+            submission.file.save(f'work{i}.zip', ContentFile(b'work'))
+        self.assertEqual(Blob.objects.get().refs, 3)
+        Review.objects.create(course=course, student=self.student, rating=5)
+        upload = UploadSession.objects.create(owner=self.student, kind='submission', assignment=assignment,
+                                              filename='late.zip', size=10)
+        with open(upload.part_path, 'wb') as part:
+            part.write(b'part')
+
+        response = self.client.delete(f'/api/courses/{course.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.delete(f'/api/courses/{course.pk}/').json()['id'], response.json()['id'])
+        self.assertTrue(Course.objects.filter(pk=course.pk).exists())
+        # До воркера курс уже скрыт: ни чтения, ни нового содержимого
+        self.assertEqual(self.client.get(f'/api/courses/{course.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/lessons/{lesson.pk}/').status_code, 404)
+        self.assertEqual(self.client.post('/api/lessons/', {'course': course.pk, 'title': 'Новый', 'content': ''}).status_code, 400)
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.post(f'/api/courses/{course.pk}/enroll/').status_code, 404)
+        response_submit = self.client.post('/api/submissions/', {
+            'assignment': assignment.pk, 'student': self.student.pk, 'file': SimpleUploadedFile('late.zip', b'late'),
+        })
+        self.assertEqual(response_submit.status_code, 400)
+        self.client.force_authenticate(self.teacher)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_pending()
+        job = self.client.get(f"/api/jobs/{response.json()['id']}/").json()
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['progress']['submissions'], 3)
+        self.assertFalse(Course.objects.filter(pk=course.pk).exists())
+        self.assertFalse(Submission.objects.exists())
+        self.assertFalse(Course.students.through.objects.exists())
+        self.assertEqual(Job.objects.filter(kind='files.delete', status='succeeded').count(), 1)
+        self.assertFalse(default_storage.exists(legacy))
+        self.assertFalse(os.path.exists(upload.part_path))
+        # Общий файл работ остался без ссылок и достается сборщику мусора
+        self.assertEqual(Blob.objects.get().refs, 0)
+        self.assertEqual(collect_garbage(timezone.timedelta(0))['removed'], 1)
+        self.assertFalse(default_storage.exists(submission.file.name))
+
+    def test_cancelled_lesson_delete_shows_lesson_again(self):
+        course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        lesson = Lesson.objects.create(course=course, title='Урок', content='')
+        self.client.get('/api/lessons/')
+        with self.captureOnCommitCallbacks(execute=True):
+            job_id = self.client.delete(f'/api/lessons/{lesson.pk}/').json()['id']
+        self.assertEqual(self.client.get('/api/lessons/').json()['results'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f'/api/jobs/{job_id}/cancel/').status_code, 200)
+        self.assertEqual([item['id'] for item in self.client.get('/api/lessons/').json()['results']], [lesson.pk])
+
+    def test_retry_with_backoff_then_fail(self):
+        def broken(job, value):
+            raise ValueError(f'сломано: {value}')
+        self.register('test.broken', broken, max_attempts=2)
+        job = enqueue('test.broken', value=1)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('сломано: 1', job.error)
+        self.assertGreater(job.run_at, timezone.now() + timezone.timedelta(seconds=50))
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_priority_and_lease_reclaim(self):
+        self.register('test.noop', lambda job: None)
+        low = enqueue('test.noop')
+        high = enqueue('test.noop', priority=10)
+        self.assertEqual(claim('first').pk, high.pk)
+        self.assertEqual(claim('second').pk, low.pk)
+        self.assertIsNone(claim('third'))
+
+        # Первый воркер пропал: после истечения аренды задачу забирает другой
+        Job.objects.filter(pk=high.pk).update(locked_until=timezone.now() - timezone.timedelta(seconds=1))
+        reclaimed = claim('third')
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (high.pk, 2))
+        stale = Job.objects.get(pk=high.pk)
+        stale.locked_by = 'first'
+        with self.assertRaises(LeaseLost):
+            checkpoint(stale, step=1)
+
+    def test_jobs_are_private_and_cancellable(self):
+        self.register('test.noop', lambda job: None)
+        job = enqueue('test.noop', owner=self.teacher)
+        url = f'/api/jobs/{job.pk}/'
+        self.assertEqual([item['id'] for item in self.client.get('/api/jobs/').json()['results']], [job.pk])
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(f'{url}cancel/').status_code, 404)
+
+        self.client.force_authenticate(self.teacher)
+        self.assertEqual(self.client.post(f'{url}cancel/').json()['status'], 'cancelled')
+        self.assertEqual(self.client.post(f'{url}cancel/').status_code, 409)
+        self.assertEqual(run_pending(), 0)
+
+
+class MediaServingTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_ACCEL_REDIRECT_PREFIX=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.course.students.add(self.student)
+        self.lesson = Lesson.objects.create(course=self.course, title='Урок', content='')
+        self.content = bytes(range(256)) * 4
+        self.lesson.file.save('video.mp4', ContentFile(self.content))
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _signed_url(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/lessons/{self.lesson.pk}/file/')
+        self.assertEqual(response.status_code, 302)
+        return response['Location']
+
+    def test_full_and_range_download(self):
+        url = self._signed_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=5000-').status_code, 416)
+
+    def test_conditional_get(self):
+        url = self._signed_url()
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_accel_redirect(self):
+        url = self._signed_url()
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected/'):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/blobs/{self.lesson.content_hash[:2]}/{self.lesson.content_hash}')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="video.mp4"')
+
+    def test_detail_links_to_checked_download(self):
+        response = self.client.get(f'/api/lessons/{self.lesson.pk}/')
+        self.assertEqual(response.json()['file'], f'http://testserver/api/lessons/{self.lesson.pk}/file/')
+        self.assertEqual(self.client.get(response.json()['file']).status_code, 302)
+
+    def test_access_is_checked(self):
+        stranger = User.objects.create_user('stranger', password='pass')
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/file/').status_code, 404)
+        self.assertEqual(self.client.get('/media/forged/video.mp4').status_code, 404)
+
+
+class EventOutboxTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.course = Course.objects.create(title='Курс', description='', teacher=self.teacher)
+        self.lesson = Lesson.objects.create(course=self.course, title='Урок', content='')
+        self.client = APIClient()
+        self.layer = get_channel_layer()
+        async_to_sync(self.layer.group_add)(course_group(self.course.pk), 'test.student')
+
+    def _receive(self):
+        return async_to_sync(self.layer.receive)('test.student')
+
+    def test_assignment_create_records_event(self):
+        self.client.force_authenticate(self.teacher)
+        response = self.client.post('/api/assignments/', {
+            'lesson': self.lesson.pk, 'title': 'Эссе', 'description': 'Тема на выбор', 'deadline': '2030-01-01T00:00:00Z',
+        })
+        self.assertEqual(response.status_code, 201)
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.kind, event.group), ('assignment.created', course_group(self.course.pk)))
+
+        self.assertEqual(dispatch_batch(), 1)
+        message = self._receive()
+        self.assertEqual(message['event'], 'assignment.created')
+        self.assertEqual(message['data']['assignment'], response.json()['id'])
+        self.assertEqual(message['seq'], Notification.objects.get().id)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_burst_is_coalesced(self):
+        for index in range(COALESCE_THRESHOLD):
+            record_event('assignment.created', course_group(self.course.pk), f'Задание {index}', assignment=index)
+        self.assertEqual(dispatch_batch(), COALESCE_THRESHOLD)
+        message = self._receive()
+        self.assertEqual(message['data']['count'], COALESCE_THRESHOLD)
+        self.assertEqual(len(message['data']['items']), COALESCE_THRESHOLD)
+        self.assertEqual(dispatch_batch(), 0)
+
+    def test_history_endpoint(self):
+        student = User.objects.create_user('student', password='pass')
+        self.course.students.add(student)
+        first = Notification.objects.create(group=course_group(self.course.pk), event='assignment.created', message='1')
+        second = Notification.objects.create(group=user_group(student.pk), event='review.created', message='2')
+        Notification.objects.create(group=user_group(self.teacher.pk), event='submission.created', message='чужое')
+
+        self.client.force_authenticate(student)
+        results = self.client.get('/api/notifications/').json()['results']
+        self.assertEqual([item['seq'] for item in results], [first.id, second.id])
+        results = self.client.get(f'/api/notifications/?since={first.id}').json()['results']
+        self.assertEqual([item['message'] for item in results], ['2'])
+
+    def test_prune_old_notifications(self):
+        old = Notification.objects.create(group=course_group(self.course.pk), event='assignment.created', message='old')
+        Notification.objects.filter(pk=old.pk).update(created_at=timezone.now() - timezone.timedelta(days=60))
+        fresh = Notification.objects.create(group=course_group(self.course.pk), event='assignment.created', message='new')
+        call_command('prune_notifications', days=30, stdout=StringIO())
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)), [fresh.id])
+
+
+class NotificationConsumerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.layer_path = os.path.join(tmp, 'channels.sqlite3')
+        layers = {'default': {
+            'BACKEND': 'core.layers.SQLiteChannelLayer',
+            'CONFIG': {'path': self.layer_path, 'poll_interval': 0.01},
+        }}
+        settings_override = override_settings(CHANNEL_LAYERS=layers)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.stranger = User.objects.create_user('stranger', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', teacher=teacher)
+        self.course.students.add(self.student)
+
+    def _communicator(self, user=None, application=None, query_string=b''):
+        # channels.testing тянет daphne, поэтому говорим по протоколу ASGI напрямую
+        scope = {'type': 'websocket', 'path': '/ws/notifications/', 'query_string': query_string,
+                 'headers': [], 'subprotocols': []}
+        if user is not None:
+            scope['user'] = user
+        return ApplicationCommunicator(application or NotificationConsumer.as_asgi(), scope)
+
+    async def _connect(self, communicator):
+        await communicator.send_input({'type': 'websocket.connect'})
+        return await communicator.receive_output(timeout=2)
+
+    async def _receive_json(self, communicator):
+        return json.loads((await communicator.receive_output(timeout=2))['text'])
+
+    async def _disconnect(self, communicator):
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(timeout=2)
+
+    async def test_course_event_reaches_only_enrolled_sockets_across_workers(self):
+        student, stranger = self._communicator(self.student), self._communicator(self.stranger)
+        self.assertEqual((await self._connect(student))['type'], 'websocket.accept')
+        self.assertEqual((await self._connect(stranger))['type'], 'websocket.accept')
+
+        # Отдельный экземпляр слоя — как другой воркер на той же машине
+        other_worker = SQLiteChannelLayer(self.layer_path)
+        await other_worker.group_send(course_group(self.course.pk), {'type': 'notify', 'message': 'Новое задание'})
+        self.assertEqual(await self._receive_json(student), {'message': 'Новое задание'})
+        self.assertTrue(await stranger.receive_nothing(timeout=0.2))
+
+        await other_worker.group_send(user_group(self.stranger.pk), {'type': 'notify', 'message': 'Лично'})
+        self.assertEqual(await self._receive_json(stranger), {'message': 'Лично'})
+        await self._disconnect(student)
+        await self._disconnect(stranger)
+
+    async def test_messages_are_instrumented(self):
+        labels = {'view': 'NotificationConsumer', 'action': 'websocket.connect'}
+        observed, queries = request_queries.value(**labels), request_queries.total(**labels)
+        communicator = self._communicator(self.student)
+        await self._connect(communicator)
+        await self._disconnect(communicator)
+        self.assertEqual(request_queries.value(**labels), observed + 1)
+        # Группы пользователя читаются из базы в потоке database_sync_to_async
+        self.assertGreater(request_queries.total(**labels), queries)
+
+    async def test_reconnect_replays_missed_notifications(self):
+        group = course_group(self.course.pk)
+        missed = [await Notification.objects.acreate(group=group, event='assignment.created', message=str(index))
+                  for index in range(3)]
+        await Notification.objects.acreate(group=user_group(self.stranger.pk), event='review.created', message='чужое')
+
+        communicator = self._communicator(self.student, query_string=f'since={missed[0].id}'.encode())
+        self.assertEqual((await self._connect(communicator))['type'], 'websocket.accept')
+        replay = await self._receive_json(communicator)
+        self.assertEqual([item['message'] for item in replay['replay']], ['1', '2'])
+        self.assertEqual(await self._receive_json(communicator), {'replay_complete': True, 'seq': missed[2].id})
+
+        # Событие, уже отданное из журнала, вживую не дублируется
+        other_worker = SQLiteChannelLayer(self.layer_path)
+        await other_worker.group_send(group, {'type': 'notify', 'seq': missed[2].id, 'message': '2'})
+        await other_worker.group_send(group, {'type': 'notify', 'seq': missed[2].id + 10, 'message': 'новое'})
+        self.assertEqual((await self._receive_json(communicator))['message'], 'новое')
+        await self._disconnect(communicator)
+
+    async def test_anonymous_socket_is_rejected(self):
+        from django.contrib.auth.models import AnonymousUser
+        message = await self._connect(self._communicator(AnonymousUser()))
+        self.assertEqual(message, {'type': 'websocket.close', 'code': 4401})
+
+    async def test_token_in_query_string(self):
+        from learning_platform.asgi import application
+        token = await Token.objects.acreate(user=self.student)
+        communicator = self._communicator(application=application, query_string=f'token={token.key}'.encode())
+        self.assertEqual((await self._connect(communicator))['type'], 'websocket.accept')
+        await self._disconnect(communicator)
+
+
+class SearchTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher', password='pass', is_teacher=True, is_student=False)
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Программирование на Python', description='Основы языка',
+                                            teacher=self.teacher)
+        self.course.students.add(self.student)
+        self.hidden = Course.objects.create(title='Закрытый курс', description='Секретные программы',
+                                            teacher=self.teacher)
+        self.lesson = Lesson.objects.create(course=self.course, title='Циклы и функции',
+                                            content='Пишем первые программы. Running loops.')
+        self.assignment = Assignment.objects.create(lesson=self.lesson, title='Домашняя работа',
+                                                    description='Напишите программу', deadline=timezone.now())
+        self.client = APIClient()
+
+    def _search(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_queued_deletion_leaves_results_at_once(self):
+        def found():
+            return {(item['kind'], item['id']) for item in self._search(self.teacher, q='программа')['results']}
+        lesson_items = {('lesson', self.lesson.pk), ('assignment', self.assignment.pk)}
+        self.assertLessEqual(lesson_items, found())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_id = self.client.delete(f'/api/lessons/{self.lesson.pk}/').json()['id']
+        self.assertEqual(found(), {('course', self.hidden.pk)})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/jobs/{job_id}/cancel/')
+        self.assertLessEqual(lesson_items, found())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/courses/{self.course.pk}/')
+        self.assertEqual(found(), {('course', self.hidden.pk)})
+
+    def test_stemming_matches_word_forms(self):
+        found = {(item['kind'], item['id']) for item in self._search(self.teacher, q='программа')['results']}
+        self.assertEqual(found, {('course', self.hidden.pk), ('lesson', self.lesson.pk),
+                                 ('assignment', self.assignment.pk)})
+        results = self._search(self.teacher, q='run loop')['results']
+        self.assertEqual([item['id'] for item in results], [self.lesson.pk])
+
+    def test_title_match_ranks_first(self):
+        Lesson.objects.create(course=self.course, title='Функции', content='Повторение')
+        results = self._search(self.teacher, q='функции', kind='lesson')['results']
+        self.assertEqual([item['title'] for item in results], ['Функции', 'Циклы и функции'])
+
+    def test_old_exact_match_outranks_many_newer_weak_ones(self):
+        # Больше совпадений, чем когда-то отбиралось до ранжирования
+        exact = Lesson.objects.create(course=self.course, title='Интегралы', content='')
+        SearchDocument.objects.bulk_create(
+            SearchDocument(kind='lesson', object_id=1000000 + index, course_id=self.course.pk, title=f'Заметка {index}',
+                           title_terms=stem_text(f'Заметка {index}'), body_terms=stem_text('упоминаем интегралы вскользь ' * 5))
+            for index in range(6000)
+        )
+        results = self._search(self.teacher, q='интегралы', kind='lesson', page_size=1)['results']
+        self.assertEqual([item['id'] for item in results], [exact.pk])
+
+    def test_student_sees_only_enrolled_courses(self):
+        found = {(item['kind'], item['id']) for item in self._search(self.student, q='программа')['results']}
+        self.assertEqual(found, {('lesson', self.lesson.pk), ('assignment', self.assignment.pk)})
+
+    def test_index_follows_changes(self):
+        self.lesson.title = 'Рекурсия'
+        self.lesson.save()
+        self.assertEqual(self._search(self.teacher, q='рекурсии')['results'][0]['id'], self.lesson.pk)
+        self.assertEqual(self._search(self.teacher, q='циклы')['results'], [])
+
+        self.lesson.course = self.hidden
+        self.lesson.save()
+        self.assertEqual(self._search(self.student, q='домашняя работа')['results'], [])
+
+        self.hidden.delete()
+        self.assertEqual(self._search(self.teacher, q='рекурсия')['results'], [])
+
+    def test_pagination_and_filters(self):
+        for index in range(3):
+            Assignment.objects.create(lesson=self.lesson, title=f'Задача {index}', description='Программа',
+                                      deadline=timezone.now())
+        page = self._search(self.teacher, q='программа', kind='assignment', course=self.course.pk, page_size=2)
+        self.assertEqual(len(page['results']), 2)
+        self.assertIsNone(page['previous'])
+        self.client.force_authenticate(self.teacher)
+        second = self.client.get(page['next']).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        seen = [item['id'] for item in page['results'] + second['results']]
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(len(self._search(self.teacher, q='"программа* (NEAR')['results']), 0)
+        self.assertEqual(len(self._search(self.teacher, q='"программа* -')['results']), 3)
+        self.assertEqual(self._search(self.teacher, q='  ')['results'], [])
+        self.client.force_authenticate(self.teacher)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'kind': 'user'}).status_code, 400)
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        Lesson.objects.bulk_create([Lesson(course=self.course, title='Массовая загрузка', content='')])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 5)
+        self.assertEqual(len(self._search(self.teacher, q='массовой')['results']), 1)
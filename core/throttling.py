@@ -0,0 +1,172 @@
+"""
+Ограничение частоты запросов маркерной корзиной (token bucket).
+
+У каждого ключа корзина емкостью N маркеров, которая пополняется со
+скоростью N за период: скорость '30/min' допускает всплеск в 30 запросов,
+а дальше — не чаще раза в две секунды. Корзины хранятся в общем кэше,
+поэтому лимит один на все воркеры. В Redis корзина обновляется одним
+Lua-скриптом по времени сервера Redis — атомарно и без расхождения часов
+между машинами. С другими бэкендами кэша (LocMem в разработке) обновление
+атомарно только внутри процесса.
+
+Ограничения включаются не на весь ViewSet, а на отдельные действия:
+ThrottledActionsMixin берет области из throttle_scopes, а скорости —
+из REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+throttled_requests = metrics.counter(
+    'core_throttle_rejected_total', 'Запросы, отклоненные ограничением частоты.', ('scope', 'bucket'),
+)
+
+BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> (емкость 30, пополнение маркеров в секунду)."""
+    count, period = rate.split('/')
+    return int(count), int(count) / DURATIONS[period[0]]
+
+
+# Внутри процесса корзины любого бэкенда, кроме Redis, обновляются под этой блокировкой
+_lock = threading.Lock()
+
+
+def _take_cached(cache, key, capacity, rate):
+    with _lock:
+        now = time.time()
+        tokens, updated = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        cache.set(key, (tokens, now), timeout=capacity / rate)
+        return wait
+
+
+def _take_redis(cache, key, capacity, rate):
+    key = cache.make_key(key)
+    client = cache._cache.get_client(key, write=True)
+    return float(client.register_script(BUCKET_SCRIPT)(keys=[key], args=[capacity, rate]))
+
+
+def take_token(key, capacity, rate):
+    """Забирает маркер из корзины; возвращает 0 или сколько секунд ждать следующего."""
+    cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+    if isinstance(cache, RedisCache):
+        return _take_redis(cache, key, capacity, rate)
+    return _take_cached(cache, key, capacity, rate)
+
+
+class BucketThrottle(BaseThrottle):
+    """
+    Общая часть ограничений: скорость берется из DEFAULT_THROTTLE_RATES
+    по rate_name(scope); если скорость не задана, запрос пропускается.
+    """
+    bucket = None
+
+    def __init__(self):
+        self.delay = 0.0
+
+    def rate_name(self, scope):
+        raise NotImplementedError
+
+    def get_cache_key(self, request, view, scope):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.rate_name(scope)) if scope else None
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        self.delay = take_token(f'core:throttle:{self.get_cache_key(request, view, scope)}', capacity, refill)
+        if self.delay:
+            throttled_requests.inc(scope=scope, bucket=self.bucket)
+            return False
+        return True
+
+    def wait(self):
+        return self.delay
+
+
+class UserBucketThrottle(BucketThrottle):
+    """Корзина на пользователя в области: скорость DEFAULT_THROTTLE_RATES[scope]."""
+    bucket = 'user'
+
+    def rate_name(self, scope):
+        return scope
+
+    def get_cache_key(self, request, view, scope):
+        if request.user and request.user.is_authenticated:
+            return f'{scope}:user:{request.user.pk}'
+        return f'{scope}:ip:{self.get_ident(request)}'
+
+
+class ScopeBucketThrottle(BucketThrottle):
+    """
+    Одна корзина на всю область — DEFAULT_THROTTLE_RATES['<scope>.all']:
+    защищает воркеры, когда лимит каждого пользователя в отдельности
+    еще не исчерпан.
+    """
+    bucket = 'scope'
+
+    def rate_name(self, scope):
+        return f'{scope}.all'
+
+    def get_cache_key(self, request, view, scope):
+        return scope
+
+
+class ThrottledActionsMixin:
+    """
+    Ограничения частоты только для действий из throttle_scopes
+    ({'действие': 'область'}). Остальные действия корзин не трогают
+    и не платят за обращение к кэшу.
+    """
+    throttle_scopes = {}
+    throttle_classes = [UserBucketThrottle, ScopeBucketThrottle]
+
+    def get_throttles(self):
+        if getattr(self, 'action', None) not in self.throttle_scopes:
+            return []
+        return super().get_throttles()
+
+    def check_throttles(self, request):
+        # В отличие от DRF, проверка останавливается на первом отказе: запрос,
+        # отклоненный корзиной пользователя, не тратит маркер общей корзины,
+        # иначе один клиент вычерпал бы ее и отказы получали бы все остальные
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
@@ -0,0 +1,209 @@
+"""
+Токены API: срок действия, ротация и кэш «ключ токена → пользователь».
+
+Кэш двухуровневый. Первый уровень — LRU в памяти процесса с коротким TTL:
+попадание в него не стоит ни запроса к базе, ни обращения к сети. Второй —
+общий кэш (Redis в проде), переживающий перезапуск воркера. Отзыв токена
+и изменение пользователя (сигналы в core.signals) удаляют запись из общего
+кэша и из памяти своего процесса; в остальных процессах запись живет
+не дольше AUTH_TOKEN_LOCAL_TTL секунд.
+
+Запись общего кэша помечена поколением ключа, которое отзыв заменяет
+новым. Запрос, прочитавший токен из базы до отзыва, может записать
+устаревшую запись уже после него, но с прежним поколением она не
+совпадет и будет прочитана как промах.
+
+Из кэша пользователь собирается через from_db с частью полей: остальные
+поля отложены и догружаются из базы при первом обращении, а save()
+сохранит только загруженные поля.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+
+def _concrete(model, names):
+    # from_db ждет значения в порядке полей модели
+    return tuple(field.attname for field in model._meta.concrete_fields if field.attname in names)
+
+
+# Поля пользователя, нужные аутентификации и классам разрешений
+USER_FIELDS = _concrete(User, {'id', 'username', 'is_active', 'is_staff', 'is_superuser', 'is_teacher', 'is_student'})
+TOKEN_FIELDS = _concrete(Token, {'key', 'user_id', 'created'})
+
+
+class LocalLRU:
+    """Потокобезопасный LRU с TTL в памяти процесса."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        ttl = getattr(settings, 'AUTH_TOKEN_LOCAL_TTL', 5)
+        maxsize = getattr(settings, 'AUTH_TOKEN_LOCAL_SIZE', 10000)
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalLRU()
+
+
+def get_cache():
+    return caches[getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')]
+
+
+def _shared_key(key):
+    # Сам ключ в общий кэш не попадает
+    return 'core:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _generation_key(key):
+    return 'core:token-gen:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def token_expires_at(created):
+    ttl = getattr(settings, 'AUTH_TOKEN_TTL', 0)
+    return created + timedelta(seconds=ttl) if ttl else None
+
+
+def is_expired(created):
+    expires_at = token_expires_at(created)
+    return expires_at is not None and expires_at <= timezone.now()
+
+
+def _entry(token):
+    return {
+        'user': [getattr(token.user, field) for field in USER_FIELDS],
+        'created': token.created,
+    }
+
+
+def _credentials(key, entry):
+    user = User.from_db(None, USER_FIELDS, entry['user'])
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    if is_expired(entry['created']):
+        raise exceptions.AuthenticationFailed('Срок действия токена истек. Получите новый.')
+    values = {'key': key, 'user_id': user.pk, 'created': entry['created']}
+    token = Token.from_db(None, TOKEN_FIELDS, [values[field] for field in TOKEN_FIELDS])
+    token.user = user
+    return user, token
+
+
+def _timeout():
+    return getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 300)
+
+
+def _cached(key, values):
+    entry = values.get(_shared_key(key))
+    if entry is not None and entry['generation'] == values.get(_generation_key(key)):
+        return entry
+    return None
+
+
+def authenticate_key(key):
+    """Пользователь и токен по ключу; база — только при промахе обоих кэшей."""
+    entry = local_cache.get(key)
+    if entry is None:
+        cache = get_cache()
+        values = cache.get_many([_shared_key(key), _generation_key(key)])
+        entry = _cached(key, values)
+        if entry is None:
+            # Поколение читается до базы: отзыв после этого места его сменит
+            generation = values.get(_generation_key(key))
+            if generation is None:
+                cache.add(_generation_key(key), uuid.uuid4().hex, timeout=_timeout())
+                generation = cache.get(_generation_key(key))
+            token = Token.objects.select_related('user').filter(key=key).first()
+            if token is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            entry = {**_entry(token), 'generation': generation}
+            cache.set(_shared_key(key), entry, timeout=_timeout())
+        local_cache.set(key, entry)
+    return _credentials(key, entry)
+
+
+async def aauthenticate_key(key):
+    """Асинхронный вариант authenticate_key."""
+    entry = local_cache.get(key)
+    if entry is None:
+        cache = get_cache()
+        values = await cache.aget_many([_shared_key(key), _generation_key(key)])
+        entry = _cached(key, values)
+        if entry is None:
+            generation = values.get(_generation_key(key))
+            if generation is None:
+                await cache.aadd(_generation_key(key), uuid.uuid4().hex, timeout=_timeout())
+                generation = await cache.aget(_generation_key(key))
+            token = await Token.objects.select_related('user').filter(key=key).afirst()
+            if token is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            entry = {**_entry(token), 'generation': generation}
+            await cache.aset(_shared_key(key), entry, timeout=_timeout())
+        local_cache.set(key, entry)
+    return _credentials(key, entry)
+
+
+def invalidate_token(key):
+    local_cache.delete(key)
+    # Новое поколение делает недействительной и запись, которую параллельный
+    # запрос еще только собирается положить в кэш
+    get_cache().set(_generation_key(key), uuid.uuid4().hex, timeout=_timeout())
+    get_cache().delete(_shared_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def issue_token(user, rotate=False):
+    """
+    Токен пользователя для входа: действующий возвращается как есть,
+    истекший или при rotate=True заменяется новым. У пользователя всегда
+    не больше одного токена, поэтому повторные входы не плодят строк.
+    """
+    with transaction.atomic():
+        token = Token.objects.select_for_update().filter(user=user).first()
+        if token is not None and not rotate and not is_expired(token.created):
+            return token
+        if token is not None:
+            token.delete()
+        return Token.objects.create(user=user)
@@ -0,0 +1,201 @@
+import os
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from .models import Assignment, Blob, Lesson, Submission, UploadSession
+from .storage import blob_hash, blob_name
+from .submissions import record_submission_created
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(APIException):
+    """Ошибка протокола загрузки. В ответ добавляется текущее смещение, чтобы клиент мог продолжить."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status_code = status
+        # Смещение оставляем числом, а не строкой, как сделал бы APIException
+        self.detail = {'detail': self.detail}
+        if offset is not None:
+            self.detail['offset'] = offset
+
+
+class _PartFile(File):
+    """
+    Временный файл сессии. FileSystemStorage переносит файлы с
+    temporary_file_path() через rename, без копирования содержимого.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def check_quota(user, size):
+    if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadError(f'Файл больше {settings.CHUNKED_UPLOAD_MAX_SIZE} байт.', status=413)
+    in_flight = UploadSession.objects.filter(owner=user, status__in=('active', 'writing')).aggregate(
+        total=Sum(F('size') - F('offset'))
+    )['total'] or 0
+    if in_flight + size > settings.CHUNKED_UPLOAD_USER_QUOTA:
+        raise UploadError('Превышена квота незавершенных загрузок.', status=413)
+
+
+def write_chunk(session, stream, offset, length):
+    """
+    Дописывает часть файла из потока запроса, не буферизуя ее в памяти.
+
+    Смещение должно совпадать с уже принятым объемом: так клиент после
+    обрыва узнает offset через GET и продолжает с нужного места.
+    Контрольная сумма CRC32 считается по ходу записи.
+
+    Перед записью сессия условным UPDATE переводится в статус writing:
+    второй запрос с тем же смещением получает 409, не трогая файл.
+    Захват, не снятый за CHUNKED_UPLOAD_WRITE_TIMEOUT (упавший процесс),
+    может перехватить следующий запрос.
+    """
+    if session.status == 'writing':
+        raise UploadError('Часть уже записывается другим запросом.', status=409, offset=session.offset)
+    if session.status != 'active':
+        raise UploadError('Загрузка уже завершена.', status=409)
+    if offset != session.offset:
+        raise UploadError('Неверное смещение части.', status=409, offset=session.offset)
+    if not length:
+        raise UploadError('Нужен непустой Content-Length.', status=411)
+    if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(f'Часть больше {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} байт.', status=413)
+    if offset + length > session.size:
+        raise UploadError('Часть выходит за объявленный размер файла.', status=413)
+
+    if offset and not os.path.exists(session.part_path):
+        raise UploadError('Временный файл загрузки утерян, начните заново.', status=410)
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+
+    # Диапазон захватывается до записи; метка времени захвата служит его
+    # идентификатором, чтобы перехваченный запрос не смог снять чужой захват
+    claimed_at = timezone.now()
+    abandoned = claimed_at - timedelta(seconds=settings.CHUNKED_UPLOAD_WRITE_TIMEOUT)
+    claimed = UploadSession.objects.filter(
+        Q(status='active') | Q(status='writing', updated_at__lt=abandoned), pk=session.pk, offset=offset,
+    ).update(status='writing', updated_at=claimed_at)
+    if not claimed:
+        session.refresh_from_db()
+        raise UploadError('Часть уже записывается или записана другим запросом.', status=409, offset=session.offset)
+    ours = UploadSession.objects.filter(pk=session.pk, status='writing', updated_at=claimed_at)
+
+    crc = session.crc32
+    received = 0
+    try:
+        with open(session.part_path, 'r+b' if offset else 'wb') as part:
+            part.seek(offset)
+            while received < length:
+                block = stream.read(min(READ_BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                part.write(block)
+                crc = zlib.crc32(block, crc)
+                received += len(block)
+            part.truncate()
+    except BaseException:
+        ours.update(status='active', updated_at=timezone.now())
+        raise
+
+    if received != length:
+        ours.update(status='active', updated_at=timezone.now())
+        raise UploadError('Часть получена не полностью.', offset=session.offset)
+
+    updated = ours.update(status='active', offset=offset + length, crc32=crc, updated_at=timezone.now())
+    if not updated:
+        session.refresh_from_db()
+        raise UploadError('Захват части истек, повторите ее.', status=409, offset=session.offset)
+    session.offset, session.crc32 = offset + length, crc
+    return session
+
+
+def stored_copy_exists(session):
+    """
+    Есть ли в хранилище файл с заявленным sha256, доступный пользователю:
+    своя же работа, а для преподавателя — материалы любого урока. Чужие
+    работы не подходят: знание хэша не должно давать доступ к файлу.
+    """
+    if not session.sha256 or not Blob.objects.filter(pk=session.sha256, size=session.size).exists():
+        return False
+    if session.kind == 'submission':
+        return Submission.objects.filter(student=session.owner, content_hash=session.sha256).exists()
+    return Lesson.objects.filter(content_hash=session.sha256).exists()
+
+
+def skip_known_upload(session):
+    """Повторная загрузка уже сохраненного файла сразу считается принятой целиком."""
+    if not stored_copy_exists(session):
+        return False
+    session.offset = session.size
+    session.save(update_fields=['offset', 'updated_at'])
+    return True
+
+
+def finalize_upload(session, checksum=None):
+    """
+    Переносит собранный файл в хранилище и атомарно создает Submission
+    (или прикрепляет файл к уроку). Повторная финализация невозможна.
+    Если байты не передавались (skip_known_upload), новая ссылка
+    указывает на уже сохраненный файл.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == 'writing':
+            raise UploadError('Часть еще записывается.', status=409, offset=session.offset)
+        if session.status != 'active':
+            raise UploadError('Загрузка уже завершена.', status=409)
+        if session.offset != session.size:
+            raise UploadError('Файл загружен не полностью.', status=409, offset=session.offset)
+        reused = not os.path.exists(session.part_path)
+        if reused and not stored_copy_exists(session):
+            raise UploadError('Временный файл загрузки утерян, начните заново.', status=410)
+        if checksum is not None and not reused and checksum != session.crc32:
+            raise UploadError('Контрольная сумма не совпадает.', status=422)
+        if session.kind == 'submission':
+            alive = Assignment.objects.filter(pk=session.assignment_id, lesson__deleting=False, lesson__course__deleting=False)
+        else:
+            alive = Lesson.objects.filter(pk=session.lesson_id, deleting=False, course__deleting=False)
+        if not alive.exists():
+            raise UploadError('Задание или урок удаляются.', status=410)
+
+        if session.kind == 'submission':
+            target = Submission(assignment=session.assignment, student=session.owner)
+        else:
+            target = Lesson.objects.select_for_update().get(pk=session.lesson_id)
+        field = target._meta.get_field('file')
+        if reused:
+            target.file.name = blob_name(session.sha256, field.storage.get_available_name(
+                session.filename, max_length=field.max_length))
+        else:
+            name = field.generate_filename(target, session.filename)
+            with open(session.part_path, 'rb') as part:
+                target.file.name = field.storage.save(name, _PartFile(part), max_length=field.max_length)
+            if session.sha256 and blob_hash(target.file.name) not in ('', session.sha256):
+                raise UploadError('SHA-256 файла не совпадает с заявленным.', status=422)
+        target.save()
+
+        session.status = 'complete'
+        if session.kind == 'submission':
+            session.submission = target
+            # Тот же outbox, что у прямого создания работы: уведомление уйдет после коммита
+            record_submission_created(target)
+        session.save(update_fields=['status', 'submission', 'updated_at'])
+    discard_part(session)
+    return target
+
+
+def discard_part(session):
+    try:
+        os.remove(session.part_path)
+    except FileNotFoundError:
+        pass
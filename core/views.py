@@ -1,43 +1,191 @@
-from rest_framework import viewsets, permissions
+import io
+from collections import Counter
+
+from django.db import transaction
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework.views import APIView
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 from .models import *
 from .serializers import *
-from .permissions import IsTeacherOrReadOnly, IsOwnerOrTeacher, IsEnrolledOrTeacher, CanReviewCourse
+from .permissions import IsTeacher, IsTeacherOrReadOnly, IsOwnerOrTeacher, IsEnrolledOrTeacher, CanEnroll, CanReviewCourse, is_enrolled
+from .async_views import AsyncReadMixin
+from .fastpath import ValuesListMixin
+from .instrumentation import InstrumentedViewMixin
+from .throttling import ThrottledActionsMixin
+from .admission import AdmissionControlMixin
+from .cache import CachedResponseMixin
+from .ratings import apply_review
+from .dashboard import build_dashboard, dashboard_courses
+from .enrollment import apply_enrollments, build_row, parse_roster
+from .gradebook import FORMATS as GRADEBOOK_FORMATS, export_gradebook, streaming_export
+from .media import media_redirect
+from .events import record_event
+from .jobs import cancel_job, delete_files_later, enqueue, schedule_deletion
+from .pagination import RankedPagination
+from .search import search
+from .notifications import course_group, user_group, user_groups
+from .tokens import issue_token, token_expires_at
+from .submissions import LATE, MISSING, SUBMITTED, assignment_statuses, record_submission_created, students_by_status
+from .uploads import UploadError, check_quota, discard_part, finalize_upload, skip_known_upload, write_chunk
 
 @extend_schema_view(
-    list=extend_schema(summary="Получить список курсов", description="Возвращает список всех доступных курсов.", tags=["Курсы"]),
+    list=extend_schema(summary="Получить список курсов", description="Возвращает список доступных курсов. Студенты видят только курсы, на которые они записаны.", tags=["Курсы"]),
     create=extend_schema(summary="Создать новый курс", description="Создает новый курс. Доступно только преподавателям.", tags=["Курсы"]),
     retrieve=extend_schema(summary="Получить информацию о курсе", description="Возвращает информацию о курсе по его ID. Студенты видят только курсы, на которые они записаны.", tags=["Курсы"]),
     update=extend_schema(summary="Обновить курс", description="Обновляет данные курса по его ID. Доступно только преподавателям.", tags=["Курсы"]),
     partial_update=extend_schema(summary="Частично обновить курс", description="Частично обновляет данные курса по его ID. Доступно только преподавателям.", tags=["Курсы"]),
-    destroy=extend_schema(summary="Удалить курс", description="Удаляет курс по его ID. Доступно только преподавателям.", tags=["Курсы"]),
+    destroy=extend_schema(summary="Удалить курс", description="Ставит в очередь фоновую задачу, которая пачками удаляет работы, задания, уроки и отзывы курса, затем сам курс, а файлы — отдельными задачами. Возвращает задачу (202); ее состояние — GET /jobs/{id}/. Повторный запрос, пока задача не завершена, возвращает ту же задачу. Доступно только преподавателям.", tags=["Курсы"], responses={202: JobSerializer}),
 )
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(InstrumentedViewMixin, ThrottledActionsMixin, ValuesListMixin, CachedResponseMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    list_serializer_class = CourseListSerializer
     permission_classes = [IsTeacherOrReadOnly, IsEnrolledOrTeacher]
+    ordering = ('-created_at', '-id')
+    cache_resource = 'course'
+    throttle_scopes = {'enroll': 'enroll'}
 
-    @extend_schema(summary="Записаться на курс", description="Позволяет студенту записаться на курс по его ID.", tags=["Курсы"])
-    @action(detail=True, methods=['post'])
+    def get_queryset(self):
+        # Записаться можно и на курс, которого студент еще не видит
+        queryset = Course.objects.select_related('rating')
+        if self.action != 'destroy':
+            # Курс в очереди на удаление скрыт сразу; повторный DELETE вернет ту же задачу
+            queryset = queryset.filter(deleting=False)
+        if self.action == 'retrieve':
+            # Список студентов нужен сериализатору; асинхронному пути — обязательно заранее
+            queryset = queryset.prefetch_related('students')
+        elif self.action == 'dashboard':
+            queryset = dashboard_courses(queryset, self.sparse_fields)
+        if self.action == 'enroll' or self.request.user.is_teacher:
+            return queryset
+        return queryset.filter(students=self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        job = schedule_deletion(self.get_object(), owner=request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(summary="Записаться на курс", description="Позволяет студенту записаться на курс по его ID, в том числе на курс, которого он еще не видит. Доступно студентам и преподавателям.", tags=["Курсы"])
+    @action(detail=True, methods=['post'], permission_classes=[CanEnroll])
     def enroll(self, request, pk=None):
         course = self.get_object()
         course.students.add(request.user)
         return Response({'status': 'enrolled'})
 
+    @extend_schema(summary="Массовая запись на курс", description="Записывает или отчисляет сразу много студентов курса: списком ID или файлом CSV/JSONL. Возвращает результат по каждой строке; с background=true — фоновую задачу (202). Доступно только преподавателям.", tags=["Курсы"], request=BulkEnrollmentSerializer, responses={200: EnrollmentResultSerializer(many=True), 202: JobSerializer})
+    @action(detail=True, methods=['post'])
+    def bulk_enroll(self, request, pk=None):
+        course = self.get_object()
+        return self.apply_bulk_enrollment(request, course_id=course.pk)
+
+    @extend_schema(summary="Массовая запись на несколько курсов", description="Записывает или отчисляет студентов сразу на нескольких курсах: списком пар курс–студент или файлом CSV/JSONL; с background=true — в фоновой задаче (202). Доступно только преподавателям.", tags=["Курсы"], request=BulkEnrollmentSerializer, responses={200: EnrollmentResultSerializer(many=True), 202: JobSerializer})
+    @action(detail=False, methods=['post'], url_path='bulk_enroll')
+    def bulk_enroll_all(self, request):
+        return self.apply_bulk_enrollment(request)
+
+    def apply_bulk_enrollment(self, request, course_id=None):
+        serializer = BulkEnrollmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if 'file' in data:
+            upload = data['file']
+            fmt = data.get('format') or ('jsonl' if upload.name.endswith('.jsonl') else 'csv')
+            lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            rows = parse_roster(lines, fmt, course_id=course_id)
+        elif 'users' in data:
+            if course_id is None:
+                raise ValidationError({'users': 'Список users допустим только для конкретного курса.'})
+            rows = (build_row(i, course_id, user) for i, user in enumerate(data['users'], start=1))
+        else:
+            rows = (build_row(i, item.get('course'), item.get('user'), course_id=course_id)
+                    for i, item in enumerate(data.get('enrollments', []), start=1))
+
+        unenroll = data['action'] == 'unenroll'
+        if data['background']:
+            # Строки разбираются здесь: загруженный файл живет только в запросе
+            job = enqueue('enrollment.bulk', owner=request.user, rows=list(rows), unenroll=unenroll)
+            return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        results = list(apply_enrollments(rows, unenroll=unenroll))
+        return Response({
+            'summary': Counter(result['status'] for result in results),
+            'results': results,
+        })
+
+    @extend_schema(summary="Выгрузить ведомость оценок", description="Потоково отдает матрицу студент × задание с последними выставленными оценками. Формат задается параметром file_format: csv (по умолчанию), xlsx или parquet (требует pyarrow). Память сервера не зависит от числа студентов. Доступно только преподавателям.", tags=["Курсы"], parameters=[OpenApiParameter('file_format', str, enum=list(GRADEBOOK_FORMATS), description='Формат файла')], responses={(200, 'application/octet-stream'): {'type': 'string', 'format': 'binary'}})
+    @action(detail=True, methods=['get'], permission_classes=[IsTeacher])
+    def gradebook(self, request, pk=None):
+        course = self.get_object()
+        file_format = request.query_params.get('file_format', 'csv')
+        return streaming_export(request, export_gradebook(course, file_format), file_format, f'gradebook-{course.pk}')
+
+    @extend_schema(
+        summary="Сводка курса",
+        description="Курс, его уроки с заданиями, статус сдачи каждого задания вызывающим студентом и рейтинг — одним ответом вместо запросов к /lessons/, /assignments/, /submissions/ и /reviews/. Число запросов к базе не зависит от размера курса. Параметры fields[<набор>]=поле,поле оставляют только нужные поля: fields[dashboard]=course,lessons пропускает рейтинг, fields[lesson]=id,title — текст и задания уроков. У преподавателя статус, время отправки и оценка — null. Студенты видят только курсы, на которые они записаны.",
+        tags=["Курсы"],
+        parameters=[
+            OpenApiParameter('fields[dashboard]', str, description='Разделы ответа: course, rating, lessons'),
+            OpenApiParameter('fields[course]', str, description='Поля курса: id, title, description, teacher, created_at, student_count'),
+            OpenApiParameter('fields[lesson]', str, description='Поля урока: id, title, content, has_file, assignments'),
+            OpenApiParameter('fields[assignment]', str, description='Поля задания: id, title, description, deadline, status, submitted_at, grade'),
+        ],
+        responses=CourseDashboardSerializer,
+    )
+    @action(detail=True, methods=['get'])
+    def dashboard(self, request, pk=None):
+        # Разбирается до get_object: от набора полей зависят аннотации курса
+        self.sparse_fields = parse_sparse_fields(request.query_params, CourseDashboardSerializer())
+        course = self.get_object()
+        context = {**self.get_serializer_context(), 'fields': self.sparse_fields}
+        return Response(CourseDashboardSerializer(build_dashboard(course, request.user, self.sparse_fields), context=context).data)
+
+    @extend_schema(summary="Получить рейтинг курса", description="Возвращает количество отзывов, среднюю оценку и гистограмму оценок курса.", tags=["Курсы"], responses=CourseRatingSerializer)
+    @action(detail=True, methods=['get'])
+    def rating(self, request, pk=None):
+        course = self.get_object()
+        rating = getattr(course, 'rating', None) or CourseRating(course=course)
+        return Response(CourseRatingSerializer(rating).data)
+
 @extend_schema_view(
     list=extend_schema(summary="Получить список уроков", description="Возвращает список всех уроков. Студенты видят уроки только тех курсов, на которые они записаны.", tags=["Уроки"]),
     create=extend_schema(summary="Создать новый урок", description="Создает новый урок для курса. Доступно только преподавателям.", tags=["Уроки"]),
     retrieve=extend_schema(summary="Получить информацию об уроке", description="Возвращает информацию об уроке по его ID. Студенты видят уроки только тех курсов, на которые они записаны.", tags=["Уроки"]),
     update=extend_schema(summary="Обновить урок", description="Обновляет данные урока по его ID. Доступно только преподавателям.", tags=["Уроки"]),
     partial_update=extend_schema(summary="Частично обновить урок", description="Частично обновляет данные урока по его ID. Доступно только преподавателям.", tags=["Уроки"]),
-    destroy=extend_schema(summary="Удалить урок", description="Удаляет урок по его ID. Доступно только преподавателям.", tags=["Уроки"]),
+    destroy=extend_schema(summary="Удалить урок", description="Ставит в очередь фоновую задачу, которая пачками удаляет работы и задания урока, затем сам урок и его файлы. Возвращает задачу (202). Доступно только преподавателям.", tags=["Уроки"], responses={202: JobSerializer}),
 )
-class LessonViewSet(viewsets.ModelViewSet):
+class LessonViewSet(InstrumentedViewMixin, ValuesListMixin, CachedResponseMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
+    list_serializer_class = LessonListSerializer
     permission_classes = [IsTeacherOrReadOnly]
+    ordering = ('id',)
+    cache_resource = 'lesson'
+
+    def get_queryset(self):
+        queryset = Lesson.objects.select_related('course').filter(course__deleting=False)
+        if self.action != 'destroy':
+            queryset = queryset.filter(deleting=False)
+        user = self.request.user
+        if not user.is_authenticated:
+            # Чтение разрешено и без входа, но анонимному пользователю не видно ничего
+            return queryset.none()
+        if user.is_teacher:
+            return queryset
+        # Студенты видят уроки только тех курсов, на которые они записаны
+        return queryset.filter(course__students=self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        job = schedule_deletion(self.get_object(), owner=request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(summary="Скачать материалы урока", description="Проверяет доступ к уроку и перенаправляет на временную подписанную ссылку на файл. Ссылка поддерживает Range-запросы и условные GET.", tags=["Уроки"], responses={302: None})
+    @action(detail=True, methods=['get'])
+    def file(self, request, pk=None):
+        return media_redirect(self.get_object().file)
 
 @extend_schema_view(
     list=extend_schema(summary="Получить список заданий", description="Возвращает список всех заданий. Студенты видят задания только тех курсов, на которые они записаны.", tags=["Задания"]),
@@ -47,10 +195,73 @@ class LessonViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(summary="Частично обновить задание", description="Частично обновляет данные задания по его ID. Доступно только преподавателям.", tags=["Задания"]),
     destroy=extend_schema(summary="Удалить задание", description="Удаляет задание по его ID. Доступно только преподавателям.", tags=["Задания"]),
 )
-class AssignmentViewSet(viewsets.ModelViewSet):
+class AssignmentViewSet(InstrumentedViewMixin, ValuesListMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Assignment.objects.all()
     serializer_class = AssignmentSerializer
+    list_serializer_class = AssignmentListSerializer
     permission_classes = [IsTeacherOrReadOnly]
+    ordering = ('deadline', 'id')
+
+    def get_queryset(self):
+        queryset = Assignment.objects.select_related('lesson').filter(lesson__deleting=False, lesson__course__deleting=False)
+        user = self.request.user
+        if not user.is_authenticated:
+            # Чтение разрешено и без входа, но анонимному пользователю не видно ничего
+            return queryset.none()
+        if user.is_teacher:
+            return queryset
+        # Студенты видят задания только тех курсов, на которые они записаны
+        return queryset.filter(lesson__course__students=self.request.user)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            assignment = serializer.save()
+            record_event(
+                'assignment.created', course_group(assignment.lesson.course_id),
+                f'Новое задание: {assignment.title}',
+                assignment=assignment.pk, lesson=assignment.lesson_id, deadline=assignment.deadline.isoformat(),
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            files = list(instance.submissions.values_list('file', flat=True))
+            instance.delete()
+            delete_files_later(files)
+
+    @extend_schema(summary="Студенты, сдавшие задание вовремя", description="Студенты курса, у которых есть работа, отправленная до дедлайна. Доступно только преподавателям.", tags=["Задания"], responses=StudentSubmissionStatusSerializer(many=True))
+    @action(detail=True, methods=['get'], permission_classes=[IsTeacher])
+    def submitted(self, request, pk=None):
+        return self.students_with_status(SUBMITTED)
+
+    @extend_schema(summary="Студенты, сдавшие задание с опозданием", description="Студенты курса, все работы которых отправлены после дедлайна. Доступно только преподавателям.", tags=["Задания"], responses=StudentSubmissionStatusSerializer(many=True))
+    @action(detail=True, methods=['get'], permission_classes=[IsTeacher])
+    def late(self, request, pk=None):
+        return self.students_with_status(LATE)
+
+    @extend_schema(summary="Студенты, не сдавшие задание", description="Студенты курса без единой работы по заданию. До дедлайна это те, кто еще не сдал. Доступно только преподавателям.", tags=["Задания"], responses=StudentSubmissionStatusSerializer(many=True))
+    @action(detail=True, methods=['get'], permission_classes=[IsTeacher])
+    def missing(self, request, pk=None):
+        return self.students_with_status(MISSING)
+
+    def students_with_status(self, status):
+        students = students_by_status(self.get_object(), status)
+        # Студенты листаются по id, а не по порядку заданий
+        self.ordering = ('id',)
+        page = self.paginate_queryset(students)
+        return self.get_paginated_response(StudentSubmissionStatusSerializer(page, many=True).data)
+
+    @extend_schema(summary="Статус сдачи заданий курса студентом", description="Для каждого задания курса возвращает статус сдачи: submitted, late или missing. Студент видит свой статус, преподаватель — статус любого студента (параметр student).", tags=["Задания"], parameters=[OpenApiParameter('course', int, required=True, description='Идентификатор курса'), OpenApiParameter('student', int, description='Идентификатор студента (для преподавателей)')], responses=AssignmentSubmissionStatusSerializer(many=True))
+    @action(detail=False, methods=['get'])
+    def student_status(self, request):
+        try:
+            course_id = int(request.query_params['course'])
+            student_id = int(request.query_params.get('student') or request.user.pk)
+        except (KeyError, ValueError):
+            raise ValidationError({'course': 'Укажите числовые идентификаторы course и student.'})
+        if not request.user.is_teacher and (student_id != request.user.pk or not is_enrolled(request, course_id)):
+            raise PermissionDenied('Студент видит только свой статус по своим курсам.')
+        page = self.paginate_queryset(assignment_statuses(course_id, student_id))
+        return self.get_paginated_response(AssignmentSubmissionStatusSerializer(page, many=True).data)
 
 
 
@@ -62,10 +273,14 @@ class AssignmentViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(summary="Частично обновить выполненное задание", description="Частично обновляет данные выполненного задания по его ID. Студенты могут редактировать только свои задания.", tags=["Выполненные задания"]),
     destroy=extend_schema(summary="Удалить выполненное задание", description="Удаляет выполненное задание по его ID. Студенты могут удалять только свои задания.", tags=["Выполненные задания"]),
 )
-class SubmissionViewSet(viewsets.ModelViewSet):
+class SubmissionViewSet(InstrumentedViewMixin, ThrottledActionsMixin, AdmissionControlMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Submission.objects.all()
     serializer_class = SubmissionSerializer
+    list_serializer_class = SubmissionListSerializer
     permission_classes = [IsOwnerOrTeacher]
+    ordering = ('-submitted_at', '-id')
+    throttle_scopes = {'create': 'submissions'}
+    admission_pools = {'create': 'uploads'}
 
     def get_queryset(self):
         if self.request.user.is_student:
@@ -73,8 +288,39 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         return Submission.objects.all()
 
     def perform_create(self, serializer):
-        # Автоматически устанавливаем student как текущего пользователя
-        serializer.save(student=self.request.user)
+        with transaction.atomic():
+            # Автоматически устанавливаем student как текущего пользователя
+            submission = serializer.save(student=self.request.user)
+            record_submission_created(submission)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            delete_files_later([instance.file.name])
+
+    @extend_schema(summary="Выставить оценку", description="Выставляет или снимает оценку за выполненное задание. Доступно только преподавателям.", tags=["Выполненные задания"], request=GradeSerializer, responses=SubmissionSerializer)
+    @action(detail=True, methods=['post'], permission_classes=[IsTeacher])
+    def grade(self, request, pk=None):
+        submission = self.get_object()
+        serializer = GradeSerializer(submission, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(SubmissionSerializer(submission, context=self.get_serializer_context()).data)
+
+    @extend_schema(summary="Скачать файл выполненного задания", description="Проверяет доступ к выполненному заданию и перенаправляет на временную подписанную ссылку на файл.", tags=["Выполненные задания"], responses={302: None})
+    @action(detail=True, methods=['get'])
+    def file(self, request, pk=None):
+        return media_redirect(self.get_object().file)
+
+    @extend_schema(summary="Одинаковые работы других студентов", description="Работы других студентов с тем же содержимым файла (совпадает SHA-256). Поиск идет по индексу, без чтения файлов. Доступно только преподавателям.", tags=["Выполненные задания"], responses=SubmissionListSerializer(many=True))
+    @action(detail=True, methods=['get'], permission_classes=[IsTeacher])
+    def duplicates(self, request, pk=None):
+        submission = self.get_object()
+        queryset = Submission.objects.filter(content_hash=submission.content_hash).exclude(student=submission.student_id)
+        if not submission.content_hash:
+            queryset = queryset.none()
+        page = self.paginate_queryset(SubmissionListSerializer.values_queryset(queryset))
+        return self.get_paginated_response(SubmissionListSerializer(page, many=True).data)
 
 
 @extend_schema_view(
@@ -85,12 +331,188 @@ class SubmissionViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(summary="Частично обновить отзыв", description="Частично обновляет данные отзыва по его ID. Студенты могут редактировать только свои отзывы.", tags=["Отзывы"]),
     destroy=extend_schema(summary="Удалить отзыв", description="Удаляет отзыв по его ID. Студенты могут удалять только свои отзывы.", tags=["Отзывы"]),
 )
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsOwnerOrTeacher, CanReviewCourse]
+    ordering = ('-id',)
 
     def get_queryset(self):
         if self.request.user.is_student:
             return Review.objects.filter(course__students=self.request.user)
-        return Review.objects.all()
\ No newline at end of file
+        return Review.objects.all()
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            review = serializer.save()
+            apply_review(review.course_id, review.rating)
+            record_event(
+                'review.created', user_group(review.course.teacher_id),
+                f'Новый отзыв на курс «{review.course.title}»',
+                review=review.pk, course=review.course_id, rating=review.rating,
+            )
+
+    def perform_update(self, serializer):
+        old_course_id, old_rating = serializer.instance.course_id, serializer.instance.rating
+        data = serializer.validated_data
+        changed = (old_course_id, old_rating) != (data.get('course', serializer.instance.course).pk, data.get('rating', old_rating))
+        with transaction.atomic():
+            if changed:
+                # Вычитаем, пока старый отзыв еще в таблице (см. apply_review)
+                apply_review(old_course_id, old_rating, sign=-1)
+            review = serializer.save()
+            if changed:
+                apply_review(review.course_id, review.rating)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            apply_review(instance.course_id, instance.rating, sign=-1)
+            instance.delete()
+
+
+@extend_schema_view(
+    list=extend_schema(summary="Получить список загрузок", description="Возвращает сессии загрузки файлов текущего пользователя.", tags=["Загрузки"]),
+    create=extend_schema(summary="Начать загрузку файла", description="Создает сессию загрузки выполненного задания или материалов урока. Файл затем передается частями через PUT /uploads/{id}/chunk/. Если указан sha256 файла, который вы уже загружали, передавать его не нужно: offset сразу равен size.", tags=["Загрузки"]),
+    retrieve=extend_schema(summary="Получить состояние загрузки", description="Возвращает принятое смещение — с него нужно продолжить загрузку после обрыва соединения.", tags=["Загрузки"]),
+    destroy=extend_schema(summary="Отменить загрузку", description="Удаляет сессию загрузки и принятые части файла.", tags=["Загрузки"]),
+)
+class UploadViewSet(InstrumentedViewMixin, ThrottledActionsMixin, AdmissionControlMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                    mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    ordering = ('-created_at', '-id')
+    throttle_scopes = {'create': 'uploads', 'chunk': 'uploads', 'finalize': 'uploads'}
+    admission_pools = {'chunk': 'uploads', 'finalize': 'uploads'}
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        check_quota(self.request.user, serializer.validated_data['size'])
+        skip_known_upload(serializer.save(owner=self.request.user))
+
+    def perform_destroy(self, instance):
+        discard_part(instance)
+        instance.delete()
+
+    @extend_schema(summary="Загрузить часть файла", description="Принимает очередную часть файла в теле запроса (application/octet-stream). Смещение передается параметром offset или заголовком Upload-Offset и должно совпадать с уже принятым объемом.", tags=["Загрузки"], request={'application/octet-stream': {'type': 'string', 'format': 'binary'}}, responses=UploadSessionSerializer)
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        session = self.get_object()
+        try:
+            offset = int(request.query_params.get('offset', request.headers.get('Upload-Offset')))
+        except (TypeError, ValueError):
+            raise UploadError('Укажите смещение части (offset).', offset=session.offset)
+        # Тело читается напрямую из потока запроса, без request.data и парсеров
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        write_chunk(session, request.stream, offset, length)
+        return Response(self.get_serializer(session).data)
+
+    @extend_schema(summary="Завершить загрузку", description="Проверяет размер и контрольную сумму CRC32 (необязательный параметр checksum) и атомарно создает выполненное задание или прикрепляет файл к уроку.", tags=["Загрузки"], request=None)
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        session = self.get_object()
+        checksum = request.data.get('checksum')
+        try:
+            checksum = int(checksum) if checksum is not None else None
+        except (TypeError, ValueError):
+            raise ValidationError({'checksum': 'Ожидается целое число CRC32.'})
+        target = finalize_upload(session, checksum=checksum)
+        serializer_class = SubmissionSerializer if session.kind == 'submission' else LessonSerializer
+        return Response(serializer_class(target, context=self.get_serializer_context()).data,
+                        status=status.HTTP_201_CREATED)
+
+
+@extend_schema_view(
+    list=extend_schema(summary="История уведомлений", description="Возвращает уведомления пользователя по возрастанию порядкового номера. Параметр since отдает только уведомления с номером больше указанного — так клиент узнает, что изменилось с прошлого раза.", tags=["Уведомления"], parameters=[OpenApiParameter('since', int, description='Номер последнего полученного уведомления')]),
+)
+class NotificationViewSet(InstrumentedViewMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    queryset = Notification.objects.all()
+    serializer_class = NotificationSerializer
+    ordering = ('id',)
+
+    def get_queryset(self):
+        queryset = Notification.objects.filter(group__in=user_groups(self.request.user))
+        since = self.request.query_params.get('since')
+        if since is not None:
+            try:
+                queryset = queryset.filter(id__gt=int(since))
+            except ValueError:
+                raise ValidationError({'since': 'Ожидается целое число.'})
+        return queryset
+
+
+@extend_schema_view(
+    list=extend_schema(summary="Поиск", description="Полнотекстовый поиск по названиям и текстам курсов, уроков и заданий с учетом морфологии русского и английского языков. Результаты упорядочены по релевантности; совпадение в названии весит больше. Студенты находят только материалы курсов, на которые записаны.", tags=["Поиск"], parameters=[
+        OpenApiParameter('q', str, required=True, description='Поисковый запрос; ищутся объекты, содержащие все слова'),
+        OpenApiParameter('kind', str, enum=[kind for kind, _ in SearchDocument.KIND_CHOICES], description='Искать только курсы, уроки или задания'),
+        OpenApiParameter('course', int, description='Искать только в указанном курсе'),
+        OpenApiParameter('page', int, description='Номер страницы'),
+    ]),
+)
+class SearchViewSet(InstrumentedViewMixin, viewsets.GenericViewSet):
+    serializer_class = SearchResultSerializer
+    pagination_class = RankedPagination
+
+    def list(self, request):
+        params = request.query_params
+        kind = params.get('kind')
+        if kind is not None and kind not in dict(SearchDocument.KIND_CHOICES):
+            raise ValidationError({'kind': 'Допустимые значения: course, lesson, assignment.'})
+        course_id = params.get('course')
+        if course_id is not None:
+            try:
+                course_id = int(course_id)
+            except ValueError:
+                raise ValidationError({'course': 'Ожидается целое число.'})
+
+        limit, offset = self.paginator.get_limits(request)
+        results = search(request.user, params.get('q', ''), kind=kind, course_id=course_id, limit=limit, offset=offset)
+        page = self.paginator.set_page(results)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+
+@extend_schema_view(
+    list=extend_schema(summary="Фоновые задачи", description="Возвращает фоновые задачи, поставленные пользователем (удаление курсов и уроков, массовая запись), от новых к старым. Администраторы видят все задачи.", tags=["Задачи"]),
+    retrieve=extend_schema(summary="Состояние фоновой задачи", description="Возвращает статус, прогресс по шагам и результат задачи.", tags=["Задачи"]),
+)
+class JobViewSet(InstrumentedViewMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    ordering = ('-id',)
+
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Job.objects.all()
+        return Job.objects.filter(owner=self.request.user)
+
+    @extend_schema(summary="Отменить фоновую задачу", description="Отменяет задачу в очереди или выполняющуюся: воркер остановится после текущей пачки, уже выполненные пачки не откатываются. Для завершенной задачи возвращает 409.", tags=["Задачи"], request=None, responses=JobSerializer)
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job = self.get_object()
+        if not cancel_job(job):
+            return Response({'detail': 'Задача уже завершена.'}, status=status.HTTP_409_CONFLICT)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+
+class ObtainTokenView(ObtainAuthToken):
+    """
+    Выдает токен по логину и паролю. Действующий токен возвращается
+    повторно, истекший (или при rotate=true) заменяется новым.
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rotate = str(request.data.get('rotate', '')).lower() in ('1', 'true')
+        token = issue_token(serializer.validated_data['user'], rotate=rotate)
+        return Response({'token': token.key, 'expires_at': token_expires_at(token.created)})
+
+
+class RevokeTokenView(APIView):
+    @extend_schema(summary="Отозвать токен", description="Удаляет токен, которым подписан запрос. Токен перестает приниматься сразу на этом сервере и не позже чем через несколько секунд на остальных.", tags=["Аутентификация"], request=None, responses={204: None})
+    def post(self, request):
+        if request.auth is not None:
+            request.auth.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,16 +1,24 @@
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'learning_platform.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+
+# Приложение Django инициализируется до импорта кода, использующего модели
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from core.authentication import TokenAuthMiddleware
 import core.routing
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'learning_platform.settings')
-
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            core.routing.websocket_urlpatterns
+        TokenAuthMiddleware(
+            URLRouter(
+                core.routing.websocket_urlpatterns
+            )
         )
     ),
-})
\ No newline at end of file
+})
@@ -1,12 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
-from django.conf import settings
-from django.conf.urls.static import static
 from django.views.decorators.csrf import csrf_exempt  # Импортируем csrf_exempt
 from rest_framework.routers import DefaultRouter
-from rest_framework.authtoken.views import obtain_auth_token
 from drf_spectacular.utils import extend_schema
 from core import views
+from core.instrumentation import serve_metrics, serve_slow_requests
+from core.media import serve_media
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 router = DefaultRouter()
@@ -15,17 +14,25 @@ router.register(r'lessons', views.LessonViewSet)
 router.register(r'assignments', views.AssignmentViewSet)
 router.register(r'submissions', views.SubmissionViewSet)
 router.register(r'reviews', views.ReviewViewSet)
+router.register(r'uploads', views.UploadViewSet)
+router.register(r'notifications', views.NotificationViewSet)
+router.register(r'search', views.SearchViewSet, basename='search')
+router.register(r'jobs', views.JobViewSet)
+
+# Выдача токена со сроком действия и ротацией вместо стандартной из DRF
+obtain_auth_token = views.ObtainTokenView.as_view()
 
 # Декорируем obtain_auth_token для Swagger и отключаем CSRF
 @extend_schema(
     summary="Получить токен аутентификации",
-    description="Возвращает токен для аутентификации пользователя. Требуется передать username и password.",
+    description="Возвращает токен для аутентификации пользователя. Требуется передать username и password. Действующий токен возвращается повторно; истекший, а также при rotate=true, заменяется новым, старый перестает действовать.",
     tags=["Аутентификация"],
     responses={
         200: {
             "type": "object",
             "properties": {
-                "token": {"type": "string", "description": "Токен аутентификации"}
+                "token": {"type": "string", "description": "Токен аутентификации"},
+                "expires_at": {"type": "string", "format": "date-time", "nullable": True, "description": "Когда токен истечет (null — бессрочный)"}
             }
         }
     }
@@ -39,6 +46,11 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api-auth/', include('rest_framework.urls')),
     path('api-token-auth/', decorated_obtain_auth_token, name='api_token_auth'),
+    path('api-token-revoke/', views.RevokeTokenView.as_view(), name='api_token_revoke'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Файлы отдаются только по подписанным ссылкам из /api/lessons/{id}/file/ и /api/submissions/{id}/file/
+    path('media/<str:token>/<str:filename>', serve_media, name='protected_media'),
+    path('metrics', serve_metrics, name='metrics'),
+    path('metrics/slow', serve_slow_requests, name='slow_requests'),
+]
\ No newline at end of file